@@ -3,15 +3,24 @@ Amtly - AI-Powered German Bureaucracy Assistant
 Main Application Entry Point
 """
 
-from flask import Flask, render_template
+import tempfile
+from flask import Flask, Request, render_template
 from config import Config
 from models.database import init_database, Chat, Message
 from services.vector_store import vector_store
 
 
+class UploadRequest(Request):
+    """Keeps multipart file parts in memory up to UPLOAD_SPOOL_THRESHOLD (Werkzeug spills at 500 KB)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_THRESHOLD, mode='rb+')
+
+
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(Config)
     app.secret_key = Config.FLASK_SECRET_KEY
 
@@ -25,6 +34,10 @@ def create_app():
     # Initialize database
     init_database(app)
 
+    # Load the knowledge base in the background so /ping and non-RAG requests work right away
+    if Config.VECTOR_STORE_PRELOAD:
+        vector_store.start_background_init(warmup=Config.VECTOR_STORE_WARMUP)
+
     # Register blueprints
     from routes.chat_routes import chat_bp
     from routes.api_routes import api_bp
@@ -34,6 +47,11 @@ def create_app():
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(health_bp)
 
+    # Background workers for document uploads (resumes jobs left over from a crash)
+    if Config.UPLOAD_JOBS_ENABLED:
+        from services.job_queue import upload_job_queue
+        upload_job_queue.start(app)
+
     # Main route
     @app.route('/')
     def index():
@@ -72,11 +90,13 @@ def print_startup_info(app):
     print(f"📁 Data directory: {Config.DATA_DIR}")
     print(f"🤖 OpenAI configured: {bool(Config.OPENAI_API_KEY)}")
 
-    try:
+    if vector_store.is_ready():
         info = vector_store.get_collection_info()
         print(f"📚 Knowledge base: {info['count']} documents loaded")
-    except:
-        print("📚 Knowledge base: Not initialized")
+    elif vector_store.state == 'loading':
+        print("📚 Knowledge base: Loading in background...")
+    else:
+        print("📚 Knowledge base: Not initialized (loads on first search)")
 
     with app.app_context():
         chat_count = Chat.query.count()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for Amtly services
+
+Usage: python benchmark.py <command> [options]
+"""
+
+import json
+import statistics
+import threading
+import time
+from pathlib import Path
+
+SAMPLE_QUERIES = [
+    "Bürgergeld",
+    "Was ist WBA?",
+    "Wie beantrage ich Bürgergeld?",
+    "How do I renew Bürgergeld?",
+    "Welche Unterlagen brauche ich für den Weiterbewilligungsantrag?",
+    "What documents do I need for the Jobcenter?",
+    "Anlage KDU Miete und Heizkosten",
+    "§ 22 SGB II Bedarfe für Unterkunft und Heizung",
+    "Wo finde ich meine Kundennummer?",
+    "Can I keep my savings when I apply for Bürgergeld?",
+    "Vermögen Schonvermögen Karenzzeit",
+    "How long does the Jobcenter take to process an application?",
+]
+
+
+def _percentile(values, pct):
+    """Percentile of a list of numbers (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _run_concurrent(worker_fn, concurrency, requests_per_worker):
+    """Run worker_fn(worker_id, request_id) from several threads, return (latencies, elapsed)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        local = []
+        for request_id in range(requests_per_worker):
+            start = time.perf_counter()
+            worker_fn(worker_id, request_id)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def _get_rss_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_chunk_texts(limit=2000):
+    """Chunk texts from the ingested knowledge base (JSONL)"""
+    from config import Config
+
+    texts = []
+    for jsonl_file in sorted((Config.KNOWLEDGE_BASE_DIR / "chunks").glob("*.jsonl")):
+        with open(jsonl_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    texts.append(json.loads(line)['content'])
+                    if len(texts) >= limit:
+                        return texts
+    return texts
+
+
+def _print_latency_row(label, concurrency, latencies, elapsed):
+    """Print one result row"""
+    throughput = len(latencies) / elapsed if elapsed else 0.0
+    print(f"  {label:<10} c={concurrency:<3} "
+          f"p50={_percentile(latencies, 50) * 1000:7.1f}ms "
+          f"p95={_percentile(latencies, 95) * 1000:7.1f}ms "
+          f"mean={statistics.mean(latencies) * 1000:7.1f}ms "
+          f"throughput={throughput:8.1f}/s")
+
+
+def benchmark_embedding_batching(concurrency_levels=(1, 2, 4, 8, 16, 32), requests_per_worker=20):
+    """Latency and throughput of query embeddings with and without micro-batching"""
+    from config import Config
+    from services.embedding_service import embedding_service
+    from services.embedding_batcher import EmbeddingBatcher
+
+    print("🔬 Embedding micro-batching benchmark")
+    print(f"   Window: {Config.EMBEDDING_BATCH_WINDOW_MS}ms, max batch: {Config.EMBEDDING_BATCH_MAX_SIZE}")
+
+    # Load the model before timing anything
+    model = embedding_service.embeddings
+    model.embed_query("warm up")
+
+    batcher = EmbeddingBatcher(
+        model.embed_documents,
+        window_ms=Config.EMBEDDING_BATCH_WINDOW_MS,
+        max_batch_size=Config.EMBEDDING_BATCH_MAX_SIZE
+    )
+
+    # Unique texts so no cache can help
+    def make_text(mode, concurrency, worker_id, request_id):
+        return f"Wie beantrage ich Bürgergeld? ({mode}-{concurrency}-{worker_id}-{request_id})"
+
+    for concurrency in concurrency_levels:
+        latencies, elapsed = _run_concurrent(
+            lambda w, r: model.embed_query(make_text('direct', concurrency, w, r)),
+            concurrency, requests_per_worker
+        )
+        _print_latency_row('direct', concurrency, latencies, elapsed)
+
+        latencies, elapsed = _run_concurrent(
+            lambda w, r: batcher.submit(make_text('batched', concurrency, w, r)),
+            concurrency, requests_per_worker
+        )
+        _print_latency_row('batched', concurrency, latencies, elapsed)
+
+    stats = batcher.get_stats()
+    print(f"\n   Batches: {stats['batches']}, avg size: {stats['avg_batch_size']}, "
+          f"largest: {stats['largest_batch']}")
+
+
+def benchmark_onnx_backend(min_cosine=0.98, k=5):
+    """Parity, latency, memory and retrieval recall of the ONNX backend vs torch"""
+    import numpy as np
+    from config import Config
+
+    print("🔬 ONNX Runtime embedding backend vs torch")
+
+    corpus = _load_chunk_texts() or SAMPLE_QUERIES
+    print(f"   Corpus: {len(corpus)} texts, queries: {len(SAMPLE_QUERIES)}")
+
+    # Load ONNX backends first so their memory is measured before torch is imported
+    from services.onnx_embeddings import OnnxEmbeddings
+
+    backends = {}
+    memory = {}
+    for label, quantized in (('onnx-fp32', False), ('onnx-int8', True)):
+        rss_before = _get_rss_mb()
+        try:
+            backends[label] = OnnxEmbeddings(quantized=quantized,
+                                             max_seq_length=Config.EMBEDDING_MAX_SEQ_LENGTH)
+            backends[label].embed_query("warm up")
+            memory[label] = _get_rss_mb() - rss_before
+        except (ImportError, FileNotFoundError) as e:
+            print(f"  ⏭️  Skipping {label}: {e}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    rss_before = _get_rss_mb()
+    backends['torch'] = HuggingFaceEmbeddings(
+        model_name=Config.EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    backends['torch'].embed_query("warm up")
+    memory['torch'] = _get_rss_mb() - rss_before
+
+    reference_queries = np.array(backends['torch'].embed_documents(SAMPLE_QUERIES))
+    reference_corpus = np.array(backends['torch'].embed_documents(corpus))
+    reference_top = np.argsort(-(reference_queries @ reference_corpus.T), axis=1)[:, :k]
+
+    passed = True
+    for label, backend in backends.items():
+        # Latency: single queries and one batch of 32
+        latencies = []
+        for query in SAMPLE_QUERIES:
+            start = time.perf_counter()
+            backend.embed_query(query)
+            latencies.append(time.perf_counter() - start)
+
+        batch = (corpus * 32)[:32]
+        start = time.perf_counter()
+        backend.embed_documents(batch)
+        batch_time = time.perf_counter() - start
+
+        print(f"\n  {label}")
+        print(f"    RSS increase:  {memory[label]:8.1f} MB")
+        print(f"    Query latency: p50={_percentile(latencies, 50) * 1000:.1f}ms "
+              f"p95={_percentile(latencies, 95) * 1000:.1f}ms")
+        print(f"    Batch of 32:   {batch_time * 1000:.1f}ms ({32 / batch_time:.1f} texts/s)")
+
+        if label == 'torch':
+            continue
+
+        # Parity: cosine similarity with the torch vectors (all vectors are normalized)
+        query_vectors = np.array(backend.embed_documents(SAMPLE_QUERIES))
+        corpus_vectors = np.array(backend.embed_documents(corpus))
+        cosines = np.concatenate([
+            (query_vectors * reference_queries).sum(axis=1),
+            (corpus_vectors * reference_corpus).sum(axis=1)
+        ])
+
+        # Retrieval recall@k against the torch ranking
+        top = np.argsort(-(query_vectors @ corpus_vectors.T), axis=1)[:, :k]
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(top, reference_top)])
+
+        ok = cosines.min() >= min_cosine
+        passed = passed and ok
+        print(f"    Cosine vs torch: min={cosines.min():.4f} mean={cosines.mean():.4f} "
+              f"{'✅' if ok else '❌'} (threshold {min_cosine})")
+        print(f"    Recall@{k} vs torch: {recall:.3f}")
+
+    return passed
+
+
+def benchmark_vector_index(sizes=(10_000, 100_000, 1_000_000), dim=384, queries=50, k=5):
+    """Search latency of the NumPy flat index vs Chroma on synthetic normalized vectors"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from services.numpy_index import NumpyFlatIndex
+
+    print(f"🔬 Vector index benchmark (dim={dim}, k={k}, {queries} queries)")
+    rng = np.random.default_rng(42)
+
+    for size in sizes:
+        vectors = rng.standard_normal((size, dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        query_vectors = vectors[rng.choice(size, queries, replace=False)]
+        ids = [f"chunk-{i}" for i in range(size)]
+        texts = [f"chunk {i}" for i in range(size)]
+        metadatas = [{'source': f"doc_{i % 50}.pdf", 'chunk_id': i} for i in range(size)]
+
+        print(f"\n  {size:,} chunks")
+        workdir = Path(tempfile.mkdtemp(prefix="amtly_bench_"))
+        try:
+            # NumPy flat index
+            start = time.perf_counter()
+            index = NumpyFlatIndex(workdir / "numpy", embedding_function=None)
+            index.add_embeddings(ids, texts, metadatas, vectors)
+            build_time = time.perf_counter() - start
+
+            for label, where in (('numpy', None), ('numpy+filter', {'source': 'doc_7.pdf'})):
+                latencies = []
+                for vector in query_vectors:
+                    start = time.perf_counter()
+                    index.similarity_search_by_vector_with_score(vector, k=k, filter=where)
+                    latencies.append(time.perf_counter() - start)
+                print(f"    {label:<14} build={build_time:7.1f}s "
+                      f"p50={_percentile(latencies, 50) * 1000:7.2f}ms "
+                      f"p95={_percentile(latencies, 95) * 1000:7.2f}ms")
+
+            # Chroma (persistent client, same data)
+            try:
+                import chromadb
+            except ImportError:
+                print("    chroma         skipped (chromadb not installed)")
+                continue
+
+            start = time.perf_counter()
+            client = chromadb.PersistentClient(path=str(workdir / "chroma"))
+            collection = client.create_collection("bench")
+            batch_size = 5000
+            for offset in range(0, size, batch_size):
+                collection.add(
+                    ids=ids[offset:offset + batch_size],
+                    embeddings=vectors[offset:offset + batch_size].tolist(),
+                    documents=texts[offset:offset + batch_size],
+                    metadatas=metadatas[offset:offset + batch_size]
+                )
+            build_time = time.perf_counter() - start
+
+            for label, where in (('chroma', None), ('chroma+filter', {'source': 'doc_7.pdf'})):
+                latencies = []
+                for vector in query_vectors:
+                    start = time.perf_counter()
+                    collection.query(query_embeddings=[vector.tolist()], n_results=k, where=where)
+                    latencies.append(time.perf_counter() - start)
+                print(f"    {label:<14} build={build_time:7.1f}s "
+                      f"p50={_percentile(latencies, 50) * 1000:7.2f}ms "
+                      f"p95={_percentile(latencies, 95) * 1000:7.2f}ms")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def benchmark_chat_endpoint(base_url="http://localhost:8000", concurrency_levels=(1, 4, 16),
+                            requests_per_worker=10, stream=False):
+    """
+    End-to-end /chat latency through routing, retrieval, DB writes and formatting
+
+    Run the app against fake_openai_server.py (see its docstring) to benchmark offline.
+    """
+    import requests
+    from collections import Counter
+
+    endpoint = "/chat/stream" if stream else "/chat"
+    print(f"🔬 {endpoint} benchmark against {base_url}")
+
+    for concurrency in concurrency_levels:
+        # One chat per worker so conversation history stays realistic
+        chat_ids = [
+            requests.post(f"{base_url}/api/chats", json={'title': f"Benchmark c={concurrency} #{i}"})
+            .json()['chat']['id']
+            for i in range(concurrency)
+        ]
+        statuses = Counter()
+        first_token = []
+        lock = threading.Lock()
+
+        def send(worker_id, request_id):
+            query = SAMPLE_QUERIES[(worker_id + request_id) % len(SAMPLE_QUERIES)]
+            data = {'message': query, 'chat_id': chat_ids[worker_id]}
+            start = time.perf_counter()
+            if stream:
+                with requests.post(f"{base_url}{endpoint}", data=data, stream=True) as response:
+                    ttft = None
+                    status = response.status_code
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line == "event: token" and ttft is None:
+                            ttft = time.perf_counter() - start
+                        elif line == "event: reset":
+                            # The streamed answer failed - time the fallback's first token
+                            ttft = None
+                        elif line == "event: error":
+                            status = 'error-event'
+                    with lock:
+                        statuses[status] += 1
+                        if ttft is not None:
+                            first_token.append(ttft)
+            else:
+                response = requests.post(f"{base_url}{endpoint}", data=data)
+                with lock:
+                    statuses[response.status_code] += 1
+
+        latencies, elapsed = _run_concurrent(send, concurrency, requests_per_worker)
+        _print_latency_row('chat', concurrency, latencies, elapsed)
+        if first_token:
+            print(f"  {'':<10} ttft p50={_percentile(first_token, 50) * 1000:7.1f}ms "
+                  f"p95={_percentile(first_token, 95) * 1000:7.1f}ms")
+        print(f"  {'':<10} responses: {dict(statuses)}")
+
+
+def main():
+    import sys
+
+    commands = {
+        'embed-batching': benchmark_embedding_batching,
+        'onnx': benchmark_onnx_backend,
+        'index': benchmark_vector_index,
+        'chat': benchmark_chat_endpoint,
+        'chat-stream': lambda: benchmark_chat_endpoint(stream=True),
+    }
+
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        if sys.argv[1] == 'index' and len(sys.argv) > 2:
+            # e.g. python benchmark.py index 10000 100000
+            result = benchmark_vector_index(sizes=[int(size) for size in sys.argv[2:]])
+        elif sys.argv[1].startswith('chat') and len(sys.argv) > 2:
+            # e.g. python benchmark.py chat http://localhost:8000
+            result = benchmark_chat_endpoint(base_url=sys.argv[2], stream=sys.argv[1] == 'chat-stream')
+        else:
+            result = commands[sys.argv[1]]()
+        if result is False:
+            sys.exit(1)
+    else:
+        print(f"Usage: python benchmark.py [{'|'.join(commands)}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -33,18 +33,181 @@ class Config:
     }
 
     # AI settings
+    # OPENAI_BASE_URL points the client at an OpenAI-compatible server (e.g. fake_openai_server.py)
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
     OPENAI_MODEL = "gpt-3.5-turbo"
     MAX_TOKENS = 2000
     TEMPERATURE = 0.3
 
+    # Context token budgets per prompt route (history, knowledge base, documents, form data);
+    # the fixed instruction text of each prompt comes on top
+    PROMPT_CONTEXT_BUDGETS = {
+        'default': 1500,
+        'rag': int(os.getenv("PROMPT_BUDGET_RAG", "1500")),
+        'fallback': int(os.getenv("PROMPT_BUDGET_FALLBACK", "600")),
+        'document': int(os.getenv("PROMPT_BUDGET_DOCUMENT", "1000")),
+        'document_context': int(os.getenv("PROMPT_BUDGET_DOCUMENT_CONTEXT", "1000")),
+        'form_field': int(os.getenv("PROMPT_BUDGET_FORM_FIELD", "1500")),
+        'form_section': int(os.getenv("PROMPT_BUDGET_FORM_SECTION", "1000")),
+        'form_overview': int(os.getenv("PROMPT_BUDGET_FORM_OVERVIEW", "1200")),
+        'form_generic': int(os.getenv("PROMPT_BUDGET_FORM_GENERIC", "800")),
+    }
+
     # File upload settings
     MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
 
+    # OCR / PDF extraction process pool (shared by all requests; one file per process at a time)
+    OCR_POOL_ENABLED = os.getenv("OCR_POOL_ENABLED", "true").lower() == "true"
+    OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+    OCR_FILE_TIMEOUT = float(os.getenv("OCR_FILE_TIMEOUT", "60"))
+
+    # Uploads up to this size stay in memory from parsing to extraction; larger ones spill to disk
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+
+    # Extracted text and analyses of uploads, keyed by the SHA-256 of the file content
+    DOCUMENT_CACHE_ENABLED = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() == "true"
+    DOCUMENT_CACHE_PATH = DATA_DIR / "cache" / "documents.db"
+    DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "2000"))
+    DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", str(30 * 86400)))
+
+    # Documents over the 'document' prompt budget are analyzed in segments (map) and merged (reduce)
+    DOCUMENT_MAP_REDUCE_ENABLED = os.getenv("DOCUMENT_MAP_REDUCE_ENABLED", "true").lower() == "true"
+    DOCUMENT_SEGMENT_TOKENS = int(os.getenv("DOCUMENT_SEGMENT_TOKENS", "2500"))
+    DOCUMENT_MAP_CONCURRENCY = int(os.getenv("DOCUMENT_MAP_CONCURRENCY", "4"))
+    DOCUMENT_MAX_SEGMENTS = int(os.getenv("DOCUMENT_MAX_SEGMENTS", "12"))
+    # Segment notes above this are condensed in groups before the final merge
+    DOCUMENT_MERGE_BUDGET = int(os.getenv("DOCUMENT_MERGE_BUDGET", "4000"))
+
     # Vector store settings
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
 
+    # Chunking mode: 'chars' (CHUNK_SIZE characters) or 'tokens' (fits the
+    # embedding model's max sequence length, split at sentence boundaries)
+    CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars")
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "16"))
+
+    # Embedding settings
+    EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_MAX_SEQ_LENGTH = 128
+
+    # Embedding backend: 'torch' (HuggingFaceEmbeddings), 'onnx' (ONNX Runtime, CPU)
+    # or 'fake' (deterministic hashed vectors for offline benchmarks)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+    ONNX_MODEL_DIR = MODELS_DIR / "onnx"
+    ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+    ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0")) or None
+
+    # Embedding cache (in-process LRU + shared on-disk store)
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "2048"))
+    EMBEDDING_CACHE_DISK_SIZE = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000"))
+    EMBEDDING_CACHE_PATH = DATA_DIR / "cache" / "embeddings.db"
+
+    # Micro-batching of concurrent query embeddings
+    EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+
+    # Shared embedding server (Unix domain socket); unset = load the model in-process
+    EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET")
+    # Shared secret for the socket; unset = random key generated by the server into a 0600 file
+    EMBEDDING_SERVER_AUTHKEY = os.getenv("EMBEDDING_SERVER_AUTHKEY", "").encode() or None
+    EMBEDDING_SERVER_AUTHKEY_FILE = DATA_DIR / "embedding_server.key"
+    EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "30"))
+
+    # Chunks embedded and written per batch during ingestion
+    UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+
+    # Vector index backend: 'chroma' or 'numpy' (exact search over a memory-mapped matrix)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    NUMPY_INDEX_DIR = KNOWLEDGE_BASE_DIR / "numpy_index"
+
+    # Hybrid retrieval: BM25 over the chunk JSONL files fused with vector search (RRF)
+    HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = 60
+    LEXICAL_REFRESH_INTERVAL = float(os.getenv("LEXICAL_REFRESH_INTERVAL", "30"))
+
+    # Vector store startup: load Chroma + embedding model in a background thread
+    VECTOR_STORE_PRELOAD = os.getenv("VECTOR_STORE_PRELOAD", "true").lower() == "true"
+    VECTOR_STORE_WARMUP = os.getenv("VECTOR_STORE_WARMUP", "true").lower() == "true"
+
+    # Search result cache (invalidated when the knowledge base is re-ingested)
+    QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+    # OpenAI timeouts, retries (exponential backoff with jitter) and circuit breaker
+    OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+    OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+    OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+    OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+    OPENAI_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("OPENAI_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    OPENAI_CIRCUIT_RESET_TIMEOUT = float(os.getenv("OPENAI_CIRCUIT_RESET_TIMEOUT", "30"))
+
+    # Admission control for OpenAI calls (RPM/TPM limits of 0 = not enforced locally)
+    OPENAI_MAX_IN_FLIGHT = int(os.getenv("OPENAI_MAX_IN_FLIGHT", "8"))
+    OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "0"))
+    OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "0"))
+    OPENAI_QUEUE_SIZE = int(os.getenv("OPENAI_QUEUE_SIZE", "32"))
+    OPENAI_QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "20"))
+
+    # Exact-match LLM response cache (keyed on model, sampling settings and full prompt)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+    LLM_CACHE_PATH = DATA_DIR / "cache" / "llm_responses.db"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+
+    # Share one OpenAI call between identical prompts that are in flight at the same time
+    LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+
+    # Model routing: per-call model / max_tokens / temperature by route, intent and input size
+    # (first matching rule wins; MODEL_ROUTING_FILE = JSON {"default": {...}, "rules": [...]} overrides)
+    MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    MODEL_ROUTING_LOG = os.getenv("MODEL_ROUTING_LOG", "false").lower() == "true"
+    MODEL_ROUTING_FILE = os.getenv("MODEL_ROUTING_FILE")
+    # Cheaper model for short follow-ups (unset = OPENAI_MODEL)
+    OPENAI_MODEL_LIGHT = os.getenv("OPENAI_MODEL_LIGHT") or None
+    MODEL_ROUTING_RULES = [
+        # "shorter please", "in English?" - a few hundred tokens are plenty
+        {'name': 'short_followup', 'routes': ['rag_general'], 'intents': ['followup'], 'max_message_tokens': 12,
+         'model': OPENAI_MODEL_LIGHT, 'max_tokens': 500},
+        {'name': 'form_help', 'routes': ['form'], 'max_tokens': 1000, 'temperature': 0.2},
+        {'name': 'institution_email', 'routes': ['rag_german_email'], 'max_tokens': 1000},
+        {'name': 'fallback', 'routes': ['fallback'], 'max_tokens': 800},
+        {'name': 'short_question', 'routes': ['rag_general'], 'max_input_tokens': 1500,
+         'max_tokens': 1000},
+        # Map step of long documents: notes per segment, or the segment's translation
+        {'name': 'document_segment_translation', 'routes': ['document_segment'],
+         'intents': ['translate', 'explain_translate'], 'max_tokens': 2000},
+        {'name': 'document_segment_notes', 'routes': ['document_segment'], 'max_tokens': 600},
+        # Translations reproduce the whole document
+        {'name': 'document_translation', 'routes': ['document'], 'intents': ['translate', 'explain_translate'],
+         'max_tokens': 2000},
+        {'name': 'document_analysis', 'routes': ['document'], 'max_tokens': 1500},
+    ]
+
+    # Semantic answer cache for first-turn questions (cosine similarity of query embeddings)
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+    SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+    SEMANTIC_CACHE_SAMPLE_RATE = float(os.getenv("SEMANTIC_CACHE_SAMPLE_RATE", "0.1"))
+
+    # Background upload jobs: /chat with files returns a job ID, a worker pool does OCR + analysis
+    UPLOAD_JOBS_ENABLED = os.getenv("UPLOAD_JOBS_ENABLED", "true").lower() == "true"
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+    # Workers refresh a running job's heartbeat every JOB_STALE_TIMEOUT / 3 seconds;
+    # running jobs without a heartbeat for JOB_STALE_TIMEOUT (worker died) are requeued
+    JOB_STALE_TIMEOUT = float(os.getenv("JOB_STALE_TIMEOUT", "300"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+    # Base delay before retrying a job rejected by admission control (doubles per attempt)
+    JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+
     # Database settings
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{DATA_DIR}/amtly.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -58,6 +221,7 @@ class Config:
             cls.KNOWLEDGE_BASE_DIR / "documents",
             cls.KNOWLEDGE_BASE_DIR / "chunks",
             cls.KNOWLEDGE_BASE_DIR / "embeddings",
+            cls.DATA_DIR / "cache",
             cls.SCHEMAS_DIR,
             cls.UPLOADS_DIR,
             cls.MODELS_DIR
@@ -1,6 +1,10 @@
 from services.openai_service import openai_service
+from services.model_router import followup_intent
 from services.vector_store import vector_store
 from services.language_detection import language_service
+from utils.prompt_builder import PromptBuilder, get_budget
+from utils.concurrency import RateLimitExceeded
+from config import Config
 
 
 class RAGChatHandler:
@@ -14,7 +18,10 @@ class RAGChatHandler:
     def search_knowledge_base(self, query, k=3):
         """Search knowledge base for relevant information"""
         try:
-            results = self.vector_store.search_with_scores(query, k=k)
+            if Config.HYBRID_SEARCH_ENABLED:
+                results = self.vector_store.hybrid_search_with_scores(query, k=k)
+            else:
+                results = self.vector_store.search_with_scores(query, k=k)
 
             if not results:
                 return None
@@ -61,37 +68,36 @@ class RAGChatHandler:
         # Search knowledge base
         knowledge_result = self.search_knowledge_base(user_message)
 
+        # Fill the context budget: official documents first, then recent conversation
+        # (latest messages whole, older ones trimmed), then the uploaded document
+        builder = PromptBuilder(get_budget('rag'))
+        builder.add('knowledge', knowledge_result['context'] if knowledge_result else '', priority=1,
+                    max_tokens=800)
+        builder.add_history('history', conversation_history, priority=2, max_tokens=400, keep_last=2)
+        builder.add('document', document_context, priority=3)
+        sections = builder.build()
+
         # Build context
         context_parts = []
         sources = []
 
         # Add recent conversation for follow-ups (IMPROVED)
-        if conversation_history and len(conversation_history) > 1:
+        if sections['history']:
             context_parts.append("=== RECENT CONVERSATION (IMPORTANT FOR FOLLOW-UPS) ===")
-            # Take last 6 messages for better context
-            recent = conversation_history[-6:]
-            conv_text = []
-            for idx, msg in enumerate(recent):
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                # Keep full content for last 2 messages, truncate older ones
-                if idx >= len(recent) - 2:
-                    content = msg['content']
-                else:
-                    content = msg['content'][:200] + "..." if len(msg['content']) > 200 else msg['content']
-                conv_text.append(f"{role}: {content}")
-            context_parts.append('\n'.join(conv_text))
+            context_parts.append(sections['history'])
             context_parts.append("\n⚠️ CRITICAL: Use this conversation history to understand follow-up questions!")
 
         # Add knowledge base context
         if knowledge_result:
-            context_parts.append("=== OFFICIAL DOCUMENTS ===")
-            context_parts.append(knowledge_result['context'])
+            if sections['knowledge']:
+                context_parts.append("=== OFFICIAL DOCUMENTS ===")
+                context_parts.append(sections['knowledge'])
             sources.extend(knowledge_result.get('sources', []))
 
         # Add document context
-        if document_context:
+        if sections['document']:
             context_parts.append("=== UPLOADED DOCUMENT ===")
-            context_parts.append(document_context)
+            context_parts.append(sections['document'])
 
         # Create system prompt
         system_prompt = self._create_system_prompt(
@@ -107,7 +113,9 @@ class RAGChatHandler:
             result = self.openai_service.get_response(
                 user_message,
                 system_prompt,
-                clean_context=True
+                clean_context=True,
+                route='rag_german_email' if is_german_institution_email else 'rag_general',
+                intent=followup_intent(user_message, conversation_history)
             )
 
             if result['success']:
@@ -119,6 +127,18 @@ class RAGChatHandler:
                     'detected_language': response_language,
                     'is_german_institution_email': is_german_institution_email
                 }
+            elif sections['knowledge']:
+                # Language model unavailable - show the retrieved official excerpts instead
+                print(f"RAG using knowledge base fallback: {result['error']}")
+                return {
+                    'success': True,
+                    'response': self._get_excerpt_fallback(response_language, sections['knowledge']),
+                    'sources': sources,
+                    'used_knowledge_base': True,
+                    'detected_language': response_language,
+                    'is_german_institution_email': is_german_institution_email,
+                    'fallback': True
+                }
             else:
                 return {
                     'success': False,
@@ -126,6 +146,8 @@ class RAGChatHandler:
                     'response': self._get_error_message(response_language)
                 }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -255,6 +277,16 @@ IMPORTANT:
         else:
             return f"{lang_instruction}\n\n{base_prompt}\n{conversation_instruction}"
 
+    def _get_excerpt_fallback(self, language, excerpts):
+        """Answer made of knowledge base excerpts when no model answer is available"""
+        if language == 'de':
+            notice = ("⚠️ Der KI-Assistent ist gerade nicht erreichbar. "
+                      "Diese Auszüge aus offiziellen Dokumenten passen zu deiner Frage:")
+        else:
+            notice = ("⚠️ The AI assistant is temporarily unavailable. "
+                      "These excerpts from official documents match your question:")
+        return f"{notice}\n\n{excerpts}"
+
     def _get_error_message(self, language):
         """Get error message in appropriate language"""
         if language == 'de':
@@ -0,0 +1,274 @@
+"""
+Map-reduce analysis of long uploaded documents
+
+A document that does not fit the 'document' prompt budget is split into
+token-budgeted segments at page and paragraph boundaries. Segments are
+analyzed concurrently (at most DOCUMENT_MAP_CONCURRENCY calls per document,
+on top of the OpenAIService admission limits), so latency follows the
+slowest segment instead of the page count. Explanations are built from
+per-segment notes: notes that together exceed DOCUMENT_MERGE_BUDGET are
+first condensed group by group (hierarchical reduce), never cut, and one
+final merge call writes the answer. Translations are not merged by the
+model: the translated segments are joined in order. The same reduce
+yields the compact notes stored as chat context for follow-up questions.
+"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.openai_service import openai_service
+from utils.concurrency import PRIORITY_LOW
+from utils.prompt_builder import count_tokens, split_by_tokens, truncate_to_tokens
+from config import Config
+
+
+class DocumentAnalyzer:
+    """Segment, analyze in parallel, reduce, merge"""
+
+    def __init__(self, segment_tokens=2500, concurrency=4, max_segments=12, merge_budget=4000):
+        self.segment_tokens = segment_tokens
+        self.concurrency = concurrency
+        self.max_segments = max_segments
+        self.merge_budget = merge_budget
+        self.openai_service = openai_service
+
+    def _map_prompt(self, index, total, user_language, task, file_context):
+        if task == 'translate':
+            if user_language == 'de':
+                return (f"Du bist Amtly. {file_context}Du siehst Teil {index} von {total}. "
+                        f"Übersetze NUR diesen Teil (keine Erklärung, keine Einleitung).")
+            return (f"You are Amtly. {file_context}You see part {index} of {total}. "
+                    f"Translate ONLY this part (no explanation, no introduction).")
+
+        if user_language == 'de':
+            return (f"Du bist Amtly. {file_context}Du siehst Teil {index} von {total}. "
+                    f"Notiere stichpunktartig alle wichtigen Informationen dieses Teils: Absender, "
+                    f"Aktenzeichen, Daten und Fristen, Beträge, was der Empfänger tun soll und "
+                    f"mögliche Folgen. Nichts hinzufügen, was nicht im Text steht.")
+        return (f"You are Amtly. {file_context}You see part {index} of {total}. "
+                f"List the key information of this part as short bullet points: sender, reference "
+                f"numbers, dates and deadlines, amounts, what the recipient must do and possible "
+                f"consequences. Write in English. Do not add anything that is not in the text.")
+
+    def _analyze_segment(self, segment, index, total, user_language, task, file_context):
+        """task: 'notes' or 'translate'"""
+        return self.openai_service.get_response(
+            f"Part {index}/{total}:\n\n{segment}",
+            self._map_prompt(index, total, user_language, task, file_context),
+            priority=PRIORITY_LOW,
+            route='document_segment',
+            intent='translate' if task == 'translate' else 'explain'
+        )
+
+    def _run_parallel(self, calls, progress=None, stage=None, start=0, end=0):
+        """
+        Run (fn, *args) calls with bounded concurrency; results in call order
+
+        Each call runs in a copy of the request context so its LLM usage is
+        tracked. If one call raises (e.g. RateLimitExceeded), calls that have
+        not started are cancelled before the error propagates.
+        """
+        results = [None] * len(calls)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(calls))),
+                                thread_name_prefix='document-map') as executor:
+            futures = {
+                executor.submit(contextvars.copy_context().run, *call): index
+                for index, call in enumerate(calls)
+            }
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    if progress:
+                        progress(f"{stage} {done}/{len(calls)}", start + (end - start) * done // len(calls))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    @staticmethod
+    def _format_parts(notes):
+        return "\n\n".join(
+            f"--- PART {index}/{len(notes)} ---\n{note}" for index, note in enumerate(notes, 1)
+        )
+
+    def _condense(self, notes, user_language):
+        """One reduce call: combined notes for a run of consecutive parts"""
+        if user_language == 'de':
+            system_prompt = ("Du bist Amtly. Fasse diese Notizen zu aufeinanderfolgenden Teilen eines "
+                             "Dokuments zu EINER stichpunktartigen Notiz zusammen. Behalte alle Daten, "
+                             "Fristen, Beträge, Aktenzeichen und geforderten Handlungen.")
+        else:
+            system_prompt = ("You are Amtly. Combine these notes on consecutive parts of one document into "
+                             "ONE bullet-point note. Keep every date, deadline, amount, reference number "
+                             "and requested action.")
+        return self.openai_service.get_response(
+            self._format_parts(notes),
+            system_prompt,
+            priority=PRIORITY_LOW,
+            route='document_segment',
+            intent='explain'
+        )
+
+    def _reduce(self, notes, user_language, budget):
+        """Condense groups of notes until all of them fit the budget"""
+        while len(notes) > 1 and count_tokens(self._format_parts(notes)) > budget:
+            groups, current, current_tokens = [], [], 0
+            for note in notes:
+                # + part header
+                tokens = count_tokens(note) + 16
+                if current and current_tokens + tokens > budget:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(note)
+                current_tokens += tokens
+            groups.append(current)
+            if len(groups) == len(notes):
+                # Single notes over budget - pair them up so each round shrinks the list
+                groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+
+            print(f"🧩 Condensing {len(notes)} notes in {len(groups)} groups")
+            results = self._run_parallel([(self._condense, group, user_language) for group in groups])
+            notes = [
+                result['response'] if result['success'] else "\n\n".join(group)
+                for group, result in zip(groups, results)
+            ]
+            if not any(result['success'] for result in results):
+                break
+        return notes
+
+    def _context(self, notes, user_language, budget):
+        """Notes reduced to the chat context budget (trimmed only if condensing failed)"""
+        notes = self._reduce(notes, user_language, budget)
+        context = notes[0] if len(notes) == 1 else self._format_parts(notes)
+        if count_tokens(context) > budget:
+            context = truncate_to_tokens(context, budget)
+        return context
+
+    def _merge(self, notes, system_prompt, user_language, intent):
+        """Final call turning the notes into the explanation"""
+        parts = self._format_parts(notes)
+        if count_tokens(parts) > self.merge_budget:
+            # Only when condensing failed - better a trimmed merge than none
+            parts = truncate_to_tokens(parts, self.merge_budget)
+
+        if user_language == 'de':
+            instruction = ("\n\nDas Dokument wurde in Teilen vorverarbeitet; du bekommst Notizen zu jedem Teil. "
+                           "Fasse sie zu EINER zusammenhängenden Antwort über das ganze Dokument zusammen.")
+            if intent == 'explain_translate':
+                instruction += " Die vollständige Übersetzung wird nach deiner Antwort angezeigt: schreibe NUR die Erklärung."
+            label = "Notizen zu den Teilen des Dokuments"
+        else:
+            instruction = ("\n\nThe document was pre-processed in parts; you get notes on each part. "
+                           "Combine them into ONE coherent answer about the whole document.")
+            if intent == 'explain_translate':
+                instruction += " The full translation is shown after your answer: write ONLY the explanation."
+            label = "Notes on the parts of the document"
+
+        return self.openai_service.get_response(
+            f"{label}:\n\n{parts}",
+            system_prompt + instruction,
+            priority=PRIORITY_LOW,
+            route='document',
+            intent='explain'
+        )
+
+    def analyze(self, text, system_prompt, user_language, intent, file_context, progress=None,
+                context_budget=None):
+        """
+        Map-reduce analysis of one combined document
+
+        system_prompt is the single-call prompt (with conversation history) and
+        is reused for the merge step; intent is 'explain', 'translate' or
+        'explain_translate'. progress(stage, percent) is called from the
+        calling thread. Returns {'success', 'response', 'segments', 'context'};
+        context holds the notes reduced to context_budget tokens (None when
+        the document fit one segment or no budget was given).
+        """
+        segments = split_by_tokens(text, self.segment_tokens)
+        total_segments = len(segments)
+        if total_segments == 1:
+            # Fits one segment: a single call answers it, map + merge would only add a round trip
+            result = self.openai_service.get_response(
+                f"Analyze this document:\n\n{segments[0]}",
+                system_prompt,
+                priority=PRIORITY_LOW,
+                route='document',
+                intent=intent
+            )
+            return {'success': result['success'], 'response': result['response'], 'segments': 1,
+                    'context': None, 'error': result.get('error')}
+
+        if total_segments > self.max_segments:
+            print(f"⚠️ Document has {total_segments} segments, analyzing the first {self.max_segments}")
+            segments = segments[:self.max_segments]
+        total = len(segments)
+        print(f"🧩 Map-reduce analysis: {total} segments of up to {self.segment_tokens} tokens")
+
+        # Explanations need notes, translations the translated text; explain+translate needs both
+        tasks = []
+        if intent in ('explain', 'explain_translate'):
+            tasks.append('notes')
+        if intent in ('translate', 'explain_translate'):
+            tasks.append('translate')
+
+        calls = [
+            (self._analyze_segment, segment, index, total, user_language, task, file_context)
+            for task in tasks
+            for index, segment in enumerate(segments, 1)
+        ]
+        results = self._run_parallel(calls, progress, 'analyzing', 75, 90)
+        by_task = {task: results[position * total:(position + 1) * total] for position, task in enumerate(tasks)}
+
+        if user_language == 'de':
+            missing = "[Teil {} konnte nicht analysiert werden]"
+        else:
+            missing = "[Part {} could not be analyzed]"
+
+        outputs = {}
+        for task, task_results in by_task.items():
+            if not any(result['success'] for result in task_results):
+                return {'success': False, 'response': None, 'segments': total,
+                        'error': task_results[0].get('error')}
+            outputs[task] = [
+                result['response'] if result['success'] else missing.format(index)
+                for index, result in enumerate(task_results, 1)
+            ]
+
+        context = None
+        if intent == 'translate':
+            response = "\n\n".join(outputs['translate'])
+            if context_budget:
+                context = self._context(outputs['translate'], user_language, context_budget)
+        else:
+            if progress:
+                progress('merging', 92)
+            notes = self._reduce(outputs['notes'], user_language, self.merge_budget)
+            calls = [(self._merge, notes, system_prompt, user_language, intent)]
+            if context_budget:
+                # The context reduce runs next to the merge call, not after it
+                calls.append((self._context, notes, user_language, context_budget))
+            merged, *rest = self._run_parallel(calls)
+            context = rest[0] if rest else None
+            if not merged['success']:
+                return {'success': False, 'response': None, 'segments': total, 'error': merged.get('error')}
+            response = merged['response']
+            if intent == 'explain_translate':
+                heading = "Übersetzung" if user_language == 'de' else "Translation"
+                response += f"\n\n---\n\n**{heading}:**\n\n" + "\n\n".join(outputs['translate'])
+
+        if total < total_segments:
+            if user_language == 'de':
+                response += f"\n\n_(Nur die ersten {total} von {total_segments} Teilen des Dokuments wurden analysiert.)_"
+            else:
+                response += f"\n\n_(Only the first {total} of {total_segments} parts of the document were analyzed.)_"
+
+        return {'success': True, 'response': response, 'segments': total, 'context': context}
+
+
+# Create global instance
+document_analyzer = DocumentAnalyzer(
+    segment_tokens=Config.DOCUMENT_SEGMENT_TOKENS,
+    concurrency=Config.DOCUMENT_MAP_CONCURRENCY,
+    max_segments=Config.DOCUMENT_MAX_SEGMENTS,
+    merge_budget=Config.DOCUMENT_MERGE_BUDGET
+)
@@ -1,4 +1,12 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from PIL import Image
 import pytesseract
@@ -6,6 +14,26 @@ import fitz  # PyMuPDF
 from config import Config
 
 
+def _init_ocr_worker():
+    """Pool worker setup: one Tesseract thread per process (the pool provides the parallelism)"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _extract_in_worker(source, file_type):
+    """Runs in a pool process"""
+    return document_processor.process_document(source, file_type)
+
+
+# Leading bytes of the accepted formats
+FILE_SIGNATURES = [
+    (b'%PDF-', '.pdf'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+]
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
 class DocumentProcessor:
     """Document processing with OCR - CLEANED & FIXED VERSION"""
 
@@ -13,14 +41,33 @@ class DocumentProcessor:
         self.allowed_extensions = Config.ALLOWED_EXTENSIONS
         self.max_file_size = Config.MAX_FILE_SIZE
 
+        # Extraction process pool, shared by all requests (created on first use)
+        self.pool_workers = Config.OCR_MAX_WORKERS
+        self.file_timeout = Config.OCR_FILE_TIMEOUT
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # One slot per pool process: files wait here instead of piling up in the pool queue
+        self._slots = threading.BoundedSemaphore(self.pool_workers)
+
     def is_allowed_file(self, filename):
         """Check if file extension is allowed"""
         return Path(filename).suffix.lower() in self.allowed_extensions
 
+    @staticmethod
+    def detect_file_type(header):
+        """'.pdf', '.png' or '.jpg' from the first bytes of a file, None if unknown"""
+        for signature, file_type in FILE_SIGNATURES:
+            if header.startswith(signature):
+                return file_type
+        return None
+
     def extract_text_from_pdf(self, file_path):
-        """Extract text from PDF using PyMuPDF"""
+        """Extract text from PDF using PyMuPDF (file_path may also be the PDF bytes)"""
         try:
-            doc = fitz.open(file_path)
+            if isinstance(file_path, (bytes, bytearray)):
+                doc = fitz.open(stream=file_path, filetype='pdf')
+            else:
+                doc = fitz.open(file_path)
             text = ""
             for page_num in range(len(doc)):
                 page = doc.load_page(page_num)
@@ -31,21 +78,24 @@ class DocumentProcessor:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
     def extract_text_from_image(self, file_path):
-        """Extract text from image using Tesseract OCR"""
+        """Extract text from image using Tesseract OCR (file_path may also be the image bytes)"""
         try:
             # Configure Tesseract for German and English
             custom_config = r'--oem 3 --psm 6 -l deu+eng'
 
             # Open and process image
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image, config=custom_config)
+            if isinstance(file_path, (bytes, bytearray)):
+                image = Image.open(io.BytesIO(file_path))
+            else:
+                image = Image.open(file_path)
+            text = pytesseract.image_to_string(image, config=custom_config, timeout=self.file_timeout)
             return text.strip()
         except Exception as e:
             raise Exception(f"Error extracting text from image: {str(e)}")
 
-    def process_document(self, file_path):
-        """Main method to process any document"""
-        file_extension = Path(file_path).suffix.lower()
+    def process_document(self, file_path, file_type=None):
+        """Main method to process any document (a path, or bytes with file_type)"""
+        file_extension = file_type or Path(file_path).suffix.lower()
 
         if file_extension == '.pdf':
             return self.extract_text_from_pdf(file_path)
@@ -54,36 +104,183 @@ class DocumentProcessor:
         else:
             raise Exception(f"Unsupported file type: {file_extension}")
 
-    def save_uploaded_file(self, file):
-        """Save uploaded file and return path - FIXED VERSION"""
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a process that runs Flask and torch threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_ocr_worker
+                )
+            return self._pool
+
+    def _reset_pool(self, pool, terminate=False):
+        """
+        Drop the pool so the next request starts a fresh one
+
+        terminate=True also kills its processes: a hung extraction (PyMuPDF
+        has no timeout) would otherwise keep its process and slot forever.
+        Killing them breaks the pool, which fails its remaining futures and
+        so releases their slots.
+        """
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        if terminate:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+    def extract_texts(self, file_paths, file_types=None, on_result=None):
+        """
+        Extract text from several files on the process pool
+
+        Entries of file_paths may be in-memory uploads (bytes); file_types then
+        gives their types (see read_upload). Returns [(text, error)] in input order. At most OCR_MAX_WORKERS files
+        are extracted at once across all requests; a file that takes longer
+        than OCR_FILE_TIMEOUT gets an error instead of text.
+        on_result(index) is called (in this thread) as each result is collected.
+        """
+        file_types = file_types or [None] * len(file_paths)
+
+        if not Config.OCR_POOL_ENABLED:
+            results = []
+            for index, (file_path, file_type) in enumerate(zip(file_paths, file_types)):
+                try:
+                    results.append((self.process_document(file_path, file_type), None))
+                except Exception as e:
+                    results.append((None, str(e)))
+                if on_result:
+                    on_result(index)
+            return results
+
+        pool = self._get_pool()
+        submitted = []
+        for file_path, file_type in zip(file_paths, file_types):
+            if isinstance(file_path, Path):
+                file_path = str(file_path)
+            self._slots.acquire()
+            try:
+                future = pool.submit(_extract_in_worker, file_path, file_type)
+            except BrokenProcessPool:
+                self._slots.release()
+                self._reset_pool(pool)
+                raise
+            # The slot frees up when the pool process is done, even after a timeout here
+            future.add_done_callback(lambda _: self._slots.release())
+            # Tesseract stops itself at file_timeout; the margin covers loading and IPC
+            submitted.append((future, time.monotonic() + self.file_timeout + 5))
+
+        results = []
+        broken = False
+        timed_out = []
+        for index, (future, deadline) in enumerate(submitted):
+            try:
+                results.append((future.result(timeout=max(0.0, deadline - time.monotonic())), None))
+            except FutureTimeoutError:
+                # cancel() only works before a worker picked the file up
+                if not future.cancel():
+                    timed_out.append(future)
+                results.append((None, f"Timed out after {self.file_timeout:.0f}s"))
+            except BrokenProcessPool as e:
+                broken = True
+                results.append((None, f"Extraction worker crashed: {e}"))
+            except Exception as e:
+                results.append((None, str(e)))
+            if on_result:
+                on_result(index)
+
+        hung = any(not future.done() for future in timed_out)
+        if broken or hung:
+            # A killed worker breaks the whole pool, and a hung one is never coming back -
+            # start a fresh pool next time
+            self._reset_pool(pool, terminate=hung)
+        return results
+
+    def read_upload(self, file, spool_dir=None, spool_threshold=None):
+        """
+        Read an upload from its stream, checking size and file type on the way
+
+        Returns {'size', 'type', 'sha256', 'data'} with the bytes in memory, or
+        {'size', 'type', 'sha256', 'path'} once the upload exceeds
+        spool_threshold bytes and is written to a file in spool_dir (default
+        UPLOADS_DIR; the caller deletes it). spool_threshold=0 always writes a file.
+        """
         if not file or file.filename == '':
             raise Exception("No file selected")
 
         if not self.is_allowed_file(file.filename):
             raise Exception(f"File type not allowed. Allowed: {', '.join(self.allowed_extensions)}")
 
-        # Create unique filename
-        file_extension = Path(file.filename).suffix.lower()
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = Config.UPLOADS_DIR / unique_filename
+        if spool_threshold is None:
+            spool_threshold = Config.UPLOAD_SPOOL_THRESHOLD
 
+        data = bytearray()
+        size = 0
+        content_hash = hashlib.sha256()
+        file_type = None
+        file_path = None
+        out = None
         try:
-            # Save file
-            file.save(file_path)
+            while True:
+                chunk = file.stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
 
-            # Check file size AFTER saving (more reliable)
-            if file_path.stat().st_size > self.max_file_size:
-                file_path.unlink()  # Delete the file
-                max_mb = self.max_file_size // (1024 * 1024)
-                raise Exception(f"File too large. Maximum size: {max_mb}MB")
+                size += len(chunk)
+                content_hash.update(chunk)
+                if size > self.max_file_size:
+                    max_mb = self.max_file_size // (1024 * 1024)
+                    raise Exception(f"File too large. Maximum size: {max_mb}MB")
 
-            return file_path
+                if file_type is None:
+                    # Identify the format from the leading bytes
+                    data += chunk
+                    if len(data) < 8:
+                        continue
+                    file_type = self.detect_file_type(bytes(data[:8]))
+                    if file_type is None:
+                        raise Exception("File content is not a PDF, PNG or JPEG")
+                    chunk = b''
 
-        except Exception as e:
-            # Clean up file if it exists
-            if file_path.exists():
-                file_path.unlink()
-            raise Exception(f"Error saving file: {str(e)}")
+                if out is None and len(data) + len(chunk) > spool_threshold:
+                    # Large upload - continue on disk
+                    directory = Path(spool_dir) if spool_dir else Config.UPLOADS_DIR
+                    directory.mkdir(parents=True, exist_ok=True)
+                    file_path = directory / f"{uuid.uuid4()}{file_type}"
+                    out = open(file_path, 'wb')
+                    out.write(data)
+                    data = None
+
+                if out is not None:
+                    out.write(chunk)
+                else:
+                    data += chunk
+
+            if size == 0:
+                raise Exception("File is empty")
+            if file_type is None:
+                raise Exception("File content is not a PDF, PNG or JPEG")
+        except Exception:
+            if out is not None:
+                out.close()
+                out = None
+            if file_path is not None:
+                file_path.unlink(missing_ok=True)
+            raise
+        finally:
+            if out is not None:
+                out.close()
+
+        upload = {'size': size, 'type': file_type, 'sha256': content_hash.hexdigest()}
+        if file_path is not None:
+            upload['path'] = file_path
+        else:
+            upload['data'] = data
+        return upload
 
 
 # Create global instance
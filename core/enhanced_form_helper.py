@@ -9,7 +9,10 @@ from data.form_knowledge_base import (
     FORM_SCHEMAS, FORM_TRIGGERS, COMMON_MISTAKES, REQUIRED_DOCUMENTS
 )
 from services.openai_service import openai_service
+from services.model_router import followup_intent
 from services.vector_store import vector_store
+from utils.prompt_builder import PromptBuilder, get_budget
+from utils.concurrency import PRIORITY_HIGH, RateLimitExceeded
 
 
 class EnhancedFormHelper:
@@ -218,6 +221,11 @@ class EnhancedFormHelper:
 
     def search_form_knowledge_in_rag(self, form_code: str, query: str) -> str:
         """Search official documents for form-specific information"""
+        # Structured form knowledge is enough - don't wait for the model to load
+        if not vector_store.is_ready():
+            vector_store.start_background_init()
+            return ""
+
         try:
             # Enhanced query with form context
             enhanced_query = f"{form_code} form: {query}"
@@ -225,7 +233,8 @@ class EnhancedFormHelper:
             results = vector_store.search(enhanced_query, k=2)
 
             if results:
-                context = '\n\n'.join([doc.page_content[:500] for doc in results])
+                # Trimmed to the prompt budget by the caller
+                context = '\n\n'.join([doc.page_content for doc in results])
                 return context
 
             return ""
@@ -286,26 +295,22 @@ class EnhancedFormHelper:
 
         # RAG search for official documentation
         rag_context = self.search_form_knowledge_in_rag(form_code, user_question)
-        if rag_context:
-            context_parts.append("\nOfficial documentation reference:")
-            context_parts.append(rag_context)
 
-        structured_context = '\n'.join(context_parts)
+        # Fill the budget: field guidance, recent conversation, then official documentation
+        builder = PromptBuilder(get_budget('form_field'))
+        builder.add('form', '\n'.join(context_parts), priority=1)
+        builder.add_history('history', conversation_history, priority=2, max_tokens=600, keep_last=2)
+        builder.add('documentation', rag_context, priority=3)
+        sections = builder.build()
+
+        structured_context = sections['form']
+        if sections['documentation']:
+            structured_context += f"\n\nOfficial documentation reference:\n{sections['documentation']}"
 
         # Build conversation context
         conv_context = ""
-        if conversation_history and len(conversation_history) > 1:
-            recent = conversation_history[-6:]
-            conv_lines = []
-            for idx, msg in enumerate(recent):
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                if idx >= len(recent) - 2:
-                    content = msg['content']
-                else:
-                    content = msg['content'][:200] if len(msg['content']) > 200 else msg['content']
-                conv_lines.append(f"{role}: {content}")
-
-            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{chr(10).join(conv_lines)}\n"
+        if sections['history']:
+            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{sections['history']}\n"
             conv_context += "\n⚠️ Use this conversation history for follow-up questions!\n"
 
         # Detect user language
@@ -354,7 +359,13 @@ Answer the user's question about this form field.
 - For short questions (1-3 words) → Refer to the field just discussed"""
 
         try:
-            result = openai_service.get_response(user_question, system_prompt)
+            result = openai_service.get_response(
+                user_question, system_prompt, priority=PRIORITY_HIGH,
+                route='form', intent=followup_intent(user_question, conversation_history)
+            )
+            if not result['success']:
+                # Language model unavailable - answer from the structured form knowledge
+                result = self._guidance_fallback(result, structured_context, user_language)
 
             if result['success']:
                 return {
@@ -374,6 +385,8 @@ Answer the user's question about this form field.
                     'error': result['error']
                 }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -410,22 +423,18 @@ Answer the user's question about this form field.
                 label = field_data.get('label', 'Unknown')
                 context_parts.append(f"• Field {field_key}: {label}")
 
-        structured_context = '\n'.join(context_parts)
+        # Fill the budget: form data first, then recent conversation
+        builder = PromptBuilder(get_budget('form_section'))
+        builder.add('form', '\n'.join(context_parts), priority=1)
+        builder.add_history('history', conversation_history, priority=2, keep_last=2)
+        sections = builder.build()
+
+        structured_context = sections['form']
 
         # Build conversation context
         conv_context = ""
-        if conversation_history and len(conversation_history) > 1:
-            recent = conversation_history[-6:]
-            conv_lines = []
-            for idx, msg in enumerate(recent):
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                if idx >= len(recent) - 2:
-                    content = msg['content']
-                else:
-                    content = msg['content'][:200] if len(msg['content']) > 200 else msg['content']
-                conv_lines.append(f"{role}: {content}")
-
-            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{chr(10).join(conv_lines)}\n"
+        if sections['history']:
+            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{sections['history']}\n"
             conv_context += "\n⚠️ Use this for follow-up questions!\n"
 
         # Detect language
@@ -466,7 +475,13 @@ Explain this section of the form and help the user fill it out.
 - "More details" → Go deeper into detail"""
 
         try:
-            result = openai_service.get_response(user_question, system_prompt)
+            result = openai_service.get_response(
+                user_question, system_prompt, priority=PRIORITY_HIGH,
+                route='form', intent=followup_intent(user_question, conversation_history)
+            )
+            if not result['success']:
+                # Language model unavailable - answer from the structured form knowledge
+                result = self._guidance_fallback(result, structured_context, user_language)
 
             if result['success']:
                 return {
@@ -481,6 +496,8 @@ Explain this section of the form and help the user fill it out.
                     'error': result['error']
                 }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -526,22 +543,18 @@ Explain this section of the form and help the user fill it out.
             for note in form_data['critical_notes']:
                 context_parts.append(f"• {note}")
 
-        structured_context = '\n'.join(context_parts)
+        # Fill the budget: form data first, then recent conversation
+        builder = PromptBuilder(get_budget('form_overview'))
+        builder.add('form', '\n'.join(context_parts), priority=1)
+        builder.add_history('history', conversation_history, priority=2, keep_last=2)
+        sections = builder.build()
+
+        structured_context = sections['form']
 
         # Build conversation context
         conv_context = ""
-        if conversation_history and len(conversation_history) > 1:
-            recent = conversation_history[-6:]
-            conv_lines = []
-            for idx, msg in enumerate(recent):
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                if idx >= len(recent) - 2:
-                    content = msg['content']
-                else:
-                    content = msg['content'][:200] if len(msg['content']) > 200 else msg['content']
-                conv_lines.append(f"{role}: {content}")
-
-            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{chr(10).join(conv_lines)}\n"
+        if sections['history']:
+            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{sections['history']}\n"
 
         # Detect language
         user_language = self._detect_language(user_question)
@@ -585,7 +598,13 @@ Explain this form and help the user understand it.
 - "Documents?" → List all required documents"""
 
         try:
-            result = openai_service.get_response(user_question, system_prompt)
+            result = openai_service.get_response(
+                user_question, system_prompt, priority=PRIORITY_HIGH,
+                route='form', intent=followup_intent(user_question, conversation_history)
+            )
+            if not result['success']:
+                # Language model unavailable - answer from the structured form knowledge
+                result = self._guidance_fallback(result, structured_context, user_language)
 
             if result['success']:
                 return {
@@ -599,6 +618,8 @@ Explain this form and help the user understand it.
                     'error': result['error']
                 }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -645,18 +666,13 @@ Explain this form and help the user understand it.
         user_language = self._detect_language(user_message)
 
         # Build context from conversation if available
+        builder = PromptBuilder(get_budget('form_generic'))
+        builder.add_history('history', conversation_history, priority=1)
+        history = builder.build()['history']
+
         conv_context = ""
-        if conversation_history and len(conversation_history) > 1:
-            recent = conversation_history[-6:]
-            conv_lines = []
-            for idx, msg in enumerate(recent):
-                role = "User" if msg['role'] == 'user' else "Assistant"
-                if idx >= len(recent) - 2:
-                    content = msg['content'][:150] if len(msg['content']) > 150 else msg['content']
-                else:
-                    content = msg['content'][:100] if len(msg['content']) > 100 else msg['content']
-                conv_lines.append(f"{role}: {content}")
-            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{chr(10).join(conv_lines)}\n"
+        if history:
+            conv_context = f"\n\n=== RECENT CONVERSATION ===\n{history}\n"
 
         # General form knowledge
         forms_list = "\n".join([
@@ -692,7 +708,13 @@ Answer the user's question about German Jobcenter forms.
 ⚠️ FOR FOLLOW-UPS: Use the conversation history above!"""
 
         try:
-            result = openai_service.get_response(user_message, system_prompt)
+            result = openai_service.get_response(
+                user_message, system_prompt, priority=PRIORITY_HIGH,
+                route='form', intent=followup_intent(user_message, conversation_history)
+            )
+            if not result['success']:
+                # Language model unavailable - answer from the structured form knowledge
+                result = self._guidance_fallback(result, forms_list, user_language)
 
             if result['success']:
                 return {
@@ -706,12 +728,30 @@ Answer the user's question about German Jobcenter forms.
                     'error': result['error']
                 }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
 
+    def _guidance_fallback(self, result: Dict, guidance: str, language: str) -> Dict:
+        """Stored form guidance as the answer when the language model call failed"""
+        print(f"Form helper using structured fallback: {result.get('error')}")
+        if language == 'de':
+            notice = ("⚠️ Der KI-Assistent ist gerade nicht erreichbar. "
+                      "Hier sind die hinterlegten Hinweise zu deiner Frage:")
+        else:
+            notice = ("⚠️ The AI assistant is temporarily unavailable. "
+                      "Here is the stored guidance for your question:")
+
+        return {
+            'success': True,
+            'response': f"{notice}\n\n{guidance}",
+            'fallback': True
+        }
+
     def _detect_language(self, text: str) -> str:
         """Simple language detection"""
         german_words = ['wie', 'was', 'wo', 'wann', 'ich', 'mein', 'das', 'ist', 'formular', 'feld']
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI-compatible chat completions server for load and latency tests
+
+Serves POST /v1/chat/completions (plain and streaming) with canned answers,
+configurable latency and injected errors, so the whole Flask pipeline can
+be benchmarked offline.
+
+Usage:
+    python fake_openai_server.py --port 8100 --latency lognormal:0.0,0.4 --error-rate 0.02
+
+Then start the app against it (fake embeddings avoid the model download):
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake EMBEDDING_BACKEND=fake python app.py
+
+Latency specs (seconds, time to first token):
+    fixed:0.5 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:MU,SIGMA | exp:MEAN
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_RESPONSES = {
+    'default': (
+        "Das ist eine Testantwort des lokalen Fake-Servers. "
+        "Für den Weiterbewilligungsantrag (WBA) benötigen Sie in der Regel aktuelle Kontoauszüge, "
+        "Nachweise über Einkommen sowie Änderungen bei Miete und Heizkosten. "
+        "Reichen Sie den Antrag rechtzeitig vor Ablauf des Bewilligungszeitraums beim Jobcenter ein."
+    ),
+    'rules': [
+        {'match': 'email', 'response': (
+            "Betreff: Anfrage\n\nSehr geehrte Damen und Herren,\n\n"
+            "hiermit bitte ich um Rückmeldung zu meinem Antrag.\n\nMit freundlichen Grüßen"
+        )},
+        {'match': 'analyze this document', 'response': (
+            "Dieses Dokument ist ein Bescheid des Jobcenters. Es enthält den Bewilligungszeitraum, "
+            "die Höhe der Leistungen und eine Rechtsbehelfsbelehrung."
+        )},
+    ]
+}
+
+TOKEN_PATTERN = re.compile(r'\S+\s*')
+
+
+def parse_latency(spec):
+    """Return a function producing latency samples (seconds) for a spec string"""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()]
+
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda: random.lognormvariate(values[0], values[1])
+    if kind == 'exp':
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def count_tokens(text):
+    """Rough token count (about 4 characters per token)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class FakeOpenAIServer:
+    """Canned-response chat completions with simulated latency and failures"""
+
+    def __init__(self, latency='lognormal:-0.5,0.5', tokens_per_second=50.0, error_rate=0.0,
+                 error_codes=(429, 500, 503), hang_rate=0.0, hang_seconds=120.0, responses=None):
+        self.sample_latency = parse_latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.responses = responses or DEFAULT_RESPONSES
+
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'streamed': 0, 'errors': 0, 'hangs': 0}
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/v1/chat/completions', 'chat_completions',
+                              self.chat_completions, methods=['POST'])
+        self.app.add_url_rule('/v1/models', 'models', self.models)
+        self.app.add_url_rule('/stats', 'stats', lambda: jsonify(self.stats))
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _pick_response(self, messages):
+        """First rule whose 'match' occurs in the last user message, else the default"""
+        user_text = next(
+            (m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), ''
+        ).lower()
+        for rule in self.responses.get('rules', []):
+            if rule['match'].lower() in user_text:
+                return rule['response']
+        return self.responses['default']
+
+    def _error_response(self):
+        code = random.choice(self.error_codes)
+        self._count('errors')
+        body = {'error': {
+            'message': f"Injected error {code}",
+            'type': 'rate_limit_error' if code == 429 else 'server_error',
+            'code': None
+        }}
+        headers = {'Retry-After': '1'} if code == 429 else {}
+        return jsonify(body), code, headers
+
+    def chat_completions(self):
+        payload = request.get_json(force=True)
+        messages = payload.get('messages', [])
+        model = payload.get('model', 'gpt-3.5-turbo')
+        max_tokens = payload.get('max_tokens') or 2000
+        self._count('requests')
+
+        if random.random() < self.hang_rate:
+            # Simulate a hung upstream connection (exercises client read timeouts)
+            self._count('hangs')
+            time.sleep(self.hang_seconds)
+
+        if random.random() < self.error_rate:
+            time.sleep(self.sample_latency() / 4)
+            return self._error_response()
+
+        content = self._pick_response(messages)
+        pieces = TOKEN_PATTERN.findall(content)[:max_tokens]
+        prompt_tokens = sum(count_tokens(m.get('content') or '') for m in messages)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': len(pieces),
+            'total_tokens': prompt_tokens + len(pieces)
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        token_delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        if payload.get('stream'):
+            self._count('streamed')
+
+            def generate():
+                time.sleep(self.sample_latency())
+                for index, piece in enumerate(pieces):
+                    delta = {'content': piece}
+                    if index == 0:
+                        delta['role'] = 'assistant'
+                    chunk = {
+                        'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                        'model': model,
+                        'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    time.sleep(token_delay)
+                final = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created,
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+                }
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return Response(generate(), mimetype='text/event-stream')
+
+        time.sleep(self.sample_latency() + token_delay * len(pieces))
+        return jsonify({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(pieces)},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        })
+
+    def models(self):
+        return jsonify({'object': 'list', 'data': [
+            {'id': 'gpt-3.5-turbo', 'object': 'model', 'owned_by': 'fake'}
+        ]})
+
+    def run(self, host='127.0.0.1', port=8100):
+        print(f"🧪 Fake OpenAI server on http://{host}:{port}/v1")
+        self.app.run(host=host, port=port, threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', default='lognormal:-0.5,0.5',
+                        help="Time to first token distribution, e.g. fixed:0.5 or uniform:0.2,1.5")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with an error")
+    parser.add_argument('--error-codes', default='429,500,503')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="Share of requests that hang")
+    parser.add_argument('--hang-seconds', type=float, default=120.0)
+    parser.add_argument('--responses', help="JSON file with {'default': ..., 'rules': [{'match', 'response'}]}")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+
+    FakeOpenAIServer(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(',') if code.strip()],
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        responses=responses
+    ).run(host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
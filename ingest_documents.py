@@ -7,6 +7,8 @@ import json
 import fitz  # PyMuPDF
 from pathlib import Path
 from datetime import datetime
+from langchain.schema import Document
+from config import Config
 from services.vector_store import vector_store
 from utils.text_processing import text_processor
 
@@ -64,7 +66,9 @@ class DocumentIngester:
             'chunks_count': chunks_count,
             'processed_at': datetime.now().isoformat()
         }
-        self.progress['total_chunks'] += chunks_count
+        self.progress['total_chunks'] = sum(
+            info.get('chunks_count', 0) for info in self.progress['processed_files'].values()
+        )
 
     def extract_text_from_pdf(self, pdf_path):
         """Extract text from PDF file"""
@@ -112,7 +116,7 @@ class DocumentIngester:
         if not force and self._is_file_processed(pdf_path):
             stored_info = self.progress['processed_files'][pdf_path.name]
             print(f"  ⏭️  Skipping {pdf_path.name} (already processed, {stored_info['chunks_count']} chunks)")
-            return stored_info['chunks_count']
+            return 0
 
         print(f"Processing: {pdf_path.name}")
 
@@ -161,18 +165,92 @@ class DocumentIngester:
                 'metadata': chunk_metadata
             })
 
+        self._warn_truncated_chunks(text_chunks)
+
         # Save chunks as JSONL
         jsonl_file = self.save_chunks_as_jsonl(detailed_chunks, pdf_path)
         print(f"  💾 Saved {len(detailed_chunks)} chunks to {jsonl_file.name}")
 
-        # Add to vector store
-        chunks_added = vector_store.add_document(cleaned_text, base_metadata)
+        # Upsert into vector store (deterministic ids - re-runs don't duplicate chunks)
+        documents = [
+            Document(page_content=chunk['content'], metadata=chunk['metadata'])
+            for chunk in detailed_chunks
+        ]
+        result = vector_store.upsert_documents(documents, source=pdf_path.name)
+        chunks_added = result['total']
 
         # Mark as processed
         self._mark_file_processed(pdf_path, chunks_added)
 
-        print(f"  ✅ Added {chunks_added} chunks to vector store")
-        return chunks_added
+        print(f"  ✅ {chunks_added} chunks in vector store "
+              f"({result['upserted']} embedded, {result['unchanged']} unchanged, {result['deleted']} removed)")
+        return result['upserted']
+
+    def _warn_truncated_chunks(self, text_chunks):
+        """Warn when chunks are longer than the embedding model can see"""
+        try:
+            max_tokens = Config.EMBEDDING_MAX_SEQ_LENGTH
+            over_limit = sum(
+                1 for chunk_text in text_chunks
+                if vector_store.embedding_service.count_tokens(chunk_text) > max_tokens
+            )
+        except Exception as e:
+            print(f"  ⚠️  Could not check chunk token lengths: {e}")
+            return
+
+        if over_limit:
+            print(f"  ⚠️  {over_limit}/{len(text_chunks)} chunks exceed {max_tokens} tokens and will be "
+                  f"truncated when embedded (set CHUNKING_MODE=tokens to avoid this)")
+
+    def _measure_truncation(self, tokenizer, text, max_tokens):
+        """Token count and number of characters cut off by the model's max sequence length"""
+        total_tokens = len(tokenizer.encode(text, add_special_tokens=True))
+        if total_tokens <= max_tokens:
+            return total_tokens, 0
+
+        encoded = tokenizer(text, truncation=True, max_length=max_tokens, return_offsets_mapping=True)
+        embedded_chars = max((end for _, end in encoded['offset_mapping']), default=0)
+        return total_tokens, len(text) - embedded_chars
+
+    def truncation_report(self):
+        """Report how much of the stored chunk text the embedding model never sees"""
+        jsonl_files = sorted(self.chunks_dir.glob("*.jsonl"))
+        if not jsonl_files:
+            print("No chunks found. Run ingestion first.")
+            return
+
+        max_tokens = Config.EMBEDDING_MAX_SEQ_LENGTH
+        tokenizer = vector_store.embedding_service.get_tokenizer()
+
+        print(f"Truncation report (chunking mode: {vector_store.chunking_mode}, "
+              f"model limit: {max_tokens} tokens)")
+
+        totals = {'chunks': 0, 'over_limit': 0, 'tokens': 0, 'lost_tokens': 0, 'chars': 0, 'lost_chars': 0}
+        for jsonl_file in jsonl_files:
+            stats = dict.fromkeys(totals, 0)
+            for chunk in self.load_chunks_from_jsonl(jsonl_file):
+                text = chunk['content']
+                tokens, lost_chars = self._measure_truncation(tokenizer, text, max_tokens)
+                stats['chunks'] += 1
+                stats['tokens'] += tokens
+                stats['chars'] += len(text)
+                if tokens > max_tokens:
+                    stats['over_limit'] += 1
+                    stats['lost_tokens'] += tokens - max_tokens
+                    stats['lost_chars'] += lost_chars
+
+            for key in totals:
+                totals[key] += stats[key]
+            self._print_truncation_row(jsonl_file.name, stats)
+
+        print()
+        self._print_truncation_row("TOTAL", totals)
+
+    def _print_truncation_row(self, label, stats):
+        tokens_pct = 100.0 * stats['lost_tokens'] / stats['tokens'] if stats['tokens'] else 0.0
+        chars_pct = 100.0 * stats['lost_chars'] / stats['chars'] if stats['chars'] else 0.0
+        print(f"  {label}: {stats['over_limit']}/{stats['chunks']} chunks over limit, "
+              f"{tokens_pct:.1f}% of tokens and {stats['lost_chars']} chars ({chars_pct:.1f}%) truncated")
 
     def process_all_pdfs(self, force=False):
         """Process all PDFs in the documents directory"""
@@ -192,6 +270,16 @@ class DocumentIngester:
 
         total_new_chunks = 0
 
+        # Remove chunks of documents that were deleted from the documents folder
+        current_names = {pdf.name for pdf in pdf_files}
+        for removed_name in [name for name in self.progress['processed_files'] if name not in current_names]:
+            deleted = vector_store.delete_source(removed_name)
+            del self.progress['processed_files'][removed_name]
+            stale_jsonl = self.chunks_dir / f"{Path(removed_name).stem}_chunks.jsonl"
+            if stale_jsonl.exists():
+                stale_jsonl.unlink()
+            print(f"  🗑️  Removed {deleted} chunks of deleted document {removed_name}")
+
         for pdf_path in pdf_files:
             try:
                 chunks_added = self.process_single_pdf(pdf_path, force)
@@ -214,7 +302,7 @@ class DocumentIngester:
 
         print(f"\n🎉 Processing complete!")
         print(f"PDFs processed: {len(pdf_files)}")
-        print(f"New chunks added this run: {total_new_chunks}")
+        print(f"Chunks embedded this run: {total_new_chunks}")
         print(f"Total chunks in vector DB: {info['count']}")
 
         self._save_progress()
@@ -269,6 +357,9 @@ class DocumentIngester:
         for jsonl_file in self.chunks_dir.glob("*.jsonl"):
             jsonl_file.unlink()
 
+        # Drop cached search results in running app processes
+        vector_store.bump_generation()
+
         print("Progress reset. All files will be reprocessed on next run.")
 
 
@@ -287,8 +378,10 @@ def main():
         elif command == "force":
             print("Force processing all files...")
             ingester.process_all_pdfs(force=True)
+        elif command == "truncation":
+            ingester.truncation_report()
         else:
-            print("Usage: python ingest_documents.py [list|reset|force]")
+            print("Usage: python ingest_documents.py [list|reset|force|truncation]")
     else:
         ingester.process_all_pdfs()
 
@@ -155,9 +155,12 @@ class Message(db.Model):
     used_knowledge_base = db.Column(db.Boolean, default=False)
     file_info = db.Column(db.Text, nullable=True)
 
-    def to_dict(self):
-        """Convert to dictionary for JSON serialization"""
-        return {
+    usage = db.relationship('MessageUsage', backref='message', uselist=False,
+                            cascade='all, delete-orphan')
+
+    def to_dict(self, include_usage=False):
+        """Convert to dictionary for JSON serialization (usage loads the MessageUsage row)"""
+        data = {
             'id': self.id,
             'role': self.role,
             'content': self.content,
@@ -167,6 +170,9 @@ class Message(db.Model):
             'used_knowledge_base': self.used_knowledge_base,
             'file_info': json.loads(self.file_info) if self.file_info else None
         }
+        if include_usage:
+            data['usage'] = self.usage.to_dict() if self.usage else None
+        return data
 
     def set_sources(self, sources_list):
         """Set sources as JSON string"""
@@ -183,6 +189,97 @@ class Message(db.Model):
             self.file_info = None
 
 
+class MessageUsage(db.Model):
+    """LLM usage and latency for one assistant message"""
+    __tablename__ = 'message_usage'
+
+    __table_args__ = (
+        db.Index('idx_usage_route', 'route', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False, unique=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chats.id'), nullable=False, index=True)
+
+    route = db.Column(db.String(30), nullable=True)
+    model = db.Column(db.String(100), nullable=True)
+    llm_calls = db.Column(db.Integer, default=0)
+    cached_calls = db.Column(db.Integer, default=0)
+    coalesced_calls = db.Column(db.Integer, default=0)
+    tokens_estimated = db.Column(db.Boolean, default=False)
+
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    total_tokens = db.Column(db.Integer, default=0)
+    llm_latency_ms = db.Column(db.Integer, default=0)
+    total_latency_ms = db.Column(db.Integer, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'route': self.route,
+            'model': self.model,
+            'llm_calls': self.llm_calls,
+            'cached_calls': self.cached_calls,
+            'coalesced_calls': self.coalesced_calls,
+            'tokens_estimated': self.tokens_estimated,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+            'llm_latency_ms': self.llm_latency_ms,
+            'total_latency_ms': self.total_latency_ms
+        }
+
+
+class UploadJob(db.Model):
+    """Background document upload job (survives restarts; see services.job_queue)"""
+    __tablename__ = 'upload_jobs'
+
+    __table_args__ = (
+        db.Index('idx_job_status', 'status', 'created_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chats.id'), nullable=False, index=True)
+
+    # queued -> running -> completed / failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    stage = db.Column(db.String(50), nullable=True)
+    progress = db.Column(db.Integer, default=0)
+    attempts = db.Column(db.Integer, default=0)
+
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # Queued retries are not claimed before this time (backoff)
+    not_before = db.Column(db.DateTime, nullable=True)
+
+    def get_payload(self):
+        return json.loads(self.payload) if self.payload else {}
+
+    def to_dict(self):
+        """Convert to dictionary for JSON serialization"""
+        return {
+            'job_id': self.id,
+            'chat_id': self.chat_id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'attempts': self.attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
 def init_database(app):
     """Initialize database with app"""
     db.init_app(app)
@@ -224,8 +321,13 @@ def create_new_chat(title=None):
 
 
 def add_message_to_chat(chat_id, role, content, sources=None, message_type='chat',
-                        used_knowledge_base=False, file_info=None):
-    """Add message to chat - FIXED NAMING VERSION"""
+                        used_knowledge_base=False, file_info=None, usage=None, commit=True):
+    """
+    Add message to chat - FIXED NAMING VERSION (usage: RequestUsage.summary() dict)
+
+    commit=False only flushes: the caller commits it together with its own
+    writes (upload jobs commit the message with the job's completion).
+    """
 
     try:
         # Get chat (with locking for safety)
@@ -256,6 +358,9 @@ def add_message_to_chat(chat_id, role, content, sources=None, message_type='chat
         if file_info:
             message.set_file_info(file_info)
 
+        if usage:
+            message.usage = MessageUsage(chat_id=chat_id, **usage)
+
         db.session.add(message)
 
         # Update chat timestamp
@@ -272,7 +377,10 @@ def add_message_to_chat(chat_id, role, content, sources=None, message_type='chat
                 print(f"⏭️  SKIP NAMING: Chat {chat_id} already has {current_user_messages} user messages")
 
         # Commit everything
-        db.session.commit()
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         print(f"✅ Message added to chat {chat_id}, title: '{chat.title}'")
 
         return message
@@ -285,12 +393,13 @@ def add_message_to_chat(chat_id, role, content, sources=None, message_type='chat
         return None
 
 
-def get_chat_messages(chat_id, limit=100):
-    """Get messages for a specific chat"""
-    messages = Message.query.filter_by(chat_id=chat_id) \
-        .order_by(Message.timestamp.asc()) \
-        .limit(limit).all()
-    return [msg.to_dict() for msg in messages]
+def get_chat_messages(chat_id, limit=100, include_usage=False):
+    """Get messages for a specific chat (include_usage adds one batched usage query)"""
+    query = Message.query.filter_by(chat_id=chat_id)
+    if include_usage:
+        query = query.options(db.selectinload(Message.usage))
+    messages = query.order_by(Message.timestamp.asc()).limit(limit).all()
+    return [msg.to_dict(include_usage=include_usage) for msg in messages]
 
 
 def get_all_chats(limit=50):
@@ -299,6 +408,81 @@ def get_all_chats(limit=50):
     return [chat.to_dict() for chat in chats]
 
 
+def _usage_aggregates(query):
+    """Sum/average MessageUsage columns for a grouped or filtered query"""
+    return query.with_entities(
+        db.func.count(MessageUsage.id).label('messages'),
+        db.func.sum(MessageUsage.llm_calls).label('llm_calls'),
+        db.func.sum(MessageUsage.cached_calls).label('cached_calls'),
+        db.func.sum(MessageUsage.coalesced_calls).label('coalesced_calls'),
+        db.func.sum(MessageUsage.prompt_tokens).label('prompt_tokens'),
+        db.func.sum(MessageUsage.completion_tokens).label('completion_tokens'),
+        db.func.sum(MessageUsage.total_tokens).label('total_tokens'),
+        db.func.avg(MessageUsage.total_tokens).label('avg_tokens'),
+        db.func.avg(MessageUsage.llm_latency_ms).label('avg_llm_latency_ms'),
+        db.func.avg(MessageUsage.total_latency_ms).label('avg_total_latency_ms'),
+        db.func.max(MessageUsage.total_latency_ms).label('max_total_latency_ms')
+    )
+
+
+def _usage_row_to_dict(row):
+    return {
+        'messages': row.messages or 0,
+        'llm_calls': row.llm_calls or 0,
+        'cached_calls': row.cached_calls or 0,
+        'coalesced_calls': row.coalesced_calls or 0,
+        'prompt_tokens': row.prompt_tokens or 0,
+        'completion_tokens': row.completion_tokens or 0,
+        'total_tokens': row.total_tokens or 0,
+        'avg_tokens': round(row.avg_tokens or 0, 1),
+        'avg_llm_latency_ms': round(row.avg_llm_latency_ms or 0, 1),
+        'avg_total_latency_ms': round(row.avg_total_latency_ms or 0, 1),
+        'max_total_latency_ms': row.max_total_latency_ms or 0
+    }
+
+
+def get_usage_by_route(since=None):
+    """Token and latency totals per route, most tokens first"""
+    query = MessageUsage.query
+    if since is not None:
+        query = query.filter(MessageUsage.created_at >= since)
+
+    rows = _usage_aggregates(query).add_columns(MessageUsage.route) \
+        .group_by(MessageUsage.route) \
+        .order_by(db.func.sum(MessageUsage.total_tokens).desc()).all()
+
+    return [dict(route=row.route or 'unknown', **_usage_row_to_dict(row)) for row in rows]
+
+
+def get_chat_usage(chat_id):
+    """Token and latency totals for one chat, overall and per route"""
+    query = MessageUsage.query.filter_by(chat_id=chat_id)
+    totals = _usage_aggregates(query).one()
+    rows = _usage_aggregates(query).add_columns(MessageUsage.route) \
+        .group_by(MessageUsage.route).all()
+
+    return {
+        'chat_id': chat_id,
+        'totals': _usage_row_to_dict(totals),
+        'by_route': {row.route or 'unknown': _usage_row_to_dict(row) for row in rows}
+    }
+
+
+def create_upload_job(job_id, chat_id, payload):
+    """Persist a queued upload job"""
+    job = UploadJob(id=job_id, chat_id=chat_id, status='queued', stage='queued',
+                    payload=json.dumps(payload, ensure_ascii=False))
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_upload_job(job_id):
+    """Job status dict or None"""
+    job = db.session.get(UploadJob, job_id)
+    return job.to_dict() if job else None
+
+
 def delete_chat(chat_id):
     """Delete a chat and all its messages"""
     chat = Chat.query.get(chat_id)
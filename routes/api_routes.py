@@ -2,10 +2,11 @@
 API Routes - Chat management endpoints
 """
 
+from datetime import datetime, timedelta
 from flask import Blueprint, jsonify, request
 from models.database import (
     db, Chat, create_new_chat, get_chat_messages,
-    get_all_chats, delete_chat
+    get_all_chats, delete_chat, get_chat_usage, get_usage_by_route
 )
 
 api_bp = Blueprint('api', __name__)
@@ -51,7 +52,7 @@ def get_chat(chat_id):
         if not chat:
             return jsonify({'success': False, 'error': 'Chat not found'}), 404
 
-        messages = get_chat_messages(chat_id)
+        messages = get_chat_messages(chat_id, include_usage=True)
 
         return jsonify({
             'success': True,
@@ -95,4 +96,39 @@ def update_chat_context_endpoint(chat_id):
             return jsonify({'success': False, 'error': 'Chat not found'}), 404
     except Exception as e:
         print(f"Error updating context for chat {chat_id}: {e}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/chats/<int:chat_id>/usage', methods=['GET'])
+def get_chat_usage_endpoint(chat_id):
+    """Token and latency totals for a chat (overall and per route)"""
+    try:
+        chat = db.session.get(Chat, chat_id)
+        if not chat:
+            return jsonify({'success': False, 'error': 'Chat not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'usage': get_chat_usage(chat_id)
+        })
+    except Exception as e:
+        print(f"Error getting usage for chat {chat_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api_bp.route('/usage/routes', methods=['GET'])
+def get_route_usage():
+    """Token and latency totals per route (?days=N limits to recent messages)"""
+    try:
+        since = None
+        days = request.args.get('days', type=int)
+        if days:
+            since = datetime.utcnow() - timedelta(days=days)
+
+        return jsonify({
+            'success': True,
+            'routes': get_usage_by_route(since)
+        })
+    except Exception as e:
+        print(f"Error getting route usage: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -3,21 +3,40 @@ Chat Routes - Main chat functionality
 FIXED VERSION with enhanced form helper integration
 """
 
-from flask import Blueprint, request, jsonify, session
+import queue
+import threading
+import time
+from pathlib import Path
+from flask import Blueprint, Response, current_app, request, jsonify, session
+from config import Config
 from models.database import (
     db, Chat, get_or_create_default_chat, add_message_to_chat,
-    get_chat_messages, update_chat_context
+    get_chat_messages, update_chat_context, get_upload_job
 )
 from services.openai_service import openai_service
+from services.model_router import followup_intent
 from services.language_detection import language_service
+from services.semantic_cache import semantic_answer_cache
+from services.usage_tracker import record_llm_call, track_usage
+from services.job_queue import upload_job_queue
+from services.document_cache import document_cache
 from core.chat_handler import rag_chat_handler
 from core.document_processor import document_processor
+from core.document_analyzer import document_analyzer
 from core.enhanced_form_helper import enhanced_form_helper
 from utils.validation import validation_utils
 from utils.response_formatter import response_formatter
+from utils.prompt_builder import PromptBuilder, get_budget, truncate_to_tokens
+from utils.concurrency import PRIORITY_LOW, RateLimitExceeded
 
 chat_bp = Blueprint('chat', __name__)
 
+# Seconds between job status reads in /chat/jobs/<job_id>/events
+JOB_EVENTS_POLL_INTERVAL = 0.5
+
+# Bump when the document analysis prompts change (part of the analysis cache key)
+DOCUMENT_PROMPT_VERSION = 4
+
 
 def detect_user_intent(message):
     """Detect what user wants to do with the document"""
@@ -126,24 +145,16 @@ def route_user_message(user_message, conversation_history=None):
 def handle_direct_openai_fallback(user_message, language, conversation_history=None):
     """Fallback when both form helper and RAG fail"""
     conv_context = ""
-    if conversation_history and len(conversation_history) > 1:
-        # Use more context for better follow-up handling
-        recent = conversation_history[-6:]
-        conv_lines = []
-        for idx, msg in enumerate(recent):
-            role = "User" if msg['role'] == 'user' else "Assistant"
-            # Keep more content for recent messages
-            if idx >= len(recent) - 2:
-                content = msg['content'][:200] if len(msg['content']) > 200 else msg['content']
-            else:
-                content = msg['content'][:120] if len(msg['content']) > 120 else msg['content']
-            conv_lines.append(f"{role}: {content}")
+    builder = PromptBuilder(get_budget('fallback'))
+    builder.add_history('history', conversation_history, priority=1)
+    history = builder.build()['history']
 
+    if history:
         if language == 'de':
             conv_context = f"""
 
 === GESPRÄCHSKONTEXT ===
-{chr(10).join(conv_lines)}
+{history}
 
 ⚠️ WICHTIG: Nutze diesen Kontext für Folgefragen!
 - Bei kurzen Fragen (1-3 Wörter) → Beziehe dich auf vorheriges Thema
@@ -153,7 +164,7 @@ def handle_direct_openai_fallback(user_message, language, conversation_history=N
             conv_context = f"""
 
 === CONVERSATION CONTEXT ===
-{chr(10).join(conv_lines)}
+{history}
 
 ⚠️ IMPORTANT: Use this context for follow-up questions!
 - For short questions (1-3 words) → Refer to previous topic
@@ -182,8 +193,13 @@ You help with:
 Be helpful, clear, and professional. Use the conversation context above for follow-ups!"""
 
     try:
-        result = openai_service.get_response(user_message, system_prompt)
+        result = openai_service.get_response(
+            user_message, system_prompt, route='fallback',
+            intent=followup_intent(user_message, conversation_history)
+        )
         return result['response'] if result['success'] else "❌ I encountered an error. Please try again."
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         print(f"OpenAI fallback error: {e}")
         return "❌ I encountered an error. Please try again."
@@ -191,7 +207,12 @@ Be helpful, clear, and professional. Use the conversation context above for foll
 
 @chat_bp.route('/chat', methods=['POST'])
 def chat():
-    """Main chat endpoint - handles text messages and file uploads"""
+    """
+    Main chat endpoint - handles text messages and file uploads
+
+    With UPLOAD_JOBS_ENABLED, requests with files are answered with 202 and a
+    job ID; progress and the final answer come from /chat/jobs/<job_id>(/events).
+    """
     try:
         # Get chat_id
         chat_id = request.form.get('chat_id')
@@ -243,10 +264,6 @@ def chat():
                 file_info=file_info
             )
 
-        response_text = ""
-        sources = []
-        message_type = 'chat'
-
         # Detect language and intent
         try:
             user_language = language_service.get_response_language(user_message) if user_message else 'en'
@@ -263,15 +280,94 @@ def chat():
             user_language = 'de'
 
         # ====================================================================
-        # PROCESS MULTIPLE UPLOADED FILES
+        # FILE UPLOADS - saved up front, processed by the background job queue
         # ====================================================================
+        documents = []
         if files:
-            response_text, sources = process_uploaded_files(
-                files, user_language, user_intent, conversation_history
+            job_id = upload_job_queue.new_job_id() if Config.UPLOAD_JOBS_ENABLED else None
+            documents = save_uploads(files, upload_job_queue.job_dir(job_id) if job_id else None)
+
+            if not documents and not user_message:
+                error_response = response_formatter.format_error_response(
+                    "Couldn't accept any of the uploaded files.", 'validation_error'
+                )
+                return jsonify(error_response), 400
+
+            if documents and job_id:
+                upload_job_queue.submit(job_id, chat_id, {
+                    'message': user_message,
+                    'documents': documents,
+                    'language': user_language,
+                    'intent': user_intent,
+                    'conversation_history': conversation_history
+                })
+
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'status': 'queued',
+                    'chat_id': chat_id,
+                    'status_url': f"/chat/jobs/{job_id}",
+                    'events_url': f"/chat/jobs/{job_id}/events"
+                }), 202
+
+        try:
+            formatted_response = answer_chat_message(
+                chat_id, user_message, documents, document_context,
+                conversation_history, user_language, user_intent
+            )
+        finally:
+            for document in documents:
+                if 'path' in document:
+                    Path(document['path']).unlink(missing_ok=True)
+
+        return jsonify(formatted_response)
+
+    except RateLimitExceeded as e:
+        print(f"Chat rejected by admission control: {e}")
+        error_response = response_formatter.format_error_response(str(e), 'rate_limit')
+        return jsonify(error_response), 429
+
+    except Exception as e:
+        print(f"Chat error: {e}")
+        import traceback
+        traceback.print_exc()
+        error_response = response_formatter.format_error_response(
+            "An unexpected error occurred.", 'server_error'
+        )
+        return jsonify(error_response), 500
+
+
+def answer_chat_message(chat_id, user_message, documents, document_context, conversation_history,
+                        user_language, user_intent, progress=None):
+    """
+    Analyze saved uploads and/or answer the text message, then store the assistant message
+
+    Shared by /chat and upload jobs; progress (a JobProgress for jobs) is called
+    with (stage, percent) as work proceeds and checked before anything is written
+    to the chat. Returns the formatted /chat response.
+    """
+    response_text = ""
+    sources = []
+    message_type = 'chat'
+    usage_route = None
+
+    # Token and latency accounting for everything below
+    with track_usage() as usage:
+        # ====================================================================
+        # PROCESS MULTIPLE UPLOADED FILES
+        # ====================================================================
+        if documents:
+            usage_route = 'document'
+            response_text, sources, analysis_context = process_uploaded_files(
+                documents, user_language, user_intent, conversation_history, progress=progress
             )
 
             if response_text:
-                document_context = response_text[:4000]
+                # Long documents bring notes reduced to the context budget; short answers fit as they are
+                document_context = analysis_context or truncate_to_tokens(response_text, get_budget('document_context'))
+                if progress:
+                    progress.check()
                 update_chat_context(chat_id, document_context=document_context)
                 message_type = 'document'
 
@@ -280,128 +376,379 @@ def chat():
         # ====================================================================
         if user_message:
             # Check if this is just a simple file command
-            is_simple_cmd = files and is_simple_file_command(user_message)
+            is_simple_cmd = documents and is_simple_file_command(user_message)
 
             if not is_simple_cmd:
-                text_response, text_sources, msg_type = process_text_message(
+                if progress:
+                    progress('answering', 90)
+                text_response, text_sources, msg_type, text_route = process_text_message(
                     user_message, document_context, user_language,
                     conversation_history, response_text
                 )
+                usage_route = usage_route or text_route
 
                 if text_response:
                     response_text = f"{response_text}\n\n---\n\n{text_response}" if response_text else text_response
                     sources.extend(text_sources)
-                    if not files:
+                    if not documents:
                         message_type = msg_type
             else:
                 # Simple file command - file processing was enough
                 print(f"ℹ️ Simple file command detected: '{user_message}' - skipping RAG")
 
-        # Add assistant response to database
-        add_message_to_chat(
-            chat_id=chat_id,
-            role='assistant',
-            content=response_text,
-            sources=sources,
-            message_type=message_type,
-            used_knowledge_base=bool(sources)
-        )
+    if progress:
+        # Upload jobs: another worker may have taken the job over meanwhile
+        progress('saving', 95)
+        progress.check()
+
+    # Add assistant response to database (usage timed from the start of processing).
+    # Upload jobs leave it uncommitted: the job queue commits it with the job's
+    # completion, so a lost or crashed attempt never posts it twice
+    message = add_message_to_chat(
+        chat_id=chat_id,
+        role='assistant',
+        content=response_text,
+        sources=sources,
+        message_type=message_type,
+        used_knowledge_base=bool(sources),
+        usage=usage.summary(usage_route) if usage_route else None,
+        commit=progress is None
+    )
+
+    # Format response
+    formatted_response = response_formatter.format_chat_response(
+        response_text,
+        sources=sources if sources else [],
+        response_type=message_type
+    )
+
+    formatted_response["chat_id"] = chat_id
+    if message is not None:
+        formatted_response["message_id"] = message.id
+    if document_context:
+        formatted_response["document_text"] = document_context
+
+    return formatted_response
+
+
+def run_upload_job(job, progress):
+    """Job queue handler: process a queued upload as /chat would have"""
+    payload = job.get_payload()
+    chat_obj = db.session.get(Chat, job.chat_id)
+    if not chat_obj:
+        raise Exception(f"Chat {job.chat_id} not found")
+
+    return answer_chat_message(
+        job.chat_id,
+        payload.get('message'),
+        payload['documents'],
+        chat_obj.document_context or '',
+        payload.get('conversation_history') or [],
+        payload.get('language', 'en'),
+        payload.get('intent') or {'explain': True, 'translate': False},
+        progress=progress
+    )
+
+
+upload_job_queue.set_handler(run_upload_job)
+
+
+@chat_bp.route('/chat/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll an upload job (result holds the /chat response once completed)"""
+    job = get_upload_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **job})
+
+
+@chat_bp.route('/chat/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Upload job progress as Server-Sent Events
 
-        # Format response
-        formatted_response = response_formatter.format_chat_response(
-            response_text,
-            sources=sources if sources else [],
-            response_type=message_type
-        )
+    Events: 'progress' ({"stage", "progress"}) on every change, then 'done'
+    (the /chat response) or 'error'.
+    """
+    if not get_upload_job(job_id):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    app = current_app._get_current_object()
+
+    def generate():
+        last = None
+        idle = 0.0
+        while True:
+            # Read from the database so progress from any worker process shows up
+            with app.app_context():
+                job = get_upload_job(job_id)
+
+            if job is None or job['status'] == 'failed':
+                yield response_formatter.format_sse_event('error', response_formatter.format_error_response(
+                    (job or {}).get('error') or "Document processing failed.", 'server_error'
+                ))
+                break
+            if job['status'] == 'completed':
+                yield response_formatter.format_sse_event('done', job['result'])
+                break
+
+            current = (job['status'], job['stage'], job['progress'])
+            if current != last:
+                yield response_formatter.format_sse_event('progress', {
+                    'status': job['status'], 'stage': job['stage'], 'progress': job['progress']
+                })
+                last = current
+                idle = 0.0
+            elif idle >= 15:
+                # Keep proxies from closing the connection
+                yield ": keep-alive\n\n"
+                idle = 0.0
+
+            time.sleep(JOB_EVENTS_POLL_INTERVAL)
+            idle += JOB_EVENTS_POLL_INTERVAL
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming chat endpoint (Server-Sent Events) for text messages
+
+    Events: 'token' ({"text": ...}) as the answer is generated, then 'done' with
+    the same payload as /chat (final formatted text) or 'error'. 'reset' means
+    the answer streamed so far failed and must be discarded; the tokens that
+    follow come from the fallback answer.
+    """
+    try:
+        data = request.get_json(silent=True) or request.form
 
-        formatted_response["chat_id"] = chat_id
-        if document_context:
-            formatted_response["document_text"] = document_context
+        # Get chat_id
+        chat_id = data.get('chat_id')
+        if not chat_id:
+            chat_obj = get_or_create_default_chat()
+            chat_id = chat_obj.id
+        else:
+            chat_id = int(chat_id)
+            chat_obj = db.session.get(Chat, chat_id)
+            if not chat_obj:
+                return jsonify({'error': 'Chat not found'}), 404
 
-        return jsonify(formatted_response)
+        user_message = (data.get('message') or '').strip()
+        if not user_message:
+            error_response = response_formatter.format_error_response(
+                "Please provide a message.", 'validation_error'
+            )
+            return jsonify(error_response), 400
+
+        is_valid, error = validation_utils.validate_chat_message(user_message)
+        if not is_valid:
+            error_response = response_formatter.format_error_response(error, 'validation_error')
+            return jsonify(error_response), 400
+
+        document_context = chat_obj.document_context or ''
+        conversation_history = get_chat_messages(chat_id, limit=12)
+
+        add_message_to_chat(chat_id=chat_id, role='user', content=user_message)
+
+        try:
+            user_language = language_service.get_response_language(user_message)
+            if language_service.is_german_institution_request(user_message):
+                user_language = 'de'
+        except Exception as e:
+            print(f"Language detection error: {e}")
+            user_language = 'en'
 
     except Exception as e:
-        print(f"Chat error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Chat stream error: {e}")
         error_response = response_formatter.format_error_response(
             "An unexpected error occurred.", 'server_error'
         )
         return jsonify(error_response), 500
 
+    app = current_app._get_current_object()
+    events = queue.Queue()
 
-def process_uploaded_files(files, user_language, user_intent, conversation_history):
-    """Process multiple uploaded files and return combined analysis"""
-    try:
-        all_extracted_texts = []
-        processed_files = []
+    def run_pipeline():
+        """Generate the answer in a worker thread, pushing tokens onto the queue"""
+        with app.app_context():
+            try:
+                with track_usage() as usage, openai_service.stream_tokens_to(
+                        lambda text: events.put(('token', {'text': text})),
+                        on_reset=lambda: events.put(('reset', {}))):
+                    response_text, sources, message_type, route = process_text_message(
+                        user_message, document_context, user_language, conversation_history, ""
+                    )
+
+                # Persist once the stream is complete (also if the client disconnected)
+                add_message_to_chat(
+                    chat_id=chat_id,
+                    role='assistant',
+                    content=response_text,
+                    sources=sources,
+                    message_type=message_type,
+                    used_knowledge_base=bool(sources),
+                    usage=usage.summary(route)
+                )
 
-        for idx, file in enumerate(files):
-            print(f"Processing file {idx + 1}/{len(files)}: {file.filename}")
+                formatted_response = response_formatter.format_chat_response(
+                    response_text,
+                    sources=sources if sources else [],
+                    response_type=message_type
+                )
+                formatted_response["chat_id"] = chat_id
+                events.put(('done', formatted_response))
 
-            # Validate file
-            file.seek(0, 2)
-            file_size = file.tell()
-            file.seek(0)
+            except RateLimitExceeded as e:
+                print(f"Chat stream rejected by admission control: {e}")
+                events.put(('error', response_formatter.format_error_response(str(e), 'rate_limit')))
 
-            file_info_dict = {
-                'name': file.filename,
-                'size': file_size
-            }
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                import traceback
+                traceback.print_exc()
+                events.put(('error', response_formatter.format_error_response(
+                    "An unexpected error occurred.", 'server_error'
+                )))
 
-            is_valid, error = validation_utils.validate_file_upload(file_info_dict)
-            if not is_valid:
-                print(f"File {file.filename} validation failed: {error}")
-                continue
+    threading.Thread(target=run_pipeline, daemon=True).start()
 
-            # Process document
+    def generate():
+        while True:
             try:
-                file_path = document_processor.save_uploaded_file(file)
-                extracted_text = document_processor.process_document(file_path)
-                file_path.unlink()
-
-                if extracted_text:
-                    all_extracted_texts.append({
-                        'filename': file.filename,
-                        'text': extracted_text,
-                        'page_number': idx + 1
-                    })
-                    processed_files.append(file.filename)
-                    print(f"✅ Extracted {len(extracted_text)} chars from {file.filename}")
-            except Exception as e:
-                print(f"❌ Error processing {file.filename}: {e}")
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                # Keep proxies from closing the connection during retrieval
+                yield ": keep-alive\n\n"
                 continue
 
+            yield response_formatter.format_sse_event(event, payload)
+            if event in ('done', 'error'):
+                break
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def save_uploads(files, directory=None):
+    """
+    Validate uploaded files from their streams (skipping invalid ones)
+
+    With a directory every upload is written there (durable job uploads);
+    otherwise it stays in memory unless larger than UPLOAD_SPOOL_THRESHOLD.
+    Returns [{'filename', 'size', 'type', 'sha256', 'page_number', 'data' or
+    'path'}] in upload order; page_number is the position in the original upload.
+    """
+    documents = []
+    for idx, file in enumerate(files):
+        try:
+            upload = document_processor.read_upload(
+                file, spool_dir=directory, spool_threshold=0 if directory else None
+            )
+        except Exception as e:
+            print(f"File {file.filename} validation failed: {e}")
+            continue
+
+        document = {
+            'filename': file.filename,
+            'size': upload['size'],
+            'type': upload['type'],
+            'sha256': upload['sha256'],
+            'page_number': idx + 1
+        }
+        if 'path' in upload:
+            document['path'] = str(upload['path'])
+        else:
+            document['data'] = upload['data']
+        documents.append(document)
+    return documents
+
+
+def process_uploaded_files(documents, user_language, user_intent, conversation_history, progress=None):
+    """
+    Process saved uploads (see save_uploads) and return combined analysis
+
+    Returns (response, processed filenames, context); context is the
+    map-reduce notes for long documents, else None. The caller owns the
+    files and deletes them afterwards.
+    """
+    try:
+        all_extracted_texts = []
+        processed_files = []
+
+        print(f"Processing {len(documents)} files")
+
+        def on_result(idx):
+            if progress:
+                progress(f"extracting {idx + 1}/{len(pending)}", 10 + 60 * (idx + 1) // len(pending))
+
+        # Files seen before (same content hash) skip extraction
+        results = [None] * len(documents)
+        if document_cache is not None:
+            for idx, document in enumerate(documents):
+                cached_text = document_cache.get_text(document['sha256']) if document.get('sha256') else None
+                if cached_text is not None:
+                    results[idx] = (cached_text, None)
+                    print(f"⚡ Document cache hit for {document['filename']}")
+
+        # OCR / PDF extraction runs in parallel on the shared process pool; results keep upload order
+        pending = [idx for idx, result in enumerate(results) if result is None]
+        if pending:
+            extracted = document_processor.extract_texts(
+                [documents[idx]['data'] if 'data' in documents[idx] else Path(documents[idx]['path'])
+                 for idx in pending],
+                file_types=[documents[idx].get('type') for idx in pending],
+                on_result=on_result
+            )
+            for idx, result in zip(pending, extracted):
+                results[idx] = result
+                text, error = result
+                if document_cache is not None and text and not error and documents[idx].get('sha256'):
+                    document_cache.set_text(documents[idx]['sha256'], text)
+
+        for document, (extracted_text, error) in zip(documents, results):
+            if error:
+                print(f"❌ Error processing {document['filename']}: {error}")
+                continue
+
+            if extracted_text:
+                all_extracted_texts.append({
+                    'filename': document['filename'],
+                    'text': extracted_text,
+                    'page_number': document['page_number']
+                })
+                processed_files.append(document['filename'])
+                print(f"✅ Extracted {len(extracted_text)} chars from {document['filename']}")
+
         # Check if we got any text
         if all_extracted_texts:
             # Combine all texts with page markers
             combined_text = ""
             for item in all_extracted_texts:
-                if len(files) > 1:
+                if len(documents) > 1:
                     combined_text += f"\n\n--- PAGE {item['page_number']} ({item['filename']}) ---\n\n"
                 combined_text += item['text']
 
+            # Recent conversation gets a capped share, the document fills the rest
+            builder = PromptBuilder(get_budget('document'))
+            builder.add_history('history', conversation_history, priority=1, max_tokens=250)
+            builder.add('document', combined_text, priority=2)
+            sections = builder.build()
+
             # Build conversation context
             conv_context = ""
-            if conversation_history and len(conversation_history) > 1:
-                # Take more context for file-related follow-ups
-                recent = conversation_history[-6:]
-                conv_lines = []
-                for idx, msg in enumerate(recent):
-                    role = 'User' if msg['role'] == 'user' else 'Assistant'
-                    # Keep more content for recent messages
-                    if idx >= len(recent) - 2:
-                        content = msg['content'][:300] if len(msg['content']) > 300 else msg['content']
-                    else:
-                        content = msg['content'][:150] if len(msg['content']) > 150 else msg['content']
-                    conv_lines.append(f"{role}: {content}")
-
-                conv_context = f"\n\n=== CONVERSATION HISTORY ===\n{chr(10).join(conv_lines)}\n"
+            if sections['history']:
+                conv_context = f"\n\n=== CONVERSATION HISTORY ===\n{sections['history']}\n"
                 conv_context += "\n⚠️ Use this history to understand follow-up requests about the document!\n"
 
             # Create system prompt
-            if len(files) > 1:
-                file_context = f"This is a multi-page document ({len(files)} pages/files). "
+            if len(documents) > 1:
+                file_context = f"This is a multi-page document ({len(documents)} pages/files). "
             else:
                 file_context = "This is a document. "
 
@@ -438,32 +785,83 @@ IMPORTANT for follow-ups:
                 else:
                     system_prompt = f"You are Amtly.{conv_context}\n\n{file_context}Explain the document (do NOT translate)."
 
-            result = openai_service.get_response(
-                f"Analyze this document:\n\n{combined_text[:3000]}",
-                system_prompt
-            )
+            if user_intent['explain'] and user_intent['translate']:
+                document_intent = 'explain_translate'
+            else:
+                document_intent = 'translate' if user_intent['translate'] else 'explain'
+
+            if progress:
+                progress('analyzing', 75)
+
+            # Analyses without conversation history depend only on the pages, language, intent
+            # and how they are produced (model and routing, prompts, budget, map-reduce)
+            map_reduce = Config.DOCUMENT_MAP_REDUCE_ENABLED and sections['document'] != combined_text
+            analysis_key = None
+            if document_cache is not None and not sections['history']:
+                page_hashes = [
+                    document.get('sha256') for document, (text, error) in zip(documents, results)
+                    if text and not error
+                ]
+                if all(page_hashes):
+                    analysis_key = document_cache.analysis_key(
+                        page_hashes, user_language, document_intent, variant={
+                            'pages': len(documents),
+                            'model': openai_service.model,
+                            'routing': openai_service.router.fingerprint(),
+                            'prompt_version': DOCUMENT_PROMPT_VERSION,
+                            'budget': get_budget('document'),
+                            'map_reduce': map_reduce
+                        }
+                    )
+
+            cached_analysis = document_cache.get_analysis(analysis_key) if analysis_key else None
+            if cached_analysis is not None:
+                print("⚡ Document analysis cache hit")
+                record_llm_call(openai_service.model, cached=True)
+                result = {'success': True, **cached_analysis}
+            elif map_reduce:
+                # Too long for one prompt - analyze segments in parallel and merge
+                result = document_analyzer.analyze(
+                    combined_text, system_prompt, user_language, document_intent, file_context,
+                    progress=progress, context_budget=get_budget('document_context')
+                )
+            else:
+                result = openai_service.get_response(
+                    f"Analyze this document:\n\n{sections['document']}",
+                    system_prompt,
+                    priority=PRIORITY_LOW,
+                    route='document',
+                    intent=document_intent
+                )
+            if cached_analysis is None and analysis_key and result['success']:
+                document_cache.set_analysis(analysis_key, result['response'], result.get('context'))
 
             if result['success']:
-                if len(files) > 1:
-                    prefix = f"📄 **Multi-Page Document Analysis ({len(files)} pages):**\n\n"
+                if len(documents) > 1:
+                    prefix = f"📄 **Multi-Page Document Analysis ({len(documents)} pages):**\n\n"
                 else:
                     prefix = "📄 **Document Analysis:**\n\n"
                 response_text = prefix + result['response']
             else:
                 response_text = "📄 Documents processed but had trouble analyzing them."
 
-            return response_text, processed_files
+            return response_text, processed_files, result.get('context') if result['success'] else None
         else:
-            return "❌ Couldn't extract text from any files. Ensure documents are clear.", []
+            return "❌ Couldn't extract text from any files. Ensure documents are clear.", [], None
 
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         print(f"File processing error: {e}")
-        return f"❌ Error processing files: {str(e)}", []
+        return f"❌ Error processing files: {str(e)}", [], None
 
 
 def process_text_message(user_message, document_context, user_language, conversation_history, existing_response):
     """
     Process text message with improved form routing
+
+    Returns (response, sources, message_type, route); route is the one that
+    actually answered (form, rag_general or rag_german_email).
     """
     route = route_user_message(user_message, conversation_history)
     sources = []
@@ -507,7 +905,7 @@ def process_text_message(user_message, document_context, user_language, conversa
 
             form_response += f"\n\n{form_result['response']}"
 
-            return form_response, sources, 'form'
+            return form_response, sources, 'form', route
         else:
             # Form helper failed, fall back to RAG
             print(f"Form helper failed: {form_result.get('error')}")
@@ -519,6 +917,24 @@ def process_text_message(user_message, document_context, user_language, conversa
     if route.startswith('rag'):
         effective_language = 'de' if route == 'rag_german_email' else user_language
 
+        # First-turn questions without a document depend only on the question itself
+        use_semantic_cache = (
+            semantic_answer_cache is not None
+            and not conversation_history and not document_context and not existing_response
+            and semantic_answer_cache.is_cacheable(user_message)
+        )
+
+        if use_semantic_cache:
+            try:
+                cached = semantic_answer_cache.lookup(user_message, effective_language, route)
+                if cached:
+                    print(f"⚡ Semantic cache hit (similarity {cached['similarity']:.3f})")
+                    record_llm_call(openai_service.model, cached=True)
+                    return cached['answer'], cached['sources'], 'chat', route
+            except Exception as e:
+                print(f"Semantic cache error: {e}")
+                use_semantic_cache = False
+
         try:
             rag_result = rag_chat_handler.generate_rag_response(
                 user_message, document_context, effective_language,
@@ -529,22 +945,26 @@ def process_text_message(user_message, document_context, user_language, conversa
                 response = rag_result['response']
                 if rag_result.get('sources'):
                     sources = rag_result['sources']
-                return response, sources, 'chat'
+                if use_semantic_cache and not rag_result.get('fallback'):
+                    semantic_answer_cache.store(user_message, effective_language, route, response, sources)
+                return response, sources, 'chat', route
             else:
                 # Fallback to direct OpenAI
                 response = handle_direct_openai_fallback(
                     user_message, effective_language, conversation_history
                 )
-                return response, sources, 'chat'
+                return response, sources, 'chat', route
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             print(f"RAG error: {e}")
             response = handle_direct_openai_fallback(
                 user_message, effective_language, conversation_history
             )
-            return response, sources, 'chat'
+            return response, sources, 'chat', route
 
-    return "", sources, 'chat'
+    return "", sources, 'chat', route
 
 
 @chat_bp.route('/clear_session', methods=['POST'])
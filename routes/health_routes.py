@@ -6,6 +6,12 @@ from flask import Blueprint, jsonify, current_app
 from datetime import datetime
 from config import Config
 from services.vector_store import vector_store
+from services.embedding_service import embedding_service
+from services.lexical_index import lexical_index
+from services.openai_service import openai_service
+from services.semantic_cache import semantic_answer_cache
+from services.job_queue import upload_job_queue
+from services.document_cache import document_cache
 from models.database import Chat, Message
 
 health_bp = Blueprint('health', __name__)
@@ -16,19 +22,23 @@ def health_check():
     """Application health check"""
     try:
         openai_configured = bool(Config.OPENAI_API_KEY)
-        vector_info = vector_store.get_collection_info()
+        vector_info = vector_store.get_collection_info(wait=False)
+        readiness = vector_store.get_readiness()
 
         with current_app.app_context():
             chat_count = Chat.query.count()
             message_count = Message.query.count()
 
         return jsonify({
-            "status": "healthy",
+            "status": "healthy" if readiness['ready'] else "starting",
             "timestamp": datetime.now().isoformat(),
+            "liveness": "alive",
+            "readiness": readiness,
             "services": {
                 "openai": {
                     "configured": openai_configured,
-                    "model": Config.OPENAI_MODEL
+                    "model": Config.OPENAI_MODEL,
+                    **openai_service.get_resilience_stats()
                 },
                 "vector_store": {
                     "status": vector_info['status'],
@@ -49,11 +59,31 @@ def health_check():
         }), 500
 
 
+@health_bp.route('/health/live')
+def liveness():
+    """Liveness probe - the process is up and serving requests"""
+    return jsonify({
+        "status": "alive",
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@health_bp.route('/health/ready')
+def readiness():
+    """Readiness probe - knowledge base and embedding model are loaded"""
+    readiness_info = vector_store.get_readiness()
+    return jsonify({
+        "status": "ready" if readiness_info['ready'] else "not_ready",
+        "timestamp": datetime.now().isoformat(),
+        **readiness_info
+    }), 200 if readiness_info['ready'] else 503
+
+
 @health_bp.route('/status')
 def status():
     """Detailed system status"""
     try:
-        vector_info = vector_store.get_collection_info()
+        vector_info = vector_store.get_collection_info(wait=False)
 
         with current_app.app_context():
             chat_count = Chat.query.count()
@@ -78,8 +108,23 @@ def status():
             "vector_store": {
                 "total_documents": vector_info['count'],
                 "collection_name": vector_info['name'],
-                "status": vector_info['status']
+                "status": vector_info['status'],
+                "lexical_index": lexical_index.get_stats()
+            },
+            "caches": {
+                "embeddings": embedding_service.get_cache_stats(),
+                "search_results": vector_store.get_cache_stats(),
+                "llm_responses": openai_service.get_cache_stats(),
+                "semantic_answers": (
+                    semantic_answer_cache.get_stats() if semantic_answer_cache else {'enabled': False}
+                ),
+                "documents": document_cache.get_stats() if document_cache else {'enabled': False}
             },
+            "embedding_batching": embedding_service.get_batch_stats(),
+            "llm_coalescing": openai_service.get_coalescing_stats(),
+            "llm_admission": openai_service.get_admission_stats(),
+            "llm_routing": openai_service.get_routing_stats(),
+            "upload_jobs": upload_job_queue.get_stats(),
             "configuration": {
                 "openai_model": Config.OPENAI_MODEL,
                 "max_tokens": Config.MAX_TOKENS,
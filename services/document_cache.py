@@ -0,0 +1,77 @@
+"""
+Content-hash cache for uploaded documents
+
+Users upload the same Bescheid or form again in new chats. Extracted text
+is cached by the SHA-256 of the upload bytes (computed while the upload is
+read), so OCR runs once per distinct file. Document analyses are cached by
+the hashes of all pages plus response language and intent. Both tables
+live in one SQLite file with entry limits and expiry.
+"""
+
+import hashlib
+import json
+from config import Config
+from utils.cache_utils import SQLiteCache
+
+
+class DocumentCache:
+    """Extracted text and analyses keyed by upload content"""
+
+    def __init__(self, db_path, max_entries=2000, ttl=None, max_value_bytes=1024 * 1024):
+        self.max_value_bytes = max_value_bytes
+        self.texts = SQLiteCache(db_path, table='document_texts', max_entries=max_entries, ttl=ttl)
+        self.analyses = SQLiteCache(db_path, table='document_analyses', max_entries=max_entries, ttl=ttl)
+
+    def get_text(self, sha256):
+        """Extracted text for an upload hash, or None"""
+        value = self.texts.get(sha256)
+        return value.decode('utf-8') if value is not None else None
+
+    def set_text(self, sha256, text):
+        value = text.encode('utf-8')
+        if len(value) <= self.max_value_bytes:
+            self.texts.set(sha256, value)
+
+    @staticmethod
+    def analysis_key(page_hashes, language, intent, variant=None):
+        """
+        Key for an analysis of these pages (in order) for one language and intent
+
+        variant holds whatever else shapes the answer (model, routing rules,
+        prompt version, budgets), so changing any of them misses the cache.
+        """
+        payload = json.dumps([list(page_hashes), language, intent, variant or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_analysis(self, key):
+        """Cached {'response', 'context'} dict, or None"""
+        value = self.analyses.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value.decode('utf-8'))
+        except ValueError:
+            return None
+
+    def set_analysis(self, key, analysis, context=None):
+        """Store an analysis and the chat context derived from it (None: use the analysis)"""
+        value = json.dumps({'response': analysis, 'context': context}, ensure_ascii=False).encode('utf-8')
+        if len(value) <= self.max_value_bytes:
+            self.analyses.set(key, value)
+
+    def get_stats(self):
+        """Hit/miss counters per table"""
+        return {
+            'enabled': True,
+            'ttl': self.texts.ttl,
+            'texts': self.texts.get_stats(),
+            'analyses': self.analyses.get_stats()
+        }
+
+
+# Create global instance
+document_cache = DocumentCache(
+    Config.DOCUMENT_CACHE_PATH,
+    max_entries=Config.DOCUMENT_CACHE_MAX_ENTRIES,
+    ttl=Config.DOCUMENT_CACHE_TTL
+) if Config.DOCUMENT_CACHE_ENABLED else None
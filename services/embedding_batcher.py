@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+
+
+class _PendingEmbedding:
+    """A single caller waiting for its vector"""
+
+    __slots__ = ('text', 'event', 'vector', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.event = threading.Event()
+        self.vector = None
+        self.error = None
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching queue for concurrent embedding requests
+
+    Callers block in submit(); a single worker thread collects requests for
+    up to `window_ms` (or until `max_batch_size` is reached), runs them as one
+    batch through `embed_fn` and hands every caller its own vector.
+    """
+
+    def __init__(self, embed_fn, window_ms=5, max_batch_size=32):
+        self.embed_fn = embed_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name='embedding-batcher', daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, text, timeout=None):
+        """Embed a single text as part of the next batch"""
+        self._ensure_worker()
+
+        pending = _PendingEmbedding(text)
+        self._queue.put(pending)
+
+        if not pending.event.wait(timeout):
+            raise TimeoutError("Embedding request timed out")
+        if pending.error is not None:
+            raise pending.error
+        return pending.vector
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            batch = self._collect_batch()
+
+            try:
+                vectors = self.embed_fn([item.text for item in batch])
+                if len(vectors) != len(batch):
+                    raise RuntimeError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+                for item, vector in zip(batch, vectors):
+                    item.vector = vector
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+            finally:
+                for item in batch:
+                    item.event.set()
+
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    def get_stats(self):
+        """Get batching statistics"""
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'window_ms': self.window * 1000,
+            'max_batch_size': self.max_batch_size
+        }
@@ -0,0 +1,85 @@
+import hashlib
+import re
+import unicodedata
+from array import array
+from config import Config
+from utils.cache_utils import LRUCache, SQLiteCache
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache
+
+    Tier 1 is an in-process LRU, tier 2 a SQLite file shared by all worker
+    processes. Keys are a hash of the model name and the normalized text,
+    so "Was ist WBA?" and "was ist  wba?" share one entry.
+    """
+
+    def __init__(self, model_name, memory_size=None, disk_size=None, disk_path=None):
+        self.model_name = model_name
+        self.memory = LRUCache(
+            max_size=memory_size if memory_size is not None else Config.EMBEDDING_CACHE_MEMORY_SIZE
+        )
+
+        self.disk = None
+        disk_size = disk_size if disk_size is not None else Config.EMBEDDING_CACHE_DISK_SIZE
+        if disk_size > 0:
+            try:
+                self.disk = SQLiteCache(
+                    disk_path or Config.EMBEDDING_CACHE_PATH,
+                    table='embeddings',
+                    max_entries=disk_size
+                )
+            except Exception as e:
+                print(f"⚠️ Embedding disk cache unavailable: {e}")
+
+    @staticmethod
+    def normalize(text):
+        """Normalize text so trivially different queries share a key"""
+        text = unicodedata.normalize('NFC', str(text))
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text.casefold()
+
+    def make_key(self, text):
+        """Cache key: hash of model name + normalized text"""
+        payload = f"{self.model_name}\x00{self.normalize(text)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        """Look up an embedding in memory, then on disk"""
+        key = self.make_key(text)
+
+        vector = self.memory.get(key)
+        if vector is not None:
+            return list(vector)
+
+        if self.disk is not None:
+            blob = self.disk.get(key)
+            if blob is not None:
+                vector = array('f')
+                vector.frombytes(blob)
+                vector = vector.tolist()
+                self.memory.set(key, tuple(vector))
+                return vector
+
+        return None
+
+    def set(self, text, vector):
+        """Store an embedding in both tiers"""
+        key = self.make_key(text)
+        self.memory.set(key, tuple(vector))
+        if self.disk is not None:
+            self.disk.set(key, array('f', vector).tobytes())
+
+    def clear(self):
+        """Clear both tiers"""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self):
+        """Hit/miss counters for both tiers"""
+        return {
+            'memory': self.memory.get_stats(),
+            'disk': self.disk.get_stats() if self.disk is not None else None
+        }
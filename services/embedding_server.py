@@ -0,0 +1,209 @@
+"""
+Standalone embedding server shared by all web workers
+
+Loads the embedding model once and serves embeddings over a Unix domain
+socket. Single-text requests from many workers are micro-batched on the
+server side.
+
+Start with:
+    EMBEDDING_SERVER_SOCKET=/tmp/amtly-embeddings.sock python -m services.embedding_server
+
+Workers switch to a thin client when EMBEDDING_SERVER_SOCKET is set.
+Connections are authenticated with EMBEDDING_SERVER_AUTHKEY or, when that
+is unset, a random key the server writes to EMBEDDING_SERVER_AUTHKEY_FILE
+(mode 0600, readable only by the app user).
+"""
+
+import os
+import secrets
+import threading
+from multiprocessing.connection import Client, Listener
+from config import Config
+
+
+def load_authkey(create=False):
+    """Authkey from the environment or the key file; create=True generates a missing file"""
+    if Config.EMBEDDING_SERVER_AUTHKEY:
+        return Config.EMBEDDING_SERVER_AUTHKEY
+
+    key_file = Config.EMBEDDING_SERVER_AUTHKEY_FILE
+    if create and not key_file.exists():
+        key_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+            print(f"🔑 Generated embedding server key in {key_file}")
+        except FileExistsError:
+            pass
+
+    try:
+        key = key_file.read_text().strip()
+    except FileNotFoundError:
+        key = ''
+    if not key:
+        raise ValueError(
+            f"No embedding server key: set EMBEDDING_SERVER_AUTHKEY or start the server to create {key_file}"
+        )
+    return key.encode()
+
+
+class EmbeddingServerClient:
+    """Thin client with the same interface as the local embedding backends"""
+
+    def __init__(self, socket_path=None, authkey=None, timeout=None):
+        self.socket_path = socket_path or Config.EMBEDDING_SERVER_SOCKET
+        # Loaded on first connect: the server may not have created the key file yet
+        self.authkey = authkey
+        self.timeout = timeout or Config.EMBEDDING_SERVER_TIMEOUT
+        self._local = threading.local()
+
+    def _connection(self):
+        """One connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.authkey is None:
+                self.authkey = load_authkey()
+            conn = Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _request(self, payload):
+        """Send a request, reconnecting once if the server was restarted"""
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(payload)
+                if not conn.poll(self.timeout):
+                    self._reset()
+                    raise TimeoutError(f"Embedding server did not answer within {self.timeout}s")
+                response = conn.recv()
+                break
+            except TimeoutError:
+                # The server may still be working on it - do not send the request twice
+                raise
+            except (OSError, EOFError):
+                self._reset()
+                if attempt == 1:
+                    raise
+
+        if not response.get('ok'):
+            raise RuntimeError(f"Embedding server error: {response.get('error')}")
+        return response
+
+    def embed_documents(self, texts):
+        """Create embeddings for multiple documents"""
+        if not texts:
+            return []
+        return self._request({'op': 'embed', 'texts': list(texts)})['vectors']
+
+    def embed_query(self, text):
+        """Create embedding for a single text"""
+        return self.embed_documents([text])[0]
+
+    def ping(self):
+        """Check the server and return its model info"""
+        return self._request({'op': 'ping'})
+
+
+class EmbeddingServer:
+    """Serves embeddings from a single loaded model to many client processes"""
+
+    def __init__(self, socket_path=None, authkey=None):
+        self.socket_path = socket_path or Config.EMBEDDING_SERVER_SOCKET
+        if not self.socket_path:
+            raise ValueError("EMBEDDING_SERVER_SOCKET is not configured")
+        self.authkey = authkey or load_authkey(create=True)
+
+        # Imported after the key exists (importing creates the global service)
+        from services.embedding_service import EmbeddingService
+        from services.embedding_batcher import EmbeddingBatcher
+
+        # Always embed locally in the server process
+        self.service = EmbeddingService(use_server=False)
+        self.model = self.service.embeddings
+        self.batcher = EmbeddingBatcher(
+            self.model.embed_documents,
+            window_ms=Config.EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=Config.EMBEDDING_BATCH_MAX_SIZE
+        )
+
+    def _embed(self, texts):
+        """Single texts go through the batcher, bulk requests straight to the model"""
+        if len(texts) == 1:
+            return [self.batcher.submit(texts[0])]
+        return self.model.embed_documents(texts)
+
+    def _handle_connection(self, conn):
+        """Serve requests from one client connection until it closes"""
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    break
+
+                try:
+                    op = request.get('op')
+                    if op == 'embed':
+                        response = {'ok': True, 'vectors': self._embed(request['texts'])}
+                    elif op == 'ping':
+                        response = {
+                            'ok': True,
+                            'model': self.service.model_name,
+                            'backend': self.service.backend,
+                            'batching': self.batcher.get_stats()
+                        }
+                    else:
+                        response = {'ok': False, 'error': f"Unknown operation: {op}"}
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+
+                conn.send(response)
+        except OSError as e:
+            print(f"Embedding server connection error: {e}")
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        """Accept client connections until interrupted"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.model.embed_query("warm up")
+
+        with Listener(self.socket_path, family='AF_UNIX', authkey=self.authkey) as listener:
+            os.chmod(self.socket_path, 0o660)
+            print(f"🚀 Embedding server listening on {self.socket_path}")
+            try:
+                while True:
+                    try:
+                        conn = listener.accept()
+                    except Exception as e:
+                        print(f"Embedding server accept error: {e}")
+                        continue
+                    threading.Thread(
+                        target=self._handle_connection, args=(conn,), daemon=True
+                    ).start()
+            except KeyboardInterrupt:
+                print("\n⏹️  Embedding server stopped")
+            finally:
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+
+
+def main():
+    EmbeddingServer().serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,48 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from config import Config
+from services.embedding_cache import EmbeddingCache
+from services.embedding_batcher import EmbeddingBatcher
 
 # Global variable to ensure single loading
 _EMBEDDINGS_INSTANCE = None
 _LOADING_IN_PROGRESS = False
 
 
-class EmbeddingService:
-    def __init__(self):
-        self.model_name = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+class EmbeddingService(Embeddings):
+    """Embedding service with query cache and micro-batching (also usable as LangChain embedding function)"""
+
+    def __init__(self, use_server=None):
+        self.model_name = Config.EMBEDDING_MODEL
+        self.backend = Config.EMBEDDING_BACKEND
+        self.cache = EmbeddingCache(self._cache_namespace()) if Config.EMBEDDING_CACHE_ENABLED else None
+
+        self._tokenizer = None
+
+        # Thin client mode: the model lives in a shared embedding server process
+        if use_server is None:
+            use_server = bool(Config.EMBEDDING_SERVER_SOCKET)
+        self.server_client = None
+        if use_server:
+            from services.embedding_server import EmbeddingServerClient
+            self.server_client = EmbeddingServerClient()
+
+        # The server batches requests itself, so only batch locally without it
+        self.batcher = None
+        if Config.EMBEDDING_BATCH_ENABLED and self.server_client is None:
+            self.batcher = EmbeddingBatcher(
+                self.embed_documents,
+                window_ms=Config.EMBEDDING_BATCH_WINDOW_MS,
+                max_batch_size=Config.EMBEDDING_BATCH_MAX_SIZE
+            )
 
     @property
     def embeddings(self):
         """Lazy load embeddings only ONCE globally"""
         global _EMBEDDINGS_INSTANCE, _LOADING_IN_PROGRESS
 
+        if self.server_client is not None:
+            return self.server_client
+
         # Return existing instance if already loaded
         if _EMBEDDINGS_INSTANCE is not None:
             return _EMBEDDINGS_INSTANCE
@@ -29,30 +57,103 @@ class EmbeddingService:
         # Load embeddings
         _LOADING_IN_PROGRESS = True
         try:
-            print("🔄 Loading embedding model... (this may take a moment)")
-            _EMBEDDINGS_INSTANCE = HuggingFaceEmbeddings(
-                model_name=self.model_name,
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
+            print(f"🔄 Loading embedding model ({self.backend})... (this may take a moment)")
+            _EMBEDDINGS_INSTANCE = self._create_backend()
             print("✅ Embedding model loaded!")
         finally:
             _LOADING_IN_PROGRESS = False
 
         return _EMBEDDINGS_INSTANCE
 
+    def _cache_namespace(self):
+        """Model identity used in cache keys (backends produce slightly different vectors)"""
+        if self.backend == 'onnx':
+            return f"{self.model_name}#onnx{'-int8' if Config.ONNX_QUANTIZED else ''}"
+        if self.backend == 'fake':
+            return "fake"
+        return self.model_name
+
+    def _create_backend(self):
+        """Create the configured embedding backend"""
+        if self.backend == 'fake':
+            # Deterministic hashed vectors for offline load tests (no model download)
+            from services.fake_embeddings import FakeEmbeddings
+            return FakeEmbeddings()
+
+        if self.backend == 'onnx':
+            try:
+                from services.onnx_embeddings import OnnxEmbeddings
+                return OnnxEmbeddings(
+                    quantized=Config.ONNX_QUANTIZED,
+                    max_seq_length=Config.EMBEDDING_MAX_SEQ_LENGTH,
+                    num_threads=Config.ONNX_NUM_THREADS
+                )
+            except (ImportError, FileNotFoundError) as e:
+                print(f"⚠️ ONNX backend unavailable ({e}), falling back to torch")
+                self.backend = 'torch'
+                if self.cache is not None:
+                    self.cache.model_name = self._cache_namespace()
+
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=self.model_name,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+
     def embed_text(self, text):
-        """Create embedding for a single text"""
-        return self.embeddings.embed_query(text)
+        """Create embedding for a single text (cached)"""
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                return cached
+
+        if self.batcher is not None:
+            vector = self.batcher.submit(text)
+        else:
+            vector = self.embeddings.embed_query(text)
+
+        if self.cache is not None:
+            self.cache.set(text, vector)
+        return vector
 
     def embed_documents(self, texts):
         """Create embeddings for multiple documents"""
         return self.embeddings.embed_documents(texts)
 
+    def embed_query(self, text):
+        """LangChain embedding interface - routes queries through the cache"""
+        return self.embed_text(text)
+
+    def get_tokenizer(self):
+        """The embedding model's tokenizer (loaded once, no model weights)"""
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    def count_tokens(self, text):
+        """Number of model tokens including special tokens (before truncation)"""
+        return len(self.get_tokenizer().encode(text, add_special_tokens=True))
+
     def is_loaded(self):
         """Check if embeddings are loaded"""
-        return _EMBEDDINGS_INSTANCE is not None
+        return self.server_client is not None or _EMBEDDINGS_INSTANCE is not None
+
+    def get_batch_stats(self):
+        """Get micro-batching statistics"""
+        if self.server_client is not None:
+            return {'enabled': True, 'mode': 'server', 'socket': self.server_client.socket_path}
+        if self.batcher is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.batcher.get_stats()}
+
+    def get_cache_stats(self):
+        """Get embedding cache statistics"""
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.get_stats()}
 
 
 # Create global instance
-embedding_service = EmbeddingService()
\ No newline at end of file
+embedding_service = EmbeddingService()
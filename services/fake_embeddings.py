@@ -0,0 +1,45 @@
+"""
+Deterministic fake embedding backend for offline benchmarks
+
+Hashes words into a fixed number of dimensions (signed feature hashing)
+and L2-normalizes the result. Texts that share words get similar vectors,
+so retrieval, caching and routing behave plausibly without loading a
+model. Not meant for real answers.
+"""
+
+import hashlib
+import math
+import re
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+class FakeEmbeddings:
+    """Same interface as HuggingFaceEmbeddings, no model weights"""
+
+    def __init__(self, dimensions=384):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            index = value % self.dimensions
+            sign = 1.0 if (value >> 32) & 1 else -1.0
+            vector[index] += sign
+
+        norm = math.sqrt(sum(x * x for x in vector))
+        if not norm:
+            # Empty text: fixed unit vector so distances stay defined
+            vector[0] = 1.0
+            return vector
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        """Create embeddings for multiple documents"""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        """Create embedding for a single text"""
+        return self._embed(text)
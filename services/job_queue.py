@@ -0,0 +1,369 @@
+"""
+Background job queue for document uploads
+
+Jobs are rows in the upload_jobs table; the in-memory queue only carries
+job IDs. A worker claims a job with a conditional UPDATE (queued ->
+running) and from then on owns it as (id, attempt): every later write
+(progress, heartbeat, completed / failed / retry) is conditional on
+status='running' and that attempt number, so a worker that lost the job
+cannot overwrite the new owner. While the handler runs, a heartbeat
+thread refreshes heartbeat_at; running jobs whose heartbeat is older than
+JOB_STALE_TIMEOUT (worker process died) are put back into the queue until
+JOB_MAX_ATTEMPTS is reached. Jobs rejected by admission control are
+retried after a backoff (not_before). Uploaded files live under
+uploads/jobs/<job_id>/ until the job finishes.
+"""
+
+import json
+import queue
+import random
+import shutil
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from config import Config
+from models.database import db, UploadJob, add_message_to_chat, create_upload_job
+from utils.concurrency import RateLimitExceeded
+
+FAILURE_MESSAGE = "❌ Sorry, your document could not be processed. Please try uploading it again."
+
+
+class JobOwnershipLost(Exception):
+    """The job was requeued or finished by someone else while this worker ran it"""
+
+
+class JobProgress:
+    """progress(stage, percent) callback for one claimed job attempt"""
+
+    def __init__(self, job_queue, job_id, attempt):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.attempt = attempt
+        self.lost = False
+
+    def __call__(self, stage, progress):
+        """Record progress and refresh the heartbeat (no-op once the job is lost)"""
+        if self.lost:
+            return
+        if not self.job_queue._update_owned(self.job_id, self.attempt, {
+            'stage': stage,
+            'progress': int(progress),
+            'heartbeat_at': datetime.utcnow()
+        }):
+            self.lost = True
+
+    def check(self):
+        """Raise JobOwnershipLost unless this attempt still owns the job"""
+        if self.lost or not self.job_queue._update_owned(
+                self.job_id, self.attempt, {'heartbeat_at': datetime.utcnow()}):
+            self.lost = True
+            raise JobOwnershipLost(f"Upload job {self.job_id} attempt {self.attempt} lost ownership")
+
+
+class JobQueue:
+    """Worker threads processing persisted upload jobs"""
+
+    def __init__(self, workers=2, max_attempts=2, stale_timeout=600.0, poll_interval=5.0,
+                 retry_backoff=30.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.stale_timeout = stale_timeout
+        self.heartbeat_interval = max(1.0, stale_timeout / 3)
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.jobs_dir = Config.UPLOADS_DIR / "jobs"
+
+        self.app = None
+        self.handler = None
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'retried': 0, 'recovered': 0, 'lost': 0}
+
+    def set_handler(self, handler):
+        """
+        handler(job, progress) -> result dict; runs inside an app context
+
+        progress is a JobProgress: call it with (stage, percent), and call
+        progress.check() right before writing results to the chat. Leave the
+        chat message uncommitted (flushed): it is committed in the same
+        transaction that marks this attempt completed, or rolled back.
+        """
+        self.handler = handler
+
+    def start(self, app):
+        """Recover unfinished jobs and start the worker threads"""
+        if self._threads:
+            return
+        self.app = app
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+        with app.app_context():
+            self.recover_stale_jobs()
+            pending = UploadJob.query.filter_by(status='queued').order_by(UploadJob.created_at).all()
+            for job in pending:
+                self._queue.put(job.id)
+            if pending:
+                print(f"📋 Resuming {len(pending)} queued upload jobs")
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"upload-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"📋 Upload job queue started ({self.workers} workers)")
+
+    def job_dir(self, job_id):
+        """Directory holding a job's uploaded files"""
+        return self.jobs_dir / job_id
+
+    def new_job_id(self):
+        return str(uuid.uuid4())
+
+    def submit(self, job_id, chat_id, payload):
+        """Persist and enqueue a job (files must already be in job_dir(job_id))"""
+        create_upload_job(job_id, chat_id, payload)
+        self._count('submitted')
+        self._queue.put(job_id)
+        return job_id
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _worker(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                # Pick up work another (crashed) process left behind, and due retries
+                job_id = self._find_orphaned_job()
+                if job_id is None:
+                    continue
+
+            try:
+                with self.app.app_context():
+                    self._run(job_id)
+            except Exception as e:
+                print(f"❌ Upload job worker error ({job_id}): {e}")
+                traceback.print_exc()
+
+    @staticmethod
+    def _due():
+        """Filter for queued jobs whose retry backoff has passed"""
+        return db.or_(UploadJob.not_before.is_(None), UploadJob.not_before <= datetime.utcnow())
+
+    def _find_orphaned_job(self):
+        try:
+            with self.app.app_context():
+                self.recover_stale_jobs()
+                job = UploadJob.query.filter(UploadJob.status == 'queued', self._due()) \
+                    .order_by(UploadJob.created_at).first()
+                return job.id if job else None
+        except Exception as e:
+            print(f"⚠️ Upload job recovery error: {e}")
+            return None
+
+    def recover_stale_jobs(self):
+        """Requeue running jobs without a recent heartbeat (their worker died)"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_timeout)
+        stale = UploadJob.query.filter(
+            UploadJob.status == 'running',
+            db.or_(UploadJob.heartbeat_at.is_(None), UploadJob.heartbeat_at < cutoff)
+        ).all()
+
+        recovered = 0
+        for job in stale:
+            if job.attempts >= self.max_attempts:
+                if self._fail(job.id, job.attempts, "Job was interrupted too many times", stale_before=cutoff):
+                    recovered += 1
+                continue
+
+            # Conditional: the heartbeat may have been refreshed since the SELECT
+            recovered += self._owned(job.id, job.attempts).filter(
+                db.or_(UploadJob.heartbeat_at.is_(None), UploadJob.heartbeat_at < cutoff)
+            ).update({'status': 'queued', 'stage': 'requeued', 'not_before': None},
+                     synchronize_session=False)
+            db.session.commit()
+
+        if recovered:
+            self._count('recovered', recovered)
+            print(f"♻️ Recovered {recovered} interrupted upload jobs")
+        return recovered
+
+    @staticmethod
+    def _owned(job_id, attempt):
+        """Query matching the job only while this attempt is running it"""
+        return UploadJob.query.filter_by(id=job_id, status='running', attempts=attempt)
+
+    def _update_owned(self, job_id, attempt, values):
+        """
+        Conditional update for one attempt; False if the job is no longer ours
+
+        Commits pending writes of the session with it, or rolls them back
+        when the attempt lost the job.
+        """
+        updated = self._owned(job_id, attempt).update(values, synchronize_session=False)
+        if updated != 1:
+            db.session.rollback()
+            return False
+        db.session.commit()
+        return True
+
+    def _claim(self, job_id):
+        """Atomically move a due queued job to running; returns the attempt number or None"""
+        now = datetime.utcnow()
+        claimed = UploadJob.query.filter(
+            UploadJob.id == job_id, UploadJob.status == 'queued', self._due()
+        ).update({
+            'status': 'running',
+            'stage': 'starting',
+            'started_at': now,
+            'heartbeat_at': now,
+            'not_before': None,
+            'attempts': UploadJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed != 1:
+            return None
+        return db.session.query(UploadJob.attempts).filter_by(id=job_id).scalar()
+
+    def _heartbeat(self, job_id, attempt, progress, stop):
+        """Keep a running job's heartbeat fresh while a long step (OCR, LLM wait) blocks"""
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                with self.app.app_context():
+                    if not self._update_owned(job_id, attempt, {'heartbeat_at': datetime.utcnow()}):
+                        progress.lost = True
+                        return
+            except Exception as e:
+                print(f"⚠️ Upload job heartbeat error ({job_id}): {e}")
+
+    def _run(self, job_id):
+        attempt = self._claim(job_id)
+        if attempt is None:
+            return
+
+        job = db.session.get(UploadJob, job_id)
+        db.session.refresh(job)
+        print(f"📋 Upload job {job_id} started (attempt {attempt})")
+
+        progress = JobProgress(self, job_id, attempt)
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job_id, attempt, progress, stop),
+            name=f"upload-job-heartbeat-{job_id[:8]}", daemon=True
+        )
+        heartbeat.start()
+
+        try:
+            result = self.handler(job, progress)
+        except JobOwnershipLost:
+            db.session.rollback()
+            self._count('lost')
+            print(f"⚠️ Upload job {job_id} attempt {attempt} was taken over, discarding its result")
+            return
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Upload job {job_id} failed: {e}")
+            traceback.print_exc()
+            if attempt < self.max_attempts and self.is_retryable(e):
+                self._retry_later(job_id, attempt, e)
+            else:
+                self._fail(job_id, attempt, str(e))
+            return
+        finally:
+            stop.set()
+
+        # One transaction with the handler's (flushed) chat message
+        completed = self._update_owned(job_id, attempt, {
+            'status': 'completed',
+            'stage': 'completed',
+            'progress': 100,
+            'result': json.dumps(result, ensure_ascii=False),
+            'finished_at': datetime.utcnow()
+        })
+        if not completed:
+            self._count('lost')
+            print(f"⚠️ Upload job {job_id} attempt {attempt} finished after losing the job")
+            return
+        self._count('completed')
+        self._cleanup_files(job_id)
+        print(f"✅ Upload job {job_id} completed")
+
+    def retry_delay(self, attempt, error):
+        """Jittered exponential backoff, at least the admission controller's retry-after"""
+        delay = self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+        return max(delay, getattr(error, 'retry_after', None) or 0)
+
+    def _retry_later(self, job_id, attempt, error):
+        delay = self.retry_delay(attempt, error)
+        if not self._update_owned(job_id, attempt, {
+            'status': 'queued',
+            'stage': 'retrying',
+            'not_before': datetime.utcnow() + timedelta(seconds=delay)
+        }):
+            return
+        self._count('retried')
+        print(f"🔁 Upload job {job_id} retrying in {delay:.0f}s")
+        # Other processes (or this one after a restart) pick it up via the idle poll
+        timer = threading.Timer(delay, self._queue.put, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _fail(self, job_id, attempt, error, stale_before=None):
+        """Mark the attempt failed and tell the user in the chat; False if not ours"""
+        query = self._owned(job_id, attempt)
+        if stale_before is not None:
+            query = query.filter(db.or_(UploadJob.heartbeat_at.is_(None), UploadJob.heartbeat_at < stale_before))
+        failed = query.update({
+            'status': 'failed',
+            'error': error,
+            'finished_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if failed != 1:
+            db.session.rollback()
+            return False
+
+        # The user's message is already in the chat - don't leave it unanswered.
+        # Committed together with the failed status
+        chat_id = db.session.query(UploadJob.chat_id).filter_by(id=job_id).scalar()
+        if add_message_to_chat(chat_id=chat_id, role='assistant', content=FAILURE_MESSAGE,
+                               message_type='error') is None:
+            # Chat gone (or the insert failed and was rolled back): still record the failure
+            self._owned(job_id, attempt).update({
+                'status': 'failed', 'error': error, 'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+
+        self._count('failed')
+        self._cleanup_files(job_id)
+        return True
+
+    @staticmethod
+    def is_retryable(error):
+        """Admission rejections are worth another attempt, other errors are not"""
+        return isinstance(error, RateLimitExceeded)
+
+    def _cleanup_files(self, job_id):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def get_stats(self):
+        """Queue depth and job counters"""
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            'workers': len(self._threads),
+            'queued_in_memory': self._queue.qsize(),
+            **stats
+        }
+
+
+# Create global instance
+upload_job_queue = JobQueue(
+    workers=Config.JOB_WORKERS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    stale_timeout=Config.JOB_STALE_TIMEOUT,
+    poll_interval=Config.JOB_POLL_INTERVAL,
+    retry_backoff=Config.JOB_RETRY_BACKOFF
+)
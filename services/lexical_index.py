@@ -0,0 +1,223 @@
+"""
+BM25 lexical index over the ingested chunk JSONL files
+
+German bureaucratic queries often hinge on exact tokens ("Anlage KDU",
+"§ 22 SGB II", "Kundennummer") that dense embeddings retrieve poorly.
+The index is built from data/knowledge_base/chunks/*.jsonl and refreshed
+incrementally: only files whose size or mtime changed are re-read.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from langchain.schema import Document
+from config import Config
+
+TOKEN_PATTERN = re.compile(r'§|\w+', re.UNICODE)
+
+# Identifiers users copy verbatim from letters and forms
+EXACT_TERM_WORDS = {
+    'kundennummer', 'aktenzeichen', 'bedarfsgemeinschaftsnummer', 'bg-nummer',
+    'steuer-id', 'steueridentifikationsnummer', 'sozialversicherungsnummer', 'iban',
+}
+PARAGRAPH_PATTERN = re.compile(r'§+\s*\d+[a-z]?(?:\s+(?:abs\.?|absatz)\s*\d+)?(?:\s+[A-Z]{2,6}(?:\s+[IVX]+)?)?')
+QUOTED_PATTERN = re.compile(r'["„“]([^"„“”]+)["”“]')
+CODE_PATTERN = re.compile(r'\b[A-ZÄÖÜ]{2,6}\d{0,3}\b')
+# Upper-case words only count as codes when listed here or when they carry a digit
+# (UH1, AZ123); "BITTE" or "UND" in a shouted question are ordinary words
+KNOWN_CODES = {
+    'HA', 'VM', 'KDU', 'WEP', 'WBA', 'BB', 'EK', 'EKS', 'HG', 'KI', 'MEB', 'SV', 'UF', 'UH', 'VE',
+    'SGB', 'BGB', 'AO', 'ALG', 'BAMF', 'BAFÖG', 'WBS',
+}
+
+# Very common words that carry no retrieval signal
+STOPWORDS = {
+    'der', 'die', 'das', 'und', 'oder', 'ist', 'sind', 'ein', 'eine', 'einen', 'dem', 'den',
+    'des', 'zu', 'im', 'in', 'mit', 'von', 'für', 'auf', 'an', 'bei', 'wie', 'was', 'ich',
+    'the', 'a', 'and', 'or', 'is', 'are', 'to', 'of', 'for', 'on', 'with', 'what', 'how',
+    'do', 'does', 'i', 'my', 'mein', 'meine',
+}
+
+
+def tokenize(text):
+    """Lowercased word tokens; keeps '§' and numbers as their own tokens"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def extract_exact_terms(query):
+    """
+    Tokens that must match literally: § references, quoted phrases,
+    upper-case form codes (KDU, WBA, SGB) and known identifier words
+    """
+    phrases = PARAGRAPH_PATTERN.findall(query) + QUOTED_PATTERN.findall(query)
+    phrases += [
+        code for code in CODE_PATTERN.findall(query)
+        if code in KNOWN_CODES or any(char.isdigit() for char in code)
+    ]
+    phrases += [word for word in query.lower().split() if word.strip('?.,!:;') in EXACT_TERM_WORDS]
+
+    terms = []
+    for phrase in phrases:
+        for token in tokenize(phrase):
+            if token not in terms:
+                terms.append(token)
+    return terms
+
+
+class _Segment:
+    """Postings for the chunks of one source file"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.lengths = []
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+
+        for index, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((index, frequency))
+
+    @property
+    def total_length(self):
+        return sum(self.lengths)
+
+
+class LexicalIndex:
+    """Incremental BM25 index, one segment per chunk file"""
+
+    def __init__(self, chunks_dir=None, k1=1.5, b=0.75, refresh_interval=None):
+        self.chunks_dir = Path(chunks_dir or Config.KNOWLEDGE_BASE_DIR / "chunks")
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval = (
+            refresh_interval if refresh_interval is not None else Config.LEXICAL_REFRESH_INTERVAL
+        )
+
+        self._segments = {}      # file name -> _Segment
+        self._signatures = {}    # file name -> (size, mtime)
+        self._doc_freq = Counter()
+        self._doc_count = 0
+        self._total_length = 0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _load_file(self, jsonl_file):
+        """Read chunk documents from one JSONL file"""
+        documents = []
+        with open(jsonl_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    chunk = json.loads(line)
+                    documents.append(Document(
+                        page_content=chunk['content'],
+                        metadata=chunk.get('metadata', {})
+                    ))
+        return documents
+
+    def _remove_segment(self, name):
+        segment = self._segments.pop(name, None)
+        self._signatures.pop(name, None)
+        if segment is None:
+            return
+        for term, postings in segment.postings.items():
+            self._doc_freq[term] -= len(postings)
+            if self._doc_freq[term] <= 0:
+                del self._doc_freq[term]
+        self._doc_count -= len(segment.documents)
+        self._total_length -= segment.total_length
+
+    def _add_segment(self, name, segment, signature):
+        self._segments[name] = segment
+        self._signatures[name] = signature
+        for term, postings in segment.postings.items():
+            self._doc_freq[term] += len(postings)
+        self._doc_count += len(segment.documents)
+        self._total_length += segment.total_length
+
+    def refresh(self, force=False):
+        """Re-index only chunk files that were added, changed or removed"""
+        now = time.time()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+
+        with self._lock:
+            current = {}
+            for jsonl_file in self.chunks_dir.glob("*.jsonl"):
+                try:
+                    stat = jsonl_file.stat()
+                except FileNotFoundError:
+                    continue
+                current[jsonl_file.name] = (jsonl_file, (stat.st_size, stat.st_mtime_ns))
+
+            for name in list(self._segments):
+                if name not in current:
+                    self._remove_segment(name)
+
+            for name, (jsonl_file, signature) in current.items():
+                if self._signatures.get(name) == signature:
+                    continue
+                try:
+                    segment = _Segment(self._load_file(jsonl_file))
+                except (OSError, ValueError) as e:
+                    print(f"Lexical index: could not read {name}: {e}")
+                    continue
+                self._remove_segment(name)
+                self._add_segment(name, segment, signature)
+
+    def _idf(self, term):
+        df = self._doc_freq.get(term, 0)
+        return math.log(1 + (self._doc_count - df + 0.5) / (df + 0.5))
+
+    def search_with_scores(self, query, k=5):
+        """BM25 top-k as (Document, score) pairs, highest score first"""
+        self.refresh()
+
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            if self._doc_count == 0:
+                return []
+
+            avg_length = self._total_length / self._doc_count
+            scores = defaultdict(float)
+
+            for name, segment in self._segments.items():
+                for term in terms:
+                    postings = segment.postings.get(term)
+                    if not postings:
+                        continue
+                    idf = self._idf(term)
+                    for index, frequency in postings:
+                        length_norm = 1 - self.b + self.b * segment.lengths[index] / avg_length
+                        scores[(name, index)] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+            top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._segments[name].documents[index], score) for (name, index), score in top]
+
+    def contains_all_terms(self, document, terms):
+        """True if every term occurs in the document"""
+        doc_terms = set(tokenize(document.page_content))
+        return all(term in doc_terms for term in terms)
+
+    def get_stats(self):
+        """Index statistics"""
+        return {
+            'files': len(self._segments),
+            'chunks': self._doc_count,
+            'terms': len(self._doc_freq)
+        }
+
+
+# Create global instance
+lexical_index = LexicalIndex()
@@ -0,0 +1,157 @@
+"""
+Model routing policy for OpenAI calls
+
+Picks model, max_tokens and temperature per call from the call site's
+route (form, rag_general, rag_german_email, fallback, document), its
+intent and the input size. Rules are checked in order and the first match
+wins; fields a rule leaves out come from the defaults (Config.OPENAI_MODEL,
+MAX_TOKENS, TEMPERATURE). Every decision is counted per rule and printed
+when MODEL_ROUTING_LOG is on.
+
+Rule keys (all conditions optional):
+    name, routes, intents, max_message_tokens, min_input_tokens,
+    max_input_tokens, model, max_tokens, temperature
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import deque
+from config import Config
+
+
+# Requests to rework the previous answer ("kürzer", "in English?")
+FOLLOWUP_EDIT_WORDS = {
+    'kürzer', 'länger', 'einfacher', 'formeller', 'förmlicher', 'freundlicher', 'höflicher',
+    'ausführlicher', 'genauer', 'nochmal', 'englisch', 'deutsch', 'übersetzen', 'übersetze',
+    'shorter', 'longer', 'simpler', 'formal', 'formally', 'friendlier', 'politer', 'details',
+    'again', 'english', 'german', 'translate', 'rephrase', 'summarize', 'examples',
+}
+# Words pointing back at what was just said
+FOLLOWUP_REFERENCE_WORDS = {
+    'das', 'dies', 'dieses', 'davon', 'dazu', 'darüber', 'damit', 'oben', 'vorher',
+    'that', 'this', 'it', 'those', 'above', 'previous',
+}
+# Words that start a new task even in a short message
+TOPIC_WORDS = {
+    'jobcenter', 'mail', 'email', 'brief', 'schreib', 'schreibe', 'antrag', 'formular', 'anlage',
+    'bescheid', 'widerspruch', 'umzug', 'miete', 'write', 'letter', 'form', 'application',
+}
+FOLLOWUP_MAX_WORDS = 8
+
+
+def followup_intent(message, conversation_history):
+    """
+    'followup' for a short message that reworks or refers back to the
+    previous answer, else 'question'
+
+    A message in a running chat is not a follow-up by itself: "Schreib eine
+    E-Mail an das Jobcenter wegen Umzug" is short but a new task.
+    """
+    if not conversation_history:
+        return 'question'
+    words = re.findall(r'\w+', (message or '').lower())
+    if not words or len(words) > FOLLOWUP_MAX_WORDS or TOPIC_WORDS.intersection(words):
+        return 'question'
+    if FOLLOWUP_EDIT_WORDS.intersection(words) or FOLLOWUP_REFERENCE_WORDS.intersection(words):
+        return 'followup'
+    return 'question'
+
+
+class ModelRouter:
+    """First matching rule decides the completion settings"""
+
+    def __init__(self, rules, default=None, log_decisions=True, recent_size=50):
+        self.rules = list(rules)
+        self.default = {
+            'model': Config.OPENAI_MODEL,
+            'max_tokens': Config.MAX_TOKENS,
+            'temperature': Config.TEMPERATURE
+        }
+        self.default.update({k: v for k, v in (default or {}).items() if v is not None})
+        self.log_decisions = log_decisions
+
+        self._lock = threading.Lock()
+        self.decisions = {}
+        self.recent = deque(maxlen=recent_size)
+
+    @classmethod
+    def from_config(cls):
+        """Rules from MODEL_ROUTING_FILE (JSON {'default', 'rules'}) or Config.MODEL_ROUTING_RULES"""
+        rules, default = Config.MODEL_ROUTING_RULES, None
+        if Config.MODEL_ROUTING_FILE:
+            try:
+                with open(Config.MODEL_ROUTING_FILE, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                rules, default = data.get('rules', []), data.get('default')
+                print(f"🧭 Loaded {len(rules)} model routing rules from {Config.MODEL_ROUTING_FILE}")
+            except Exception as e:
+                print(f"⚠️ Could not load model routing rules, using defaults: {e}")
+
+        if not Config.MODEL_ROUTING_ENABLED:
+            rules = []
+        return cls(rules, default=default, log_decisions=Config.MODEL_ROUTING_LOG)
+
+    @staticmethod
+    def _matches(rule, route, intent, message_tokens, input_tokens):
+        if 'routes' in rule and route not in rule['routes']:
+            return False
+        if 'intents' in rule and intent not in rule['intents']:
+            return False
+        if 'max_message_tokens' in rule and message_tokens > rule['max_message_tokens']:
+            return False
+        if 'min_input_tokens' in rule and input_tokens < rule['min_input_tokens']:
+            return False
+        if 'max_input_tokens' in rule and input_tokens > rule['max_input_tokens']:
+            return False
+        return True
+
+    def select(self, route=None, intent=None, message_tokens=0, input_tokens=0):
+        """
+        Completion settings for one call
+
+        message_tokens: the user's own message; input_tokens: the whole prompt.
+        Returns {'model', 'max_tokens', 'temperature', 'rule'}.
+        """
+        settings = dict(self.default, rule='default')
+        for index, rule in enumerate(self.rules):
+            if self._matches(rule, route, intent, message_tokens, input_tokens):
+                settings.update({
+                    key: rule[key] for key in ('model', 'max_tokens', 'temperature')
+                    if rule.get(key) is not None
+                })
+                settings['rule'] = rule.get('name', f"rule_{index}")
+                break
+
+        decision = {
+            'route': route, 'intent': intent,
+            'message_tokens': message_tokens, 'input_tokens': input_tokens,
+            **settings
+        }
+        with self._lock:
+            self.decisions[settings['rule']] = self.decisions.get(settings['rule'], 0) + 1
+            self.recent.append(decision)
+
+        if self.log_decisions:
+            print(f"🧭 Model route {route or '-'}/{intent or '-'} "
+                  f"({message_tokens} msg / {input_tokens} prompt tokens) → {settings['rule']}: "
+                  f"{settings['model']}, max_tokens={settings['max_tokens']}, "
+                  f"temperature={settings['temperature']}")
+        return settings
+
+    def fingerprint(self):
+        """Short hash of the defaults and rules (changes when the policy changes)"""
+        payload = json.dumps([self.default, self.rules], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def get_stats(self):
+        """Decision counts per rule and the most recent decisions"""
+        with self._lock:
+            return {
+                'enabled': bool(self.rules),
+                'default': self.default,
+                'rules': [rule.get('name', f"rule_{i}") for i, rule in enumerate(self.rules)],
+                'decisions': dict(self.decisions),
+                'recent': list(self.recent)[-10:]
+            }
@@ -0,0 +1,364 @@
+"""
+In-process exact vector index backed by NumPy
+
+Embeddings live in a memory-mapped float32 `.npy` matrix, chunk text and
+metadata in a JSONL side table. Search is one vectorized dot product over
+the whole matrix, which for tens of thousands of 384-dim chunks is faster
+and more predictable than a round trip through Chroma and SQLite.
+
+Writers hold an exclusive file lock for their read-modify-write and
+readers a shared one while they reload, and batch() groups many add/upsert/delete calls into a single rewrite of the
+files (bulk ingestion writes once per source instead of once per batch).
+
+Scores are squared L2 distances (2 - 2 * cosine for normalized vectors),
+the same as Chroma's default space, so callers can switch backends freely.
+"""
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from langchain.schema import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.jsonl"
+LOCK_FILE = "index.lock"
+
+
+def matches_filter(metadata, where):
+    """Evaluate a Chroma-style metadata filter against one metadata dict"""
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == '$eq' and value != expected:
+                    return False
+                if op == '$ne' and value == expected:
+                    return False
+                if op == '$in' and value not in expected:
+                    return False
+                if op == '$nin' and value in expected:
+                    return False
+                if op in ('$gt', '$gte', '$lt', '$lte'):
+                    if value is None:
+                        return False
+                    if op == '$gt' and not value > expected:
+                        return False
+                    if op == '$gte' and not value >= expected:
+                        return False
+                    if op == '$lt' and not value < expected:
+                        return False
+                    if op == '$lte' and not value <= expected:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+
+    return True
+
+
+class NumpyFlatIndex:
+    """Exact nearest-neighbour search over a memory-mapped embedding matrix"""
+
+    def __init__(self, directory, embedding_function, name="amtly_knowledge"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embedding_function = embedding_function
+        self.name = name
+
+        self.embeddings_path = self.directory / EMBEDDINGS_FILE
+        self.metadata_path = self.directory / METADATA_FILE
+        self.lock_path = self.directory / LOCK_FILE
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._batch = None
+        self._loaded_mtime = None
+        self._matrix = None
+        self.ids = []
+        self.contents = []
+        self.metadatas = []
+        self._filter_masks = {}
+
+        self._reload_if_changed()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _mtime(self):
+        try:
+            return self.embeddings_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload_if_changed(self, locked=False):
+        """
+        Reload from disk if another process (e.g. ingestion) rewrote the index
+
+        Reads both files under a shared file lock, so a concurrent writer
+        cannot pair new ids with the old matrix; locked=True when the caller
+        already holds the exclusive lock.
+        """
+        if self._mtime() == self._loaded_mtime:
+            return
+
+        if locked or fcntl is None:
+            self._load()
+            return
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                self._load()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, attempts=3):
+        for _ in range(attempts):
+            mtime = self._mtime()
+            if mtime is None:
+                ids, contents, metadatas, matrix = [], [], [], None
+                break
+
+            try:
+                ids, contents, metadatas = [], [], []
+                with open(self.metadata_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            row = json.loads(line)
+                            ids.append(row['id'])
+                            contents.append(row['content'])
+                            metadatas.append(row['metadata'])
+                matrix = np.load(self.embeddings_path, mmap_mode='r')
+            except FileNotFoundError:
+                # Deleted between the stat and the read
+                continue
+
+            # Without file locks (Windows) a writer may replace the files between the two reads
+            if len(ids) == matrix.shape[0] and self._mtime() == mtime:
+                break
+        else:
+            print(f"⚠️ Index files in {self.directory} changed while loading, keeping the previous version")
+            return
+
+        with self._lock:
+            self._matrix = matrix
+            self.ids, self.contents, self.metadatas = ids, contents, metadatas
+            self._filter_masks = {}
+            self._loaded_mtime = mtime
+
+    def _snapshot(self, locked=False):
+        """(matrix, ids, contents, metadatas, filter_masks) of one consistent index version"""
+        self._reload_if_changed(locked)
+        with self._lock:
+            return self._matrix, self.ids, self.contents, self.metadatas, self._filter_masks
+
+    def _write(self, ids, contents, metadatas, matrix):
+        """Atomically replace the index files (metadata first, matrix last)"""
+        tmp_metadata = self.metadata_path.with_suffix('.jsonl.tmp')
+        with open(tmp_metadata, 'w', encoding='utf-8') as f:
+            for doc_id, content, metadata in zip(ids, contents, metadatas):
+                json.dump({'id': doc_id, 'content': content, 'metadata': metadata}, f, ensure_ascii=False)
+                f.write('\n')
+
+        tmp_embeddings = self.directory / f"{EMBEDDINGS_FILE}.tmp"
+        with open(tmp_embeddings, 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+
+        os.replace(tmp_metadata, self.metadata_path)
+        os.replace(tmp_embeddings, self.embeddings_path)
+        self._loaded_mtime = None
+        self._reload_if_changed(locked=True)
+
+    @contextmanager
+    def batch(self):
+        """
+        Group writes into one read-modify-write of the index files
+
+        Holds an exclusive file lock (other processes' writers wait) and
+        rewrites the files once on exit instead of once per call. Nests.
+        """
+        with self._write_lock:
+            if self._batch is not None:
+                yield
+                return
+
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Start from what is on disk now, not from an older load
+                    matrix, ids, contents, metadatas, _ = self._snapshot(locked=True)
+                    self._batch = {
+                        'ids': list(ids),
+                        'contents': list(contents),
+                        'metadatas': list(metadatas),
+                        'blocks': [np.array(matrix)] if matrix is not None else [],
+                        'dirty': False
+                    }
+                    yield
+                    if self._batch['dirty']:
+                        state = self._batch
+                        if state['ids']:
+                            self._write(state['ids'], state['contents'], state['metadatas'],
+                                        self._batch_matrix())
+                        else:
+                            self.embeddings_path.unlink(missing_ok=True)
+                            self.metadata_path.unlink(missing_ok=True)
+                            self._reload_if_changed(locked=True)
+                finally:
+                    self._batch = None
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _batch_matrix(self):
+        """The pending matrix as one array (appended blocks are stacked lazily)"""
+        blocks = self._batch['blocks']
+        if len(blocks) > 1:
+            blocks[:] = [np.vstack(blocks)]
+        return blocks[0] if blocks else None
+
+    # ------------------------------------------------------------------
+    # LangChain-style API used by VectorStore
+    # ------------------------------------------------------------------
+
+    def add_documents(self, documents, ids=None):
+        """Embed and append documents"""
+        if not documents:
+            return []
+
+        texts = [doc.page_content for doc in documents]
+        vectors = np.asarray(self.embedding_function.embed_documents(texts), dtype=np.float32)
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        return self.add_embeddings(ids, texts, [doc.metadata for doc in documents], vectors)
+
+    def add_embeddings(self, ids, texts, metadatas, vectors):
+        """Append pre-computed embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.batch():
+            state = self._batch
+            state['ids'].extend(ids)
+            state['contents'].extend(texts)
+            state['metadatas'].extend(dict(m or {}) for m in metadatas)
+            state['blocks'].append(vectors)
+            state['dirty'] = True
+        return list(ids)
+
+    def upsert_embeddings(self, ids, texts, metadatas, vectors):
+        """Insert new rows and replace rows whose id already exists"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self.batch():
+            state = self._batch
+            position = {doc_id: row for row, doc_id in enumerate(state['ids'])}
+
+            new_rows = []
+            for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                row = position.get(doc_id)
+                if row is None:
+                    position[doc_id] = len(state['ids'])
+                    state['ids'].append(doc_id)
+                    state['contents'].append(text)
+                    state['metadatas'].append(dict(metadata or {}))
+                    new_rows.append(vector)
+                else:
+                    state['contents'][row] = text
+                    state['metadatas'][row] = dict(metadata or {})
+                    self._batch_matrix()[row] = vector
+
+            if new_rows:
+                state['blocks'].append(np.asarray(new_rows, dtype=np.float32))
+            state['dirty'] = True
+        return list(ids)
+
+    def get_ids(self, where=None):
+        """Ids of stored chunks, optionally filtered by metadata"""
+        _, ids, _, metadatas, masks = self._snapshot()
+        if not where:
+            return list(ids)
+        mask = self._filter_mask(where, metadatas, masks)
+        return [doc_id for doc_id, keep in zip(ids, mask) if keep]
+
+    def delete(self, ids):
+        """Remove chunks by id"""
+        remove = set(ids)
+        with self.batch():
+            state = self._batch
+            keep = [row for row, doc_id in enumerate(state['ids']) if doc_id not in remove]
+            if len(keep) == len(state['ids']):
+                return
+
+            matrix = self._batch_matrix()
+            state['blocks'][:] = [matrix[keep]] if keep else []
+            state['ids'] = [state['ids'][row] for row in keep]
+            state['contents'] = [state['contents'][row] for row in keep]
+            state['metadatas'] = [state['metadatas'][row] for row in keep]
+            state['dirty'] = True
+
+    @staticmethod
+    def _filter_mask(where, metadatas, masks):
+        """Boolean row mask for a metadata filter (cached per loaded index version)"""
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = masks.get(key)
+        if mask is None:
+            mask = np.fromiter(
+                (matches_filter(metadata, where) for metadata in metadatas),
+                dtype=bool, count=len(metadatas)
+            )
+            masks[key] = mask
+        return mask
+
+    def similarity_search_by_vector_with_score(self, vector, k=5, filter=None):
+        """Top-k documents and squared L2 distances for a query vector"""
+        matrix, ids, contents, metadatas, masks = self._snapshot()
+        if matrix is None or len(ids) == 0 or k <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ query
+
+        if filter:
+            mask = self._filter_mask(filter, metadatas, masks)
+            candidates = int(mask.sum())
+            if candidates == 0:
+                return []
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, candidates)
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            (Document(page_content=contents[i], metadata=dict(metadatas[i])),
+             float(2.0 - 2.0 * scores[i]))
+            for i in top
+        ]
+
+    def similarity_search_with_score(self, query, k=5, filter=None):
+        """Top-k documents and distances for a text query"""
+        vector = self.embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(vector, k=k, filter=filter)
+
+    def similarity_search(self, query, k=5, filter=None):
+        """Top-k documents for a text query"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def count(self):
+        """Number of stored chunks"""
+        return len(self._snapshot()[1])
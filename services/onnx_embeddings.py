@@ -0,0 +1,147 @@
+"""
+ONNX Runtime backend for the multilingual MiniLM embedder
+
+Runs an exported (optionally int8 dynamically quantized) copy of the
+sentence-transformers model on CPU without loading PyTorch.
+
+Export once with:
+    python -m services.onnx_embeddings export [--no-quantize]
+"""
+
+from pathlib import Path
+from config import Config
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+
+class OnnxEmbeddings:
+    """Drop-in replacement for HuggingFaceEmbeddings (mean pooling + L2 normalization)"""
+
+    def __init__(self, model_dir=None, quantized=True, max_seq_length=128, num_threads=None):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "ONNX backend requires 'onnxruntime' and 'transformers' "
+                "(pip install onnxruntime)"
+            ) from e
+
+        self.model_dir = Path(model_dir or Config.ONNX_MODEL_DIR)
+        self.model_path = self.model_dir / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        if not self.model_path.exists():
+            raise FileNotFoundError(
+                f"ONNX model not found at {self.model_path}. "
+                f"Run: python -m services.onnx_embeddings export"
+            )
+
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode(self, texts):
+        """Tokenize, run the model, mean-pool and normalize"""
+        import numpy as np
+
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors='np'
+        )
+        inputs = {
+            name: encoded[name].astype(np.int64)
+            for name in ('input_ids', 'attention_mask', 'token_type_ids')
+            if name in self.input_names and name in encoded
+        }
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over non-padding tokens
+        mask = encoded['attention_mask'][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = summed / counts
+
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return (pooled / norms).astype(np.float32)
+
+    def embed_documents(self, texts):
+        """Create embeddings for multiple documents"""
+        if not texts:
+            return []
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text):
+        """Create embedding for a single text"""
+        return self._encode([text])[0].tolist()
+
+
+def export_onnx_model(model_name=None, output_dir=None, quantize=True, opset=14):
+    """Export the sentence-transformers model to ONNX (needs torch, run once)"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    model_name = model_name or Config.EMBEDDING_MODEL
+    output_dir = Path(output_dir or Config.ONNX_MODEL_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model_path = output_dir / MODEL_FILE
+
+    print(f"🔄 Exporting {model_name} to {model_path}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["Wie beantrage ich Bürgergeld?"], return_tensors='pt')
+    dynamic_axes = {
+        'input_ids': {0: 'batch', 1: 'sequence'},
+        'attention_mask': {0: 'batch', 1: 'sequence'},
+        'last_hidden_state': {0: 'batch', 1: 'sequence'},
+    }
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask']),
+            str(model_path),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True
+        )
+    tokenizer.save_pretrained(str(output_dir))
+    print(f"✅ Exported ONNX model ({model_path.stat().st_size / 1e6:.1f} MB)")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantized_path = output_dir / QUANTIZED_MODEL_FILE
+        quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+        print(f"✅ Quantized int8 model ({quantized_path.stat().st_size / 1e6:.1f} MB)")
+
+    return output_dir
+
+
+def main():
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        export_onnx_model(quantize="--no-quantize" not in sys.argv)
+    else:
+        print("Usage: python -m services.onnx_embeddings export [--no-quantize]")
+
+
+if __name__ == "__main__":
+    main()
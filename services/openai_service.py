@@ -1,54 +1,404 @@
-from openai import OpenAI
+import contextvars
+import hashlib
+import json
+import random
+import time
+from contextlib import ExitStack, contextmanager
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
 from config import Config
+from utils.cache_utils import SQLiteCache
+from utils.concurrency import (
+    AdmissionController, CircuitBreaker, CircuitOpenError, PRIORITY_NORMAL, RateLimitExceeded, SingleFlight
+)
+from utils.prompt_builder import count_tokens
+from services.model_router import ModelRouter
+from services.usage_tracker import record_llm_call
+
+# Callback receiving streamed text deltas for the current request (see stream_tokens_to)
+_token_sink = contextvars.ContextVar('openai_token_sink', default=None)
+# Called when a streamed call fails after sending tokens (they are not part of the answer)
+_token_reset = contextvars.ContextVar('openai_token_reset', default=None)
 
 
 class OpenAIService:
     """OpenAI service - CLEANED & SIMPLIFIED VERSION"""
 
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        # Retries are handled here (jittered backoff + circuit breaker), not by the SDK
+        self.client = OpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_BASE_URL,
+            timeout=httpx.Timeout(Config.OPENAI_READ_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT),
+            max_retries=0
+        )
+        self.max_retries = Config.OPENAI_MAX_RETRIES
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.OPENAI_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=Config.OPENAI_CIRCUIT_RESET_TIMEOUT
+        )
+        self.retries = 0
+        self.timeouts = 0
         self.model = Config.OPENAI_MODEL
         self.max_tokens = Config.MAX_TOKENS
         self.temperature = Config.TEMPERATURE
 
-    def get_response(self, user_message, system_prompt=None, clean_context=True):
-        """Get response from OpenAI with clean context"""
-        try:
-            messages = []
-
-            # Add system prompt if provided
-            if system_prompt:
-                clean_system_prompt = str(system_prompt).strip()
-                messages.append({"role": "system", "content": clean_system_prompt})
-
-            # Add user message
-            clean_user_message = str(user_message).strip()
-            messages.append({"role": "user", "content": clean_user_message})
-
-            # Make API call
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
+        # Per-call model / max_tokens / temperature by route, intent and input size
+        self.router = ModelRouter.from_config()
+
+        # Persistent exact-match response cache (optional)
+        self.response_cache = None
+        if Config.LLM_CACHE_ENABLED:
+            self.response_cache = SQLiteCache(
+                Config.LLM_CACHE_PATH,
+                table='llm_responses',
+                max_entries=Config.LLM_CACHE_MAX_ENTRIES,
+                ttl=Config.LLM_CACHE_TTL
             )
 
-            # Extract response
-            response_content = response.choices[0].message.content.strip()
+        # Identical prompts in flight at the same time share one API call
+        self.singleflight = SingleFlight() if Config.LLM_COALESCE_ENABLED else None
+
+        # Concurrency cap, RPM/TPM buckets and priority queue in front of the API
+        self.admission = AdmissionController(
+            max_in_flight=Config.OPENAI_MAX_IN_FLIGHT,
+            requests_per_minute=Config.OPENAI_RPM_LIMIT,
+            tokens_per_minute=Config.OPENAI_TPM_LIMIT,
+            max_queue=Config.OPENAI_QUEUE_SIZE,
+            queue_timeout=Config.OPENAI_QUEUE_TIMEOUT
+        )
+
+    def _build_messages(self, user_message, system_prompt=None):
+        """Build the chat messages list"""
+        messages = []
+
+        # Add system prompt if provided
+        if system_prompt:
+            clean_system_prompt = str(system_prompt).strip()
+            messages.append({"role": "system", "content": clean_system_prompt})
+
+        # Add user message
+        clean_user_message = str(user_message).strip()
+        messages.append({"role": "user", "content": clean_user_message})
+
+        return messages
+
+    def _select_settings(self, messages, route=None, intent=None):
+        """Routing decision (model, max_tokens, temperature) for prepared messages"""
+        return self.router.select(
+            route=route,
+            intent=intent,
+            message_tokens=count_tokens(messages[-1]['content']),
+            input_tokens=sum(count_tokens(message['content']) for message in messages)
+        )
+
+    def _cache_key(self, messages, settings):
+        """Hash of everything that determines the completion"""
+        payload = json.dumps(
+            [settings['model'], settings['temperature'], settings['max_tokens'], messages],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _get_cached_response(self, cache_key):
+        """Cached {"response", "usage"} dict or None"""
+        cached = self.response_cache.get(cache_key)
+        if cached is None:
+            return None
+        try:
+            return json.loads(cached.decode('utf-8'))
+        except ValueError:
+            return None
+
+    @contextmanager
+    def _admitted(self, messages, priority, settings):
+        """
+        Hold an admission slot for one API call
+
+        Reserves prompt + max_tokens against the token bucket; the caller may set
+        usage['total_tokens'] on the yielded dict to refund the unused part.
+        """
+        estimated = sum(count_tokens(message['content']) for message in messages) + settings['max_tokens']
+        self.admission.acquire(priority=priority, tokens=estimated)
+        usage = {}
+        try:
+            yield usage
+        finally:
+            used = usage.get('total_tokens')
+            self.admission.release(unused_tokens=estimated - used if used else 0)
+
+    def get_response(self, user_message, system_prompt=None, clean_context=True, use_cache=True,
+                     priority=PRIORITY_NORMAL, route=None, intent=None):
+        """
+        Get response from OpenAI with clean context
+
+        use_cache=False bypasses the response cache; priority orders the call in
+        the admission queue; route and intent feed the model routing policy.
+        Raises RateLimitExceeded when it cannot be admitted.
+        """
+        try:
+            messages = self._build_messages(user_message, system_prompt)
+            settings = self._select_settings(messages, route, intent)
+            sink = _token_sink.get()
+
+            cache_key = self._cache_key(messages, settings)
+            use_cache = self.response_cache is not None and use_cache
+            if use_cache:
+                cached = self._get_cached_response(cache_key)
+                if cached is not None:
+                    if sink is not None:
+                        sink(cached['response'])
+                    record_llm_call(settings['model'], cached=True)
+                    return {
+                        "success": True,
+                        "response": cached['response'],
+                        "usage": cached.get('usage'),
+                        "cached": True,
+                        "coalesced": False
+                    }
+
+            # Streaming request in progress - forward tokens while collecting the full text
+            shared = False
+            started = time.perf_counter()
+            if sink is not None:
+                parts = []
+                try:
+                    for delta in self._stream_messages(messages, priority, settings):
+                        parts.append(delta)
+                        sink(delta)
+                except Exception:
+                    # Whatever answers instead (retry, fallback) streams from scratch
+                    reset = _token_reset.get()
+                    if parts and reset is not None:
+                        reset()
+                    raise
+                response_content = "".join(parts).strip()
+                usage = None
+                # Streamed responses carry no usage block - estimate it
+                record_llm_call(
+                    settings['model'],
+                    prompt_tokens=sum(count_tokens(message['content']) for message in messages),
+                    completion_tokens=count_tokens(response_content),
+                    latency=time.perf_counter() - started,
+                    estimated=True
+                )
+            elif self.singleflight is not None:
+                (response_content, usage), shared = self.singleflight.do(
+                    cache_key, lambda: self._complete(messages, priority, settings)
+                )
+                if shared:
+                    # Followers did not cause any API usage
+                    usage = None
+            else:
+                response_content, usage = self._complete(messages, priority, settings)
+
+            if sink is None:
+                record_llm_call(
+                    settings['model'],
+                    prompt_tokens=(usage or {}).get('prompt_tokens', 0),
+                    completion_tokens=(usage or {}).get('completion_tokens', 0),
+                    latency=time.perf_counter() - started,
+                    coalesced=shared
+                )
+
+            if use_cache and not shared and response_content:
+                self.response_cache.set(cache_key, json.dumps(
+                    {"response": response_content, "usage": usage}, ensure_ascii=False
+                ).encode('utf-8'))
 
             return {
                 "success": True,
                 "response": response_content,
-                "usage": response.usage
+                "usage": usage,
+                "cached": False,
+                "coalesced": shared
             }
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                error_code = 'circuit_open'
+            elif isinstance(e, APITimeoutError):
+                error_code = 'timeout'
+            else:
+                error_code = 'api_error'
             return {
                 "success": False,
                 "error": str(e),
+                "error_code": error_code,
                 "response": "Sorry, I encountered an error. Please try again."
             }
 
+    @staticmethod
+    def _is_retryable(error):
+        """Timeouts, connection errors, 429 and 5xx are worth retrying"""
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+    def _backoff_delay(self, attempt, error):
+        """Exponential backoff with full jitter, honouring Retry-After on 429s"""
+        delay = random.uniform(0, min(Config.OPENAI_BACKOFF_MAX, Config.OPENAI_BACKOFF_BASE * 2 ** attempt))
+        if isinstance(error, APIStatusError):
+            try:
+                retry_after = float(error.response.headers.get('retry-after', 0))
+            except (TypeError, ValueError):
+                retry_after = 0
+            delay = max(delay, min(retry_after, Config.OPENAI_BACKOFF_MAX))
+        return delay
+
+    def _create(self, messages, priority, settings, **kwargs):
+        """
+        chat.completions.create behind the circuit breaker and admission control
+
+        The breaker is checked once, before queueing for admission, so an
+        open circuit fails fast without using a slot or RPM/TPM tokens; the
+        retries belong to the same call (and to the same half-open trial)
+        and only the final outcome is recorded. Each attempt holds its own
+        admission slot; backoff sleeps hold none.
+        Returns (response, admission, admitted_usage): the caller closes
+        `admission` (an ExitStack) once the response is consumed, after
+        setting admitted_usage['total_tokens'] to refund unused tokens.
+        """
+        self.breaker.check()
+        attempt = 0
+        while True:
+            admission = ExitStack()
+            try:
+                admitted_usage = admission.enter_context(self._admitted(messages, priority, settings))
+            except RateLimitExceeded:
+                # No call was made - a half-open trial must not stay reserved
+                self.breaker.abandon_trial()
+                raise
+
+            try:
+                response = self.client.chat.completions.create(
+                    model=settings['model'],
+                    max_tokens=settings['max_tokens'],
+                    temperature=settings['temperature'],
+                    messages=messages,
+                    **kwargs
+                )
+            except Exception as e:
+                admission.close()
+                if isinstance(e, APITimeoutError):
+                    self.timeouts += 1
+                if not self._is_retryable(e):
+                    if isinstance(e, APIStatusError):
+                        # The API answered (bad request, auth): says nothing about upstream health
+                        self.breaker.abandon_trial()
+                    else:
+                        self.breaker.record_failure(e)
+                    raise
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure(e)
+                    raise
+
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                self.retries += 1
+                print(f"⚠️ OpenAI call failed ({e.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return response, admission, admitted_usage
+
+    def _complete(self, messages, priority, settings):
+        """Blocking completion; returns (response text, usage dict)"""
+        response, admission, admitted_usage = self._create(messages, priority, settings)
+        with admission:
+            # Extract response
+            response_content = response.choices[0].message.content.strip()
+            usage = response.usage.model_dump() if response.usage else None
+            admitted_usage.update(usage or {})
+
+        return response_content, usage
+
+    def stream_response(self, user_message, system_prompt=None, priority=PRIORITY_NORMAL,
+                        route=None, intent=None):
+        """Yield response text deltas as they are generated"""
+        messages = self._build_messages(user_message, system_prompt)
+        return self._stream_messages(messages, priority, self._select_settings(messages, route, intent))
+
+    def _stream_messages(self, messages, priority, settings):
+        """Streaming completion for prepared messages"""
+        response, admission, admitted_usage = self._create(messages, priority, settings, stream=True)
+        parts = []
+        with admission:
+            # Errors after the first token are not retried (tokens were already sent)
+            try:
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except (APITimeoutError, APIConnectionError) as e:
+                if isinstance(e, APITimeoutError):
+                    self.timeouts += 1
+                self.breaker.record_failure(e)
+                raise
+            finally:
+                # Streams carry no usage block: count what was generated so the
+                # unused part of the max_tokens reservation is refunded
+                admitted_usage['total_tokens'] = (
+                    sum(count_tokens(message['content']) for message in messages)
+                    + count_tokens("".join(parts))
+                )
+
+    @contextmanager
+    def stream_tokens_to(self, callback, on_reset=None):
+        """
+        Stream every get_response() call made inside this block to callback(text),
+        so existing pipelines (form helper, RAG, fallback) stream without changes
+
+        on_reset() is called when a call fails after streaming part of its
+        answer, before any fallback starts streaming; discard the text so far.
+        """
+        token = _token_sink.set(callback)
+        reset_token = _token_reset.set(on_reset)
+        try:
+            yield
+        finally:
+            _token_reset.reset(reset_token)
+            _token_sink.reset(token)
+
+    def get_cache_stats(self):
+        """Response cache statistics"""
+        if self.response_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, 'ttl': self.response_cache.ttl, **self.response_cache.get_stats()}
+
+    def get_coalescing_stats(self):
+        """Single-flight statistics for identical concurrent prompts"""
+        if self.singleflight is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.singleflight.get_stats()}
+
+    def is_available(self):
+        """False while the circuit breaker is open"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def get_resilience_stats(self):
+        """Circuit breaker state, retry and timeout counters"""
+        return {
+            'circuit': self.breaker.get_stats(),
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'max_retries': self.max_retries
+        }
+
+    def get_routing_stats(self):
+        """Model routing decisions per rule"""
+        return self.router.get_stats()
+
+    def get_admission_stats(self):
+        """Concurrency limiter and wait queue statistics"""
+        return self.admission.get_stats()
+
 
 # Create global instance
 openai_service = OpenAIService()
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""
+Semantic answer cache for first-turn questions
+
+Near-paraphrases of an earlier question ("How do I renew Bürgergeld?" /
+"how to renew buergergeld") reuse its answer when the query embeddings are
+close enough. Only first-turn questions without conversation history or an
+uploaded document are cached, since those answers depend on the question
+alone; questions with exact terms (§ references, form codes) are left to
+retrieval. Entries are scoped by response language and route and are dropped
+whenever the knowledge base is re-ingested.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+import numpy as np
+from config import Config
+from services.embedding_service import embedding_service
+from services.vector_store import vector_store
+from services.lexical_index import extract_exact_terms
+
+
+class SemanticAnswerCache:
+    """LRU cache of answers looked up by cosine similarity of query embeddings"""
+
+    def __init__(self, threshold=0.92, max_size=1000, ttl=None, sample_rate=0.1, max_samples=50):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sample_rate = sample_rate
+
+        self._entries = OrderedDict()  # id -> entry dict
+        self._next_id = 0
+        self._generation = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Random sample of hits (query vs. cached query) for reviewing false hits
+        self.hit_samples = deque(maxlen=max_samples)
+
+    def _check_generation(self):
+        """Drop everything when the knowledge base changed (caller holds the lock)"""
+        generation = vector_store.get_generation()
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    @staticmethod
+    def is_cacheable(query):
+        """
+        False for queries with exact terms (§ references, form codes, identifiers)
+
+        Their embeddings barely differ between "§ 22" and "§ 24", and hybrid
+        retrieval answers them from the lexical index without embedding the
+        query, so a lookup here would add an embedding call for a likely
+        false hit.
+        """
+        return not extract_exact_terms(query)
+
+    def _embed(self, query):
+        """Normalized query embedding (runs before retrieval; repeats hit the embedding cache)"""
+        vector = np.asarray(embedding_service.embed_text(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query, language, route):
+        """Return the best cached entry above the threshold, or None"""
+        vector = self._embed(query)
+        now = time.time()
+
+        with self._lock:
+            self._check_generation()
+
+            best_id, best_score = None, -1.0
+            for entry_id, entry in list(self._entries.items()):
+                if self.ttl is not None and now - entry['created_at'] > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry['language'] != language or entry['route'] != route:
+                    continue
+                score = float(np.dot(vector, entry['vector']))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+
+            if random.random() < self.sample_rate:
+                self.hit_samples.append({
+                    'query': query,
+                    'cached_query': entry['query'],
+                    'similarity': round(best_score, 4),
+                    'route': route,
+                    'timestamp': datetime.now().isoformat()
+                })
+
+            return {
+                'answer': entry['answer'],
+                'sources': list(entry['sources']),
+                'similarity': best_score
+            }
+
+    def store(self, query, language, route, answer, sources=None):
+        """Cache an answer for a first-turn question"""
+        if self.max_size <= 0 or not answer:
+            return
+
+        vector = self._embed(query)
+
+        with self._lock:
+            self._check_generation()
+
+            self._entries[self._next_id] = {
+                'query': query,
+                'vector': vector,
+                'language': language,
+                'route': route,
+                'answer': answer,
+                'sources': list(sources or []),
+                'created_at': time.time()
+            }
+            self._next_id += 1
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Hit rate and recent hit samples"""
+        total = self.hits + self.misses
+        return {
+            'enabled': True,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'hit_samples': list(self.hit_samples)
+        }
+
+
+# Create global instance
+semantic_answer_cache = SemanticAnswerCache(
+    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+    max_size=Config.SEMANTIC_CACHE_SIZE,
+    ttl=Config.SEMANTIC_CACHE_TTL,
+    sample_rate=Config.SEMANTIC_CACHE_SAMPLE_RATE
+) if Config.SEMANTIC_CACHE_ENABLED else None
@@ -0,0 +1,71 @@
+"""
+Per-request accounting of language model usage
+
+A chat request opens a tracking scope with track_usage(); every
+OpenAIService call inside it records model, token counts, upstream latency
+and whether the answer came from a cache or a coalesced call. The summary
+is stored with the assistant message (see models.database.MessageUsage).
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current_usage = contextvars.ContextVar('request_usage', default=None)
+
+
+class RequestUsage:
+    """LLM calls made while answering one chat request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = []
+
+    def record(self, model, prompt_tokens=0, completion_tokens=0, latency=0.0,
+               cached=False, coalesced=False, estimated=False):
+        self.calls.append({
+            'model': model,
+            'prompt_tokens': prompt_tokens or 0,
+            'completion_tokens': completion_tokens or 0,
+            'latency': latency,
+            'cached': cached,
+            'coalesced': coalesced,
+            'estimated': estimated
+        })
+
+    def summary(self, route):
+        """Totals for MessageUsage"""
+        prompt_tokens = sum(call['prompt_tokens'] for call in self.calls)
+        completion_tokens = sum(call['completion_tokens'] for call in self.calls)
+        models = sorted({call['model'] for call in self.calls})
+        return {
+            'route': route,
+            'model': ','.join(models) or None,
+            'llm_calls': len(self.calls),
+            'cached_calls': sum(1 for call in self.calls if call['cached']),
+            'coalesced_calls': sum(1 for call in self.calls if call['coalesced']),
+            'tokens_estimated': any(call['estimated'] for call in self.calls),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'llm_latency_ms': int(sum(call['latency'] for call in self.calls) * 1000),
+            'total_latency_ms': int((time.perf_counter() - self.started) * 1000)
+        }
+
+
+@contextmanager
+def track_usage():
+    """Collect LLM usage for the current request (thread/context local)"""
+    usage = RequestUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_llm_call(model, **kwargs):
+    """Record one LLM call in the current tracking scope (no-op outside one)"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.record(model, **kwargs)
@@ -1,32 +1,210 @@
-from langchain_chroma import Chroma
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from services.embedding_service import embedding_service
+from services.embedding_cache import EmbeddingCache
+from services.lexical_index import lexical_index, extract_exact_terms
+from utils.cache_utils import LRUCache
 from config import Config
 
 
 class VectorStore:
-    """Vector store for knowledge base - CLEANED VERSION"""
+    """Vector store for knowledge base - lazy initialization with readiness state"""
 
     def __init__(self):
-        self.embeddings = embedding_service.embeddings
+        self.embedding_service = embedding_service
         self.persist_directory = Config.KNOWLEDGE_BASE_DIR / "embeddings"
         self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.collection_name = "amtly_knowledge"
+        self.backend = Config.VECTOR_BACKEND  # 'chroma' or 'numpy'
 
-        # Initialize Chroma
-        self.vectorstore = Chroma(
+        # Chroma and the embedding model are loaded on first use (or in background)
+        self._vectorstore = None
+        self._init_lock = threading.Lock()
+        self._init_thread = None
+        self._ready = threading.Event()
+        self.state = 'not_started'  # not_started | loading | ready | error
+        self.init_error = None
+        self.init_seconds = None
+
+        # Search result cache, invalidated by a generation counter that
+        # ingestion bumps (stored in a file so other processes see it)
+        self.generation_file = Config.KNOWLEDGE_BASE_DIR / "collection_generation"
+        self._generation = (None, 0)  # (file mtime, value)
+        self.result_cache = None
+        if Config.QUERY_CACHE_ENABLED:
+            self.result_cache = LRUCache(max_size=Config.QUERY_CACHE_SIZE, ttl=Config.QUERY_CACHE_TTL)
+
+        # Text splitter for chunking documents (created on first use)
+        self.chunking_mode = Config.CHUNKING_MODE
+        self._text_splitter = None
+
+    @property
+    def text_splitter(self):
+        """Character-based splitter, or token-based when CHUNKING_MODE == 'tokens'"""
+        if self._text_splitter is None:
+            if self.chunking_mode == 'tokens':
+                # Each chunk fits one forward pass of the embedding model (no silent
+                # truncation); boundaries prefer paragraphs, lines, then sentences
+                self._text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=Config.EMBEDDING_MAX_SEQ_LENGTH,
+                    chunk_overlap=Config.CHUNK_OVERLAP_TOKENS,
+                    length_function=self.embedding_service.count_tokens,
+                    separators=["\n\n", "\n", r"(?<=[.!?])\s+", r"(?<=[;:,])\s+", " ", ""],
+                    is_separator_regex=True,
+                    keep_separator=True,
+                )
+            else:
+                self._text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=Config.CHUNK_SIZE,
+                    chunk_overlap=Config.CHUNK_OVERLAP,
+                    length_function=len,
+                )
+        return self._text_splitter
+
+    @property
+    def vectorstore(self):
+        """Chroma instance - initializes synchronously if not ready yet"""
+        if self._vectorstore is None:
+            self.initialize()
+        return self._vectorstore
+
+    def initialize(self, warmup=False):
+        """Load Chroma and the embedding model (thread-safe, runs once)"""
+        with self._init_lock:
+            if self._vectorstore is not None:
+                return
+
+            self.state = 'loading'
+            started = time.time()
+            try:
+                vectorstore = self._create_backend()
+
+                if warmup:
+                    # First inference is much slower than the rest
+                    self.embedding_service.embed_text("Bürgergeld Antrag")
+
+                self._vectorstore = vectorstore
+                self.state = 'ready'
+                self.init_error = None
+                self.init_seconds = round(time.time() - started, 2)
+                self._ready.set()
+                print(f"✅ Vector store ready ({self.init_seconds}s)")
+            except Exception as e:
+                self.state = 'error'
+                self.init_error = str(e)
+                print(f"❌ Vector store initialization failed: {e}")
+                raise
+
+    def _create_backend(self):
+        """Create the configured index backend (queries go through the embedding service cache)"""
+        if self.backend == 'numpy':
+            from services.numpy_index import NumpyFlatIndex
+            return NumpyFlatIndex(
+                Config.NUMPY_INDEX_DIR,
+                embedding_function=self.embedding_service,
+                name=self.collection_name
+            )
+
+        from langchain_chroma import Chroma
+        return Chroma(
             persist_directory=str(self.persist_directory),
-            embedding_function=self.embeddings,
-            collection_name="amtly_knowledge"
+            embedding_function=self.embedding_service,
+            collection_name=self.collection_name
         )
 
-        # Text splitter for chunking documents
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+    def start_background_init(self, warmup=True):
+        """Initialize in a background thread (no-op if already started)"""
+        if self.state in ('loading', 'ready'):
+            return
+        if self._init_thread is not None and self._init_thread.is_alive():
+            return
+
+        def run():
+            try:
+                self.initialize(warmup=warmup)
+            except Exception:
+                pass  # State and error are recorded by initialize()
+
+        self._init_thread = threading.Thread(target=run, name='vector-store-init', daemon=True)
+        self._init_thread.start()
+
+    def is_ready(self):
+        """True once Chroma and the embedding model are loaded"""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until ready; returns False on timeout"""
+        return self._ready.wait(timeout)
+
+    def get_readiness(self):
+        """Readiness details for health checks"""
+        return {
+            'ready': self.is_ready(),
+            'state': self.state,
+            'error': self.init_error,
+            'init_seconds': self.init_seconds
+        }
+
+    def get_generation(self):
+        """Current knowledge base generation (changes whenever content is added)"""
+        try:
+            mtime = self.generation_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+        if mtime != self._generation[0]:
+            try:
+                value = int(self.generation_file.read_text().strip() or 0)
+            except (OSError, ValueError):
+                value = self._generation[1]
+            self._generation = (mtime, value)
+        return self._generation[1]
+
+    def bump_generation(self):
+        """Invalidate cached results in every process"""
+        new_generation = self.get_generation() + 1
+        tmp_file = self.generation_file.with_suffix('.tmp')
+        tmp_file.write_text(str(new_generation))
+        os.replace(tmp_file, self.generation_file)
+
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        return new_generation
+
+    def _result_cache_key(self, kind, query, k, filter):
+        """Cache key: generation + normalized query + k + filter"""
+        return json.dumps(
+            [self.get_generation(), kind, EmbeddingCache.normalize(query), k, filter],
+            sort_keys=True, ensure_ascii=False, default=str
         )
 
+    def _cached_results(self, cache_key):
+        if self.result_cache is None:
+            return None
+        results = self.result_cache.get(cache_key)
+        return list(results) if results is not None else None
+
+    def _store_results(self, cache_key, results):
+        if self.result_cache is not None:
+            self.result_cache.set(cache_key, tuple(results))
+
+    def get_cache_stats(self):
+        """Search result cache statistics"""
+        if self.result_cache is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'generation': self.get_generation(),
+            'ttl_seconds': self.result_cache.ttl,
+            **self.result_cache.get_stats()
+        }
+
     def add_document(self, text, metadata=None):
         """Add a single document to the vector store"""
         if metadata is None:
@@ -42,48 +220,219 @@ class VectorStore:
             doc_metadata['chunk_id'] = i
             documents.append(Document(page_content=chunk, metadata=doc_metadata))
 
-        # Add to vector store
+        # Upsert with deterministic ids (replaces this source's previous chunks)
         try:
-            self.vectorstore.add_documents(documents)
-            return len(documents)
+            result = self.upsert_documents(documents, source=metadata.get('source'))
+            return result['total']
         except Exception as e:
             print(f"Error adding documents to vector store: {e}")
             return 0
 
+    @staticmethod
+    def make_chunk_id(source, chunk_index, content):
+        """Content-addressed chunk id: source + chunk index + content hash"""
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+        return f"{source or 'unknown'}::{chunk_index}::{content_hash}"
+
+    def _get_ids(self, where):
+        """Ids of stored chunks matching a metadata filter"""
+        if self.backend == 'numpy':
+            return self.vectorstore.get_ids(where)
+        return self.vectorstore._collection.get(where=where, include=[])['ids']
+
+    def _delete_ids(self, ids):
+        """Delete chunks by id"""
+        if not ids:
+            return
+        if self.backend == 'numpy':
+            self.vectorstore.delete(ids)
+            return
+        collection = self.vectorstore._collection
+        batch_size = Config.UPSERT_BATCH_SIZE
+        for offset in range(0, len(ids), batch_size):
+            collection.delete(ids=ids[offset:offset + batch_size])
+
+    def _write_batch(self):
+        """Group backend writes (one locked rewrite for the NumPy index; no-op for Chroma)"""
+        if self.backend == 'numpy':
+            return self.vectorstore.batch()
+        return nullcontext()
+
+    def _upsert_embeddings(self, ids, texts, metadatas, vectors):
+        """Write pre-computed embeddings to the backend"""
+        if self.backend == 'numpy':
+            self.vectorstore.upsert_embeddings(ids, texts, metadatas, vectors)
+        else:
+            self.vectorstore._collection.upsert(
+                ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts
+            )
+
+    def upsert_documents(self, documents, source=None, batch_size=None):
+        """
+        Idempotent bulk upsert
+
+        Chunk ids are derived from source, chunk index and content hash, so
+        re-ingesting a file only embeds chunks that actually changed and the
+        collection size stays stable. Chunks of `source` that are no longer
+        part of `documents` are deleted.
+
+        Returns counts: {'total', 'upserted', 'unchanged', 'deleted'}
+        """
+        batch_size = batch_size or Config.UPSERT_BATCH_SIZE
+
+        ids = []
+        for position, doc in enumerate(documents):
+            chunk_index = doc.metadata.get('chunk_id', position)
+            doc_source = source or doc.metadata.get('source')
+            ids.append(self.make_chunk_id(doc_source, chunk_index, doc.page_content))
+
+        # One locked read-modify-write for the whole source
+        with self._write_batch():
+            existing_ids = set(self._get_ids({'source': source})) if source else set()
+
+            # Only embed chunks that aren't stored yet (unchanged content keeps its id)
+            pending = [
+                (doc_id, doc) for doc_id, doc in zip(ids, documents)
+                if doc_id not in existing_ids
+            ]
+            pending = list({doc_id: doc for doc_id, doc in pending}.items())
+
+            for offset in range(0, len(pending), batch_size):
+                batch = pending[offset:offset + batch_size]
+                texts = [doc.page_content for _, doc in batch]
+                vectors = self.embedding_service.embed_documents(texts)
+                self._upsert_embeddings(
+                    [doc_id for doc_id, _ in batch],
+                    texts,
+                    [doc.metadata for _, doc in batch],
+                    vectors
+                )
+
+            stale_ids = sorted(existing_ids - set(ids))
+            self._delete_ids(stale_ids)
+
+        if pending or stale_ids:
+            self.bump_generation()
+
+        return {
+            'total': len(set(ids)),
+            'upserted': len(pending),
+            'unchanged': len(set(ids) & existing_ids),
+            'deleted': len(stale_ids)
+        }
+
+    def delete_source(self, source):
+        """Remove every chunk of a source document"""
+        ids = self._get_ids({'source': source})
+        self._delete_ids(ids)
+        if ids:
+            self.bump_generation()
+        return len(ids)
+
     def search(self, query, k=5, filter=None):
         """Search for similar documents"""
+        cache_key = self._result_cache_key('search', query, k, filter)
+        cached = self._cached_results(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             results = self.vectorstore.similarity_search(
                 query,
                 k=k,
                 filter=filter
             )
-            return results
         except Exception as e:
             print(f"Search error: {e}")
             return []
 
+        self._store_results(cache_key, results)
+        return results
+
     def search_with_scores(self, query, k=5, filter=None):
         """Search with similarity scores"""
+        cache_key = self._result_cache_key('search_with_scores', query, k, filter)
+        cached = self._cached_results(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             results = self.vectorstore.similarity_search_with_score(
                 query,
                 k=k,
                 filter=filter
             )
-            return results
         except Exception as e:
             print(f"Search with scores error: {e}")
             return []
 
-    def get_collection_info(self):
-        """Get information about the collection"""
+        self._store_results(cache_key, results)
+        return results
+
+    @staticmethod
+    def _document_key(doc):
+        """Identity of a chunk across the vector and lexical indexes"""
+        source = doc.metadata.get('source')
+        chunk_id = doc.metadata.get('chunk_id')
+        if source is not None and chunk_id is not None:
+            return (source, chunk_id)
+        return (None, doc.page_content)
+
+    def hybrid_search_with_scores(self, query, k=5):
+        """
+        BM25 + vector search fused with reciprocal rank fusion
+
+        Returns (Document, score) pairs; every branch scores on the same
+        RRF scale (sum of 1 / (RRF_K + rank) over the lists a chunk appears
+        in), higher is better. Queries with exact terms (§ references, form
+        codes, identifiers) that the lexical index can fully satisfy skip
+        embedding entirely.
+        """
+        candidates = max(k, Config.HYBRID_CANDIDATES)
+        lexical_results = lexical_index.search_with_scores(query, k=candidates)
+
+        exact_terms = extract_exact_terms(query)
+        if exact_terms and lexical_results:
+            exact_matches = [
+                (doc, score) for doc, score in lexical_results
+                if lexical_index.contains_all_terms(doc, exact_terms)
+            ]
+            if exact_matches:
+                return self._reciprocal_rank_fusion([exact_matches], k)
+
+        # Chroma scores are distances (lower is better): only their order is used
+        vector_results = self.search_with_scores(query, k=candidates)
+        return self._reciprocal_rank_fusion([vector_results, lexical_results], k)
+
+    def _reciprocal_rank_fusion(self, result_lists, k):
+        """Fuse best-first result lists into top-k (Document, RRF score) pairs"""
+        fused = {}
+        for results in result_lists:
+            for rank, (doc, _) in enumerate(results):
+                key = self._document_key(doc)
+                entry = fused.setdefault(key, [doc, 0.0])
+                entry[1] += 1.0 / (Config.RRF_K + rank + 1)
+
+        ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+        return [(doc, score) for doc, score in ranked[:k]]
+
+    def get_collection_info(self, wait=True):
+        """Get information about the collection (wait=False never blocks on loading)"""
+        if not wait and not self.is_ready():
+            return {'count': 0, 'name': self.collection_name, 'status': self.state}
+
         try:
-            collection = self.vectorstore._collection
-            count = collection.count()
+            if self.backend == 'numpy':
+                count = self.vectorstore.count()
+                name = self.vectorstore.name
+            else:
+                collection = self.vectorstore._collection
+                count = collection.count()
+                name = collection.name
             return {
                 'count': count,
-                'name': collection.name,
+                'name': name,
+                'backend': self.backend,
                 'status': 'ready' if count > 0 else 'empty'
             }
         except Exception as e:
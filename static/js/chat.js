@@ -480,7 +480,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(`Server error: ${response.status}`);
             }
 
-            const data = await response.json();
+            let data = await response.json();
+            if (response.status === 202 && data.job_id) {
+                // Uploads are processed in the background - follow the job
+                data = await waitForJob(data.events_url);
+            }
             hideLoadingState();
             handleChatResponse(data);
 
@@ -498,6 +502,31 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    function waitForJob(eventsUrl) {
+        return new Promise((resolve) => {
+            const source = new EventSource(eventsUrl);
+
+            source.addEventListener('progress', (event) => {
+                const job = JSON.parse(event.data);
+                const stage = job.stage ? job.stage.replace(/^\w/, c => c.toUpperCase()) : 'Processing';
+                showLoadingState(`${stage}... (${job.progress || 0}%)`);
+            });
+
+            source.addEventListener('done', (event) => {
+                source.close();
+                resolve(JSON.parse(event.data));
+            });
+
+            source.addEventListener('error', (event) => {
+                source.close();
+                // Server-sent error events carry data; connection errors do not
+                resolve(event.data ? JSON.parse(event.data) : {
+                    error: 'Lost connection while processing the document.'
+                });
+            });
+        });
+    }
+
     async function refreshCurrentChatInSidebar() {
         try {
             const response = await fetch('/api/chats');
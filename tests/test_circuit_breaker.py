@@ -0,0 +1,92 @@
+"""
+Circuit breaker around OpenAI calls: open -> half-open -> retried trial -> closed
+"""
+
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest
+
+from services.openai_service import OpenAIService
+from utils.concurrency import CircuitBreaker, CircuitOpenError
+
+RESET_TIMEOUT = 0.05
+
+
+class UpstreamDown(Exception):
+    """Stands in for a timeout / 5xx"""
+
+
+class ScriptedCompletions:
+    """chat.completions stub failing for the first `failures` calls"""
+
+    def __init__(self):
+        self.failures = 0
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise UpstreamDown("upstream down")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=None
+        )
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = OpenAIService()
+    completions = ScriptedCompletions()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service.completions = completions
+    service.max_retries = 1
+    service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+    monkeypatch.setattr(service, '_is_retryable', lambda error: isinstance(error, UpstreamDown))
+    monkeypatch.setattr(service, '_backoff_delay', lambda attempt, error: 0)
+    return service
+
+
+def complete(service):
+    messages = service._build_messages("Hallo")
+    return service._complete(messages, 0, service._select_settings(messages))
+
+
+def open_circuit(service):
+    service.completions.failures = 2
+    with pytest.raises(UpstreamDown):
+        complete(service)
+    assert service.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        complete(service)
+
+
+def test_half_open_trial_recovers_after_retryable_failure(service):
+    open_circuit(service)
+    time.sleep(RESET_TIMEOUT * 2)
+    assert service.breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The trial's first attempt fails, its retry succeeds
+    service.completions.failures = 1
+    assert complete(service)[0] == "ok"
+    assert service.breaker.state == CircuitBreaker.CLOSED
+    assert complete(service)[0] == "ok"
+
+
+def test_failed_half_open_trial_reopens_and_allows_next_trial(service):
+    open_circuit(service)
+    time.sleep(RESET_TIMEOUT * 2)
+
+    # Every attempt of the trial fails: back to open, not stuck half-open
+    service.completions.failures = 2
+    with pytest.raises(UpstreamDown):
+        complete(service)
+    assert service.breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(RESET_TIMEOUT * 2)
+    assert complete(service)[0] == "ok"
+    assert service.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,213 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL and hit/miss counters"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """Return cached value or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        """Store value, evicting least recently used entries when full"""
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache stored in SQLite
+
+    Survives restarts and can be shared by several worker processes
+    (WAL mode, one connection per thread). Values are raw bytes.
+    Access times (for LRU pruning) are refreshed at most once per
+    ACCESS_UPDATE_INTERVAL per key, so hits are usually read-only.
+    """
+
+    ACCESS_UPDATE_INTERVAL = 60.0
+
+    def __init__(self, db_path: Path, table: str = 'cache', max_entries: int = 100000,
+                 ttl: Optional[float] = None):
+        self.db_path = Path(db_path)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_accessed ON {self.table} (accessed_at)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        """Get the connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes or None"""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, created_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            now = time.time()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            if now - row[2] > self.ACCESS_UPDATE_INTERVAL:
+                conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+            with self._lock:
+                self.hits += 1
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Cache read error ({self.table}): {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+    def set(self, key: str, value: bytes):
+        """Store bytes, pruning the oldest entries when over the size limit"""
+        if self.max_entries <= 0:
+            return
+
+        try:
+            now = time.time()
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), now, now)
+            )
+            conn.commit()
+
+            with self._lock:
+                self._writes_since_prune += 1
+                should_prune = self._writes_since_prune >= max(1, self.max_entries // 100)
+                if should_prune:
+                    self._writes_since_prune = 0
+
+            if should_prune:
+                self._prune(conn)
+        except sqlite3.Error as e:
+            print(f"Cache write error ({self.table}): {e}")
+
+    def _prune(self, conn):
+        """Drop expired entries and least recently used entries over the limit"""
+        if self.ttl is not None:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self.evictions += cursor.rowcount
+
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += cursor.rowcount
+        conn.commit()
+
+    def clear(self):
+        """Remove all entries"""
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+
+    def count(self) -> int:
+        """Number of stored entries"""
+        try:
+            return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics"""
+        total = self.hits + self.misses
+        return {
+            'size': self.count(),
+            'max_size': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0
+        }
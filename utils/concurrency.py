@@ -0,0 +1,310 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Admission priorities (lower runs first)
+PRIORITY_HIGH = 0      # short interactive follow-ups, form help
+PRIORITY_NORMAL = 1    # regular chat / RAG answers
+PRIORITY_LOW = 2       # long document analyses
+
+
+class RateLimitExceeded(Exception):
+    """Request could not be admitted before its deadline (maps to the 'rate_limit' error code)"""
+
+    def __init__(self, message, retry_after: Optional[float] = None):
+        super().__init__(message)
+        # Seconds until the rate limit would admit the call, when known
+        self.retry_after = retry_after
+
+
+class _Call:
+    """One in-flight call and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for and share its result (or exception). Nothing is cached
+    after the call completes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run fn once per key at a time; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result, False
+
+    def get_stats(self) -> Dict:
+        """Executed vs. coalesced call counts"""
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.executed + self.coalesced
+        return {
+            'in_flight': in_flight,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'coalesced_rate': round(self.coalesced / total, 3) if total else 0.0
+        }
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to one minute of burst; rate 0 = unlimited"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate_per_minute / 60.0)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        if self.rate_per_minute <= 0:
+            return 0.0
+        self._refill()
+        # Requests larger than the whole bucket wait for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        if self.rate_per_minute > 0:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if self.rate_per_minute > 0 and amount > 0:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdmissionController:
+    """
+    Admission control for an upstream API
+
+    Caps concurrent calls, applies request- and token-per-minute buckets and
+    admits waiting callers strictly by (priority, arrival order). Callers
+    that cannot be admitted before their deadline, or find the wait queue
+    full, get RateLimitExceeded.
+    """
+
+    def __init__(self, max_in_flight: int = 8, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0, max_queue: int = 32, queue_timeout: float = 20.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+
+    def acquire(self, priority: int = PRIORITY_NORMAL, tokens: int = 0,
+                timeout: Optional[float] = None):
+        """Block until admitted; raises RateLimitExceeded on a full queue or deadline"""
+        started = time.monotonic()
+        deadline = started + (self.queue_timeout if timeout is None else timeout)
+
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise RateLimitExceeded("Too many requests waiting for the language model")
+
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == ticket and self._in_flight < self.max_in_flight:
+                        wait = max(self.request_bucket.time_until(1), self.token_bucket.time_until(tokens))
+                        if wait == 0:
+                            heapq.heappop(self._waiting)
+                            self.request_bucket.consume(1)
+                            self.token_bucket.consume(tokens)
+                            self._in_flight += 1
+                            self.admitted += 1
+                            self.total_wait += time.monotonic() - started
+                            # The next waiter may be admissible too
+                            self._cond.notify_all()
+                            return
+
+                    remaining = deadline - time.monotonic()
+                    # Fail fast when the rate limit cannot recover before the deadline
+                    if remaining <= 0 or (wait is not None and wait > remaining):
+                        self.timed_out += 1
+                        raise RateLimitExceeded("Timed out waiting for the language model", retry_after=wait)
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, unused_tokens: int = 0):
+        """Finish a call; unused_tokens returns over-estimated tokens to the bucket"""
+        with self._cond:
+            self._in_flight -= 1
+            self.token_bucket.refund(unused_tokens)
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict:
+        """Queue and admission counters"""
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'waiting': len(self._waiting),
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_wait_ms': round(1000 * self.total_wait / self.admitted, 1) if self.admitted else 0.0
+            }
+
+
+class CircuitOpenError(Exception):
+    """Call rejected because the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds one trial call is let through (half-open) and
+    its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_progress = False
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may proceed now"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may proceed"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit open after repeated failures: {self.last_error}")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_progress = False
+
+    def abandon_trial(self):
+        """The admitted call said nothing about upstream health; let another trial through"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self._consecutive_failures += 1
+            if error is not None:
+                self.last_error = str(error)[:200]
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_progress = False
+
+    def get_stats(self) -> Dict:
+        """Breaker state and counters"""
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'retry_in_seconds': round(retry_in, 1),
+                'last_error': self.last_error
+            }
@@ -10,12 +10,12 @@ class FileUtils:
 
     @staticmethod
     def get_file_hash(file_path: Path) -> str:
-        """Generate hash for file to detect duplicates"""
-        hash_md5 = hashlib.md5()
+        """Generate SHA-256 hash for file to detect duplicates (same key as the document cache)"""
+        hash_sha256 = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                hash_sha256.update(chunk)
+        return hash_sha256.hexdigest()
 
     @staticmethod
     def is_allowed_file(filename: str) -> bool:
@@ -0,0 +1,196 @@
+"""
+Token-budgeted prompt assembly
+
+Prompt sections (knowledge base chunks, conversation history, document
+text, form guidance) are filled in priority order into a per-route token
+budget. Sections that do not fit are trimmed at a token boundary, so the
+same inputs always produce the same prompt.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import Config
+
+TRUNCATION_MARKER = " [...]"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken encoding for the chat model (None if tiktoken is unavailable)"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(Config.OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ Could not load tokenizer, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of model tokens in text (about 4 characters per token without tiktoken)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = TRUNCATION_MARKER) -> str:
+    """Keep the beginning of text so that it fits max_tokens (marker included)"""
+    if not text or max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    keep = max(0, max_tokens - count_tokens(marker))
+    encoding = _get_encoding()
+    if encoding is None:
+        head = text[:keep * 4]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep])
+    return head.rstrip() + marker
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Cut text into pieces of max_tokens at token boundaries"""
+    encoding = _get_encoding()
+    if encoding is None:
+        step = max_tokens * 4
+        return [text[start:start + step] for start in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), max_tokens)]
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into segments of at most max_tokens
+
+    Paragraphs (blank-line separated, e.g. the '--- PAGE n ---' markers of
+    combined uploads) are packed whole; a paragraph that is too long on its
+    own is split at line breaks, and a single overlong line at token
+    boundaries.
+    """
+    blocks = []
+    for paragraph in re.split(r'\n\s*\n', text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            blocks.append(paragraph)
+            continue
+        for line in paragraph.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if count_tokens(line) <= max_tokens:
+                blocks.append(line)
+            else:
+                blocks.extend(_split_oversized(line, max_tokens))
+
+    segments = []
+    current, current_tokens = [], 0
+    for block in blocks:
+        # +2 for the joining blank line
+        tokens = count_tokens(block) + 2
+        if current and current_tokens + tokens > max_tokens:
+            segments.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens
+    if current:
+        segments.append('\n\n'.join(current))
+    return segments
+
+
+def get_budget(route: str) -> int:
+    """Context token budget for a prompt route"""
+    return Config.PROMPT_CONTEXT_BUDGETS.get(route, Config.PROMPT_CONTEXT_BUDGETS['default'])
+
+
+class PromptBuilder:
+    """Fill named prompt sections into a token budget, lowest priority number first"""
+
+    # Sections with less room than this are dropped instead of trimmed
+    MIN_SECTION_TOKENS = 16
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._sections = []
+
+    def add(self, name: str, text: Optional[str], priority: int, max_tokens: Optional[int] = None):
+        """Add a text section (max_tokens caps its share of the budget)"""
+        self._sections.append({
+            'name': name, 'priority': priority, 'max_tokens': max_tokens, 'text': text or ''
+        })
+
+    def add_history(self, name: str, conversation_history: Optional[List[Dict]], priority: int,
+                    max_tokens: Optional[int] = None, max_messages: int = 6, min_messages: int = 2,
+                    keep_last: int = 0):
+        """
+        Add recent conversation as 'User: ...' / 'Assistant: ...' lines
+
+        Filled newest first: the latest messages are kept whole, older ones
+        are trimmed or left out when the budget runs out. The newest
+        keep_last messages are always included in full (follow-ups like
+        "shorter please" need the whole previous answer), even over budget.
+        """
+        messages = []
+        if conversation_history and len(conversation_history) >= min_messages:
+            messages = conversation_history[-max_messages:]
+        self._sections.append({
+            'name': name, 'priority': priority, 'max_tokens': max_tokens, 'messages': messages,
+            'keep_last': keep_last
+        })
+
+    def _fill_history(self, messages, available, keep_last=0):
+        lines = []
+        for index, msg in enumerate(reversed(messages)):
+            role = "User" if msg['role'] == 'user' else "Assistant"
+            line = f"{role}: {msg['content']}"
+            # +1 for the joining newline
+            tokens = count_tokens(line) + 1
+            if index < keep_last:
+                lines.append(line)
+                available -= tokens
+                continue
+            if tokens <= available:
+                lines.append(line)
+                available -= tokens
+                continue
+            if available >= self.MIN_SECTION_TOKENS:
+                lines.append(truncate_to_tokens(line, available - 1))
+            break
+        return '\n'.join(reversed(lines))
+
+    def build(self) -> Dict[str, str]:
+        """Section texts by name ('' for empty or dropped sections)"""
+        result = {}
+        remaining = self.budget
+
+        # Stable sort: equal priorities keep insertion order
+        for section in sorted(self._sections, key=lambda s: s['priority']):
+            available = remaining
+            if section['max_tokens'] is not None:
+                available = min(available, section['max_tokens'])
+
+            if 'messages' in section:
+                text = self._fill_history(section['messages'], available, section['keep_last'])
+            else:
+                text = section['text']
+                if count_tokens(text) > available:
+                    if available >= self.MIN_SECTION_TOKENS:
+                        text = truncate_to_tokens(text, available)
+                    else:
+                        text = ''
+
+            result[section['name']] = text
+            remaining = max(0, remaining - count_tokens(text))
+
+        return result
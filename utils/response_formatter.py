@@ -1,3 +1,4 @@
+import json
 import re
 from typing import Dict, List, Optional, Union
 from datetime import datetime
@@ -63,6 +64,10 @@ class ResponseFormatter:
             'type': 'error'
         }
 
+    @staticmethod
+    def format_sse_event(event: str, data: Dict) -> str:
+        """Format one Server-Sent Events message"""
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
     @staticmethod
     def _clean_response_text(text: str) -> str: